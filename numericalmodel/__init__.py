@@ -9,6 +9,10 @@ from . import numericalmodel
 from . import interfaces
 from . import numericalschemes
 from . import equations
+from . import storage
+from . import sources
+from . import interpolation
+from . import checkpoint
 from . import utils
 
 __version__ = "0.1.1"
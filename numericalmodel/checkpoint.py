@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# system modules
+import json
+import struct
+import zipfile
+import inspect
+import importlib
+
+# internal modules
+from . import utils
+from . import storage
+
+# external modules
+import numpy as np
+
+
+MANIFEST = "manifest"
+""" The name of the manifest in a checkpoint file """
+
+def class_path(obj):
+    """
+    Get the full path of an object's class
+
+    Args:
+        obj (object): the object
+
+    Returns:
+        str : the full path of the object's class including the module
+    """
+    return utils.ReprObject._full_variable_path(obj.__class__)
+
+def import_class(path):
+    """
+    Import a class from its full path
+
+    Args:
+        path (str): the full path of the class as returned by
+            :any:`class_path`
+
+    Returns:
+        type : the class
+    """
+    module, name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module), name)
+
+def _json_default(obj):
+    """
+    Convert numpy types for :any:`json.dumps`
+
+    Args:
+        obj (object): the object :any:`json` can't handle
+
+    Returns:
+        object : the converted object
+
+    Raises:
+        TypeError : if the object can't be converted
+    """
+    if isinstance(obj, np.generic) or \
+        (isinstance(obj, np.ndarray) and obj.ndim == 0):
+        return obj.item()
+    raise TypeError("{} is not JSON serializable".format(type(obj)))
+
+def routine_path(routine):
+    """
+    Determine the full import path of a function
+
+    Args:
+        routine (callable): the function
+
+    Returns:
+        str or None : the full path if importing it yields the function,
+        :any:`None` otherwise, e.g. for lambdas
+    """
+    if isinstance(routine, np.ufunc): # ufuncs don't know their module
+        path = "numpy.{}".format(routine.__name__)
+    else:
+        path = utils.ReprObject._full_variable_path(routine)
+    try:
+        return path if import_class(path) is routine else None
+    except (AttributeError, ImportError, ValueError):
+        return None
+
+def settings(obj, exclude = []):
+    """
+    Collect an object's ``__init__`` arguments from its equally named
+    properties like :any:`ReprObject` does. Importable functions are stored
+    as their full path. An :any:`Archive` or :any:`MemmapStorage` is stored
+    as ``{'class': path, 'settings': settings}`` entry referring to its
+    files, which can be recreated with :any:`create`. All other settings
+    have to be representable in JSON.
+
+    Args:
+        obj (object): the object
+        exclude (list of str, optional): the arguments to skip
+
+    Returns:
+        dict : ``{'argument': value}`` pairs
+
+    Raises:
+        ValueError : if a setting can't be stored
+    """
+    result = {}
+    for arg in inspect.getfullargspec(obj.__init__).args:
+        if arg == "self" or arg in exclude: continue
+        try:                   value = getattr(obj, arg)
+        except AttributeError: continue
+        if inspect.isroutine(value) or isinstance(value, np.ufunc):
+            path = routine_path(value)
+            if not path is None:
+                result[arg] = path
+            continue
+        if isinstance(value, (storage.Archive, storage.MemmapStorage)):
+            result[arg] = { "class": class_path(value), 
+                "settings": settings(value) }
+            continue
+        try:
+            result[arg] = json.loads(json.dumps(value, default=_json_default))
+        except (TypeError, ValueError):
+            raise ValueError("setting '{}' of {} can't be stored".format(
+                arg, repr(obj)))
+    return result
+
+def create(entry, **kwargs):
+    """
+    Create an object from an entry of its class path and settings as
+    written by :any:`settings`. Nested entries are created as well.
+
+    Args:
+        entry (dict): ``{'class': path, 'settings': settings}``
+        kwargs: further arguments to pass to the class
+
+    Returns:
+        object : the new object
+    """
+    def is_entry(value):
+        return isinstance(value, dict) and set(value) == {"class","settings"}
+    arguments = { arg: create(value) if is_entry(value) else value
+        for arg, value in entry["settings"].items() }
+    arguments.update(kwargs)
+    return import_class(entry["class"])(**arguments)
+
+def save(path, manifest, arrays):
+    """
+    Write a manifest and arrays into an uncompressed ``.npz`` file
+
+    Args:
+        path (str): the file. Note that :any:`numpy.savez` appends ``.npz`` if
+            the path doesn't end with it.
+        manifest (dict): the manifest to store as JSON
+        arrays (dict): ``{'name': array}`` pairs
+    """
+    assert not MANIFEST in arrays, "'{}' is reserved".format(MANIFEST)
+    content = json.dumps(manifest, default = _json_default).encode()
+    arrays = dict(arrays)
+    arrays[MANIFEST] = np.frombuffer(content, dtype = np.uint8)
+    np.savez(path, **arrays)
+
+def load(path, mmap = False):
+    """
+    Read a manifest and arrays written with :any:`save`
+
+    Args:
+        path (str): the file
+        mmap (bool, optional): map the arrays from the file with
+            copy-on-write (see :any:`numpy.memmap`) instead of reading them
+            into memory.
+
+    Returns:
+        tuple : the manifest and a ``{'name': array}`` dict
+    """
+    if mmap:
+        arrays = _map_npz(path)
+    else:
+        with np.load(path, allow_pickle = False) as npz:
+            arrays = { name: npz[name] for name in npz.files }
+    manifest = json.loads(bytes(np.asarray(arrays.pop(MANIFEST))).decode())
+    return manifest, arrays
+
+def _map_npz(path):
+    """
+    Map the uncompressed members of a ``.npz`` file with copy-on-write.
+    Compressed members are read into memory.
+
+    Args:
+        path (str): the file
+
+    Returns:
+        dict : ``{'name': array}`` pairs
+    """
+    readers = {
+        (1,0): np.lib.format.read_array_header_1_0,
+        (2,0): np.lib.format.read_array_header_2_0,
+        }
+    local_header = struct.Struct("<4s5H3L2H") # zip local file header
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename
+            if name.endswith(".npy"): name = name[:-len(".npy")]
+            # locate the member's content
+            f.seek(info.header_offset)
+            header = local_header.unpack(f.read(local_header.size))
+            f.seek(info.header_offset + local_header.size
+                + header[-2] + header[-1])
+            version = np.lib.format.read_magic(f)
+            reader = readers.get(version)
+            if info.compress_type != zipfile.ZIP_STORED or reader is None:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member,
+                        allow_pickle = False)
+                continue
+            shape, fortran_order, dtype = reader(f)
+            if not np.prod(shape): # empty files can't be mapped
+                arrays[name] = np.empty(shape, dtype = dtype)
+                continue
+            arrays[name] = np.memmap(path, dtype = dtype, mode = "c",
+                offset = f.tell(), shape = shape,
+                order = "F" if fortran_order else "C")
+    return arrays
+
+
+class Journal(storage.FrameFile):
+    """
+    Append-only write-ahead journal of the values recorded by
+    :any:`InterfaceValue` s. Records are collected in memory and written in
+    batches of :any:`FrameFile.batch` records. Together with a checkpoint
+    (see :any:`NumericalModel.save_checkpoint`), the journal allows to resume a
+    crashed run. Only values recorded up to the last model time that was
+    recorded are replayed: the end of an :any:`NumericalModel.integrate`
+    call and, written with each batch, the last completed step.
+
+    Args:
+        filename (str, optional): the journal file. New records are appended
+            to an existing file. Defaults to a new temporary file.
+        compress (bool, optional): compress the records? Defaults to
+            ``False``.
+        batch (int, optional): the number of records to collect before
+            writing them. Defaults to 1024.
+    """
+    ###############
+    ### Methods ###
+    ###############
+    def record(self, id, time, value):
+        """ 
+        Record a value
+
+        Args:
+            id (str): the :any:`InterfaceValue.id`
+            time (float): the time
+            value (numpy.ndarray): the value
+        """
+        self.extend(id, times = [time], values = [value])
+
+    def extend(self, id, times, values):
+        """ 
+        Record several values at once
+
+        Args:
+            id (str): the :any:`InterfaceValue.id`
+            times (numpy.ndarray): the times
+            values (numpy.ndarray): the values corresponding to the times
+        """
+        try:                   pending = self._pending
+        except AttributeError: pending = self._pending = {}
+        pending_times, pending_values = pending.setdefault(id, ([], []))
+        pending_times.extend(times)
+        pending_values.extend(np.array(values))
+        self._pending_records = getattr(self, "_pending_records", 0) \
+            + len(times)
+        if self._pending_records >= self.batch:
+            self.flush()
+
+    def record_model_time(self, time):
+        """ 
+        Record that the model has been integrated until a given time and
+        write all pending records
+
+        Args:
+            time (float): the model time
+        """
+        self.flush(model_time = time)
+
+    def mark_model_time(self, time):
+        """ 
+        Note that the model has been integrated until a given time, e.g.
+        after a completed step. Unlike :any:`record_model_time`, nothing is
+        written now: the time is recorded with the next batch.
+
+        Args:
+            time (float): the model time
+        """
+        self._marked_model_time = time
+
+    def flush(self, model_time = None):
+        """ 
+        Write all pending records and make sure they reach the disk
+
+        Args:
+            model_time (float, optional): the model time to record after the
+                pending records. Defaults to the last time given to
+                :any:`mark_model_time`, if any.
+        """
+        frames = [ [ np.array("value"), np.array(id), np.array(times), 
+            np.array(values) ] for id, (times, values) in 
+            getattr(self, "_pending", {}).items() ]
+        if model_time is None:
+            model_time = getattr(self, "_marked_model_time", None)
+        if not model_time is None:
+            frames.append( [ np.array("model_time"), np.array(model_time) ] )
+        if frames: 
+            self._write_frames(frames, sync = True)
+        self._pending, self._pending_records = {}, 0
+        self._marked_model_time = None
+
+    def reset(self):
+        """ 
+        Empty the journal, e.g. after a checkpoint was written
+        """
+        self._pending, self._pending_records = {}, 0
+        self._marked_model_time = None
+        open(self.filename, "wb").close()
+
+    def replay(self, model):
+        """ 
+        Apply the journal to a model restored from the checkpoint the
+        journal was started at. Values recorded after the last recorded
+        model time are ignored. Of several values recorded at the same time,
+        the last one wins.
+
+        Args:
+            model (NumericalModel): the model
+        """
+        records, model_time = {}, None
+        for arrays in self._read_frames():
+            if str(arrays[0]) == "model_time":
+                model_time = float(arrays[1])
+            else:
+                records.setdefault(str(arrays[1]), []).append(arrays[2:])
+        if model_time is None: # no integration completed
+            return
+        values = { value.id: value 
+            for kind in ("variables", "parameters", "forcing") 
+            for value in getattr(model, kind).elements }
+        for id, batches in records.items():
+            value = values[id]
+            times = np.concatenate([ t for t, v in batches ])
+            recorded = np.concatenate([ v for t, v in batches ])
+            completed = times <= model_time
+            times = np.concatenate([ value.times, times[completed] ])
+            recorded = np.concatenate([ value.values, recorded[completed] ])
+            # the last record of each time wins
+            unique, index = np.unique(times[::-1], return_index = True)
+            index = times.size - 1 - index
+            value.restore_history(times = times[index], 
+                values = recorded[index])
+        model.model_time = max(model.model_time, model_time)
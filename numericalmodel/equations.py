@@ -186,6 +186,14 @@ class DerivativeEquation(Equation):
     """ 
     Class to represent a derivative equation
     """
+    time_independent_parts = False
+    """
+    Whether the :any:`linear_factor` and the :any:`independent_addend` only
+    depend on time through the values in :any:`input`. Only then may
+    :any:`cached` reuse them across steps. Subclasses whose parts do not
+    depend on the time directly may set this to ``True``.
+    """
+
     ###############
     ### Methods ###
     ###############
@@ -236,6 +244,85 @@ class DerivativeEquation(Equation):
         """
         raise NotImplementedError("subclasses must override this method")
 
+    def nonlinear_jacobian(
+        self, time = None, variablevalue = None): # pragma: no cover
+        """
+        Calculate the derivative of the :any:`nonlinear_addend` with respect
+        to the variable. Overriding this is optional. Implicit schemes use it
+        if available and fall back to finite differences otherwise.
+
+        Args:
+            time (single numeric, optional): the time to calculate the
+                derivative. Defaults to the variable's current (last) time.
+            variablevalue (numpy.ndarray, optional): the variable vaulue to use.
+                Defaults to the value of self.variable at the given time.
+
+        Returns:
+            numpy.ndarray : the Jacobian of the nonlinear addend. Either the
+            elementwise derivatives in the shape of the variable value if
+            every element of the nonlinear addend only depends on the same
+            element of the variable or the full Jacobian matrix of the
+            flattened nonlinear addend with respect to the flattened variable
+            value.
+        """
+        raise NotImplementedError("subclasses may override this method")
+
+    def input_signature(self):
+        """ 
+        Determine the state of the :any:`input` apart from the
+        :any:`variable`
+
+        Returns:
+            tuple or None : the identities and :any:`InterfaceValue.version` s
+            of the :any:`input` or ``None`` if any of them is not
+            :any:`InterfaceValue.time_invariant`
+        """
+        signature = []
+        for value in self.input.values():
+            if value is self.variable: # parts are split by the variable
+                continue
+            if not value.time_invariant:
+                return None
+            signature.append( ( id(value), value.version ) )
+        return tuple(signature)
+
+    def cached(self, part, time = None):
+        """ 
+        Calculate a part of the derivative that does not depend on the
+        :any:`variable`, reusing the last result if possible. As long as all
+        values in :any:`input` apart from the :any:`variable` are
+        :any:`InterfaceValue.time_invariant`, the result is reused until
+        any of their :any:`InterfaceValue.version` s changes. Results are
+        only reused if :any:`time_independent_parts` is set.
+
+        Args:
+            part (str): the part to calculate, ``"linear_factor"`` or
+                ``"independent_addend"``
+            time (single numeric, optional): the time to calculate the 
+                part. Defaults to the variable's current (last) time.
+
+        Returns:
+            numpy.ndarray : the part at the corresponding time
+        """
+        assert part in ("linear_factor", "independent_addend"), \
+            "only the linear factor and the independent addend can be cached"
+        if not self.time_independent_parts: # may depend on time directly
+            return getattr(self, part)( time = time )
+        signature = self.input_signature()
+        if signature is None: # time-dependent
+            return getattr(self, part)( time = time )
+        try:                   cache = self._part_cache
+        except AttributeError: cache = self._part_cache = {}
+        try:
+            cached_signature, result = cache[part]
+            if cached_signature == signature: 
+                return result
+        except KeyError: 
+            pass
+        result = getattr(self, part)( time = time )
+        cache[part] = (signature, result)
+        return result
+
     def derivative(self, time = None, variablevalue = None): # pragma: no cover
         """ Calculate the derivative (right-hand-side) of the equation
 
@@ -6,6 +6,10 @@ import inspect
 
 # internal modules
 from . import utils
+from . import storage
+from . import interpolation
+from . import checkpoint
+from . import sources
 
 # external modules
 import numpy as np
@@ -18,20 +22,35 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
     Args:
         name (str, optional): value name
         id (str, optional): unique id
-        values (1d :any:`numpy.ndarray`, optional): all values this
-            InterfaceValue had in chronological order
+        values (:any:`numpy.ndarray`, optional): all values this
+            InterfaceValue had in chronological order. The first axis is the
+            time axis, the remaining axes are the shape of a single value,
+            e.g. a field. 
         times (1d :any:`numpy.ndarray`, optional): the corresponding times to
             values 
         unit (str,optional): physical unit of value
         bounds (list, optional): lower and upper value bounds
         interpolation (str, optional): interpolation kind. See
-            :any:`scipy.interpolate.interp1d` for documentation. Defaults to 
-            "zero".
+            :any:`HistoryInterpolator` and :any:`scipy.interpolate.interp1d`
+            for documentation. Defaults to "zero".
         time_function (callable, optional): function that returns the model time
             as utc unix timestamp
         remembrance (float, optional): maximum :any:`time` difference to keep
             past :any:`values`
+        archive (Archive, optional): where to move values older than the
+            :any:`remembrance` to. See :any:`archive`.
+        cursor (bool, optional): speed up time-ordered lookups with a cursor.
+            See :any:`cursor`.
+        history_store (MemmapStorage, optional): where to store the
+            :any:`times` and :any:`values`. See :any:`history_store`.
     """
+    _precomputed = None
+    """
+    The results of :any:`precompute` as tuple of the sorted times, the
+    values at these times and a one-element list holding the index of the
+    time expected next
+    """
+
     def __init__(self,
         name = None,
         id = None,
@@ -42,6 +61,9 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         times = None,
         bounds = None,
         remembrance = None,
+        cursor = None,
+        history_store = None,
+        archive = None,
         ):
         # set properties
         if not time_function is None:  
@@ -52,6 +74,8 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
             self.unit = unit
         if not id is None:    
             self.id = id
+        if not history_store is None: 
+            self.history_store = history_store
         if not bounds is None: 
             self.bounds = bounds
         if not values is None:
@@ -62,6 +86,10 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
             self.interpolation = interpolation
         if not remembrance is None: 
             self.remembrance = remembrance
+        if not archive is None: 
+            self.archive = archive
+        if not cursor is None: 
+            self.cursor = cursor
 
     ##################
     ### Properties ###
@@ -169,12 +197,15 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
             the return value of :any:`__call__`, i.e.  the current value.
         :setter: 
             When this property is set, the given value is recorded to the
-            time given by :any:`next_time`. If this time exists already in
+            time given by :any:`next_time`. If this time is the last time in
             :any:`times`, the corresponding value in :any:`values` is
             overwritten.  Otherwise, the new time and value are appended to
             :any:`times` and :any:`values`.
             The value is also checked to lie within the :any:`bounds`.
-        :type: numeric
+            The value may also be an array like a field. Once there are
+            :any:`values`, all new values have to be of the same shape or
+            single values that are then used for the whole array.
+        :type: numeric or :any:`numpy.ndarray`
         """
         return self() # call us
 
@@ -182,7 +213,12 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
     def value(self,newvalue):
         assert utils.is_numeric(newvalue), "value has to be numeric"
         val = np.asarray(newvalue) # convert to numpy array
-        assert val.size == 1, "value has to be of size one"
+        values = self._values_storage
+        if len(values):
+            shape = values.data.shape[1:]
+            assert val.shape == shape or val.size == 1, \
+                ("{}: new value has to be of shape {}").format(
+                    self.name,shape)
         # check if values are inside bounds
         lower, upper = self.bounds
         assert np.all(newvalue >= lower), \
@@ -193,38 +229,44 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
                 self.name,upper)
         # append to log
         t = self.next_time # the next time
-        ind = self.times == t # indices where this next time is already present
-        if np.any(ind): # time already there?
-            self.values[ind] = val # replace value
+        times = self._times_storage
+        # next_time can't be earlier than the last time, so if this time is
+        # already present, it is the last one
+        if len(times) and times.last == t: # time already there?
+            self._values_storage.replace_last(val) # replace value
             # self.logger.debug("time {t} already there, " 
             #     "overwriting value to {val}".format(t=t,val=val))
         else: # new time
-            self.times = np.append(self.times, t)
-            self.values = np.append(self.values, val)
+            times.append(t)
+            self._values_storage.append(val)
             # self.logger.debug("time {t} not yet there, " 
             #     "appending value {val}".format(t=t,val=val))
+        if not self.journal is None and not hasattr(self, "_scratch_after"):
+            # write-ahead log, scratch values are logged on commit
+            self.journal.record(self.id, t, self._values_storage.last)
+        self._history_changed()
         # for get old values
         self.forget_old_values()
 
     @property
     def values(self):
         """ 
-        All values this InterfaceValue has ever had in chronological order
+        All values this InterfaceValue has ever had in chronological order.
+        The first axis is the time axis, the remaining axes are the shape of a
+        single :any:`value`.
 
-        :getter: Return the current values
+        :getter: Return a view of the current values
         :setter: Check if all new values lie within the :any:`bounds`
         :type: :any:`numpy.ndarray`
         """
-        try:                   self._values # already defined?
-        except AttributeError: self._values = self._default_times # default
-        return self._values # return
+        return self._values_storage.data
 
     @values.setter
     def values(self,newvalues):
         assert isinstance(newvalues,np.ndarray), \
             "values have to be numpy.ndarray"
-        assert newvalues.size == np.prod(newvalues.shape), \
-            "values have to be one-dimensional" 
+        assert newvalues.ndim >= 1, \
+            "values have to be at least one-dimensional" 
         # check if values are inside bounds
         lower, upper = self.bounds
         assert np.all(newvalues >= lower), \
@@ -233,14 +275,25 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         assert np.all(newvalues <= upper), \
             ("{}: new value is greater than upper bound {}").format(
                 self.name,upper)
-        self._values = newvalues
-        # reset intepolator
-        self.interpolator = None
+        self._values_storage.data = newvalues
+        self._history_changed()
 
     @property
     def _default_values(self):
         return np.array([]) # empty array
 
+    @property
+    def _values_storage(self):
+        """ 
+        The storage of the :any:`values`
+
+        :type: :any:`GrowingArray`
+        """
+        try:                   self._values # already defined?
+        except AttributeError: 
+            self._values = self._new_storage("values", self._default_values)
+        return self._values
+
     @property
     def next_time(self):
         """ 
@@ -256,8 +309,9 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         """
         try:                   next_time = self._next_time
         except AttributeError: next_time = self.time_function()
-        if self.times.size:
-            assert next_time >= self.times.max(), \
+        times = self._times_storage
+        if len(times):
+            assert next_time >= times.last, \
                 "next_time has to be later than current time"
         return next_time
 
@@ -269,8 +323,9 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
             assert utils.is_numeric(newtime), "next_time has to be numeric"
             assert np.asarray(newtime).size == 1, \
                 "next_time has to be one value"
-            if self.times.size:
-                assert newtime >= self.times.max(), \
+            times = self._times_storage
+            if len(times):
+                assert newtime >= times.last, \
                     "next_time has to be later than current time"
             self._next_time = newtime
 
@@ -284,7 +339,9 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
             :any:`times`.
         :type: :any:`float`
         """
-        return self.times[-1]
+        times = self._times_storage
+        if not len(times): raise IndexError("no times recorded yet")
+        return times.last
 
     @property
     def times(self):
@@ -292,21 +349,18 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         All times the :any:`value` has ever been set in chronological
         order 
 
+        :getter: Return a view of the current times
         :type: :any:`numpy.ndarray`
         """
-        try:                   self._times # already defined?
-        except AttributeError: self._times = self._default_times # default
-        return self._times # return
+        return self._times_storage.data
 
     @times.setter
     def times(self,newtimes):
         assert isinstance(newtimes,np.ndarray), "times have to be numpy.ndarray"
-        assert newtimes.size == np.prod(newtimes.shape), \
-            "times have to be one-dimensional" 
+        assert newtimes.ndim == 1, "times have to be one-dimensional" 
         assert np.all(np.diff(newtimes)>0), "times must be strictly increasing"
-        self._times = newtimes
-        # reset intepolator
-        self.interpolator = None
+        self._times_storage.data = newtimes
+        self._history_changed()
 
     @property
     def _default_times(self):
@@ -318,6 +372,18 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         """
         return np.array([]) # empty array
 
+    @property
+    def _times_storage(self):
+        """ 
+        The storage of the :any:`times`
+
+        :type: :any:`GrowingArray`
+        """
+        try:                   self._times # already defined?
+        except AttributeError: 
+            self._times = self._new_storage("times", self._default_times)
+        return self._times
+
     @property
     def bounds(self):
         """ 
@@ -389,11 +455,32 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         """
         return None
 
+    @property
+    def archive(self):
+        """ 
+        Where to move :any:`values` older than the :any:`remembrance` to
+        instead of discarding them. The values are moved in batches of
+        :any:`Archive.batch` samples. Set to :any:`None` to discard old
+        values. See :any:`full_history` to retrieve all values.
+
+        :type: :any:`Archive` or :any:`None`
+        """
+        try:                   self._archive # already defined?
+        except AttributeError: self._archive = None
+        return self._archive # return
+
+    @archive.setter
+    def archive(self, newarchive):
+        assert newarchive is None or isinstance(newarchive, storage.Archive), \
+            "archive has to be None or Archive"
+        self._archive = newarchive
+
     @property
     def interpolation(self):
         """ 
-        The interpolation kind to use in the :any:`__call__` method. See
-        :any:`scipy.interpolate.interp1d` for documentation.
+        The interpolation kind to use in the :any:`__call__` method. The kinds
+        in :any:`HistoryInterpolator.kinds` are interpolated natively, all
+        other kinds with :any:`scipy.interpolate.interp1d`.
 
         :getter:
             Return the interplation kind.
@@ -425,25 +512,121 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         """
         return "zero"
 
+    @property
+    def cursor(self):
+        """ 
+        Whether single-time lookups should remember the position in the
+        :any:`times` and walk forward from there on the next lookup. This
+        makes time-ordered lookups like during an integration constant in time
+        instead of logarithmic in the number of recorded :any:`times`. Only
+        has an effect for interpolation kinds in
+        :any:`HistoryInterpolator.kinds`.
+
+        :type: :any:`bool`
+        """
+        try:                   self._cursor # already defined?
+        except AttributeError: self._cursor = self._default_cursor
+        return self._cursor # return
+
+    @cursor.setter
+    def cursor(self, newcursor):
+        self._cursor = bool(newcursor)
+        interpolator = getattr(self, "_interpolator", None)
+        if isinstance(interpolator, interpolation.HistoryInterpolator):
+            interpolator.cursor = self._cursor
+
+    @property
+    def _default_cursor(self):
+        """ 
+        Default :any:`cursor` if none was given.
+
+        :type: :any:`bool`
+        """
+        return False
+
+    @property
+    def journal(self):
+        """ 
+        The journal to record each new :any:`value` in. Replacing the
+        history via :any:`times` and :any:`values` is not recorded. Set to
+        :any:`None` to record nothing.
+
+        :type: :any:`Journal` or :any:`None`
+        """
+        try:                   self._journal # already defined?
+        except AttributeError: self._journal = None
+        return self._journal # return
+
+    @journal.setter
+    def journal(self, newjournal):
+        assert newjournal is None or isinstance(newjournal, checkpoint.Journal),\
+            "journal has to be None or Journal"
+        self._journal = newjournal
+
+    @property
+    def history_store(self):
+        """ 
+        Where to store the :any:`times` and :any:`values`. ``None`` means in
+        memory. With a :any:`MemmapStorage`, the history is kept in files
+        named after the :any:`id` at the time the store is set, so that long
+        histories don't have to fit into memory.
+
+        :getter:
+            Return the current history store
+        :setter:
+            Set the history store and move the recorded history there
+        :type: :any:`MemmapStorage` or ``None``
+        """
+        try:                   self._history_store # already defined?
+        except AttributeError: self._history_store = None
+        return self._history_store # return
+
+    @history_store.setter
+    def history_store(self, newhistory_store):
+        assert newhistory_store is None \
+            or isinstance(newhistory_store, storage.MemmapStorage), \
+            "history_store has to be None or MemmapStorage"
+        times, values = self._times_storage.data, self._values_storage.data
+        if newhistory_store is None: # move into memory
+            times, values = np.array(times), np.array(values)
+        self._history_store = newhistory_store
+        self._times = self._new_storage("times", times)
+        self._values = self._new_storage("values", values)
+        self.interpolator = None # the interpolator uses the old storage
+        self._history_changed()
+
     @property
     def interpolator(self):
         """ 
         The interpolator for interpolation of :any:`values` over :any:`times`.
-        Creating this interpolator is costly and thus only performed on demand,
-        i.e. when :any:`__call__` is called **and** no interpolator was created
-        previously or the previously created interolator was unset before (e.g.
-        by setting a new :any:`value` or changing :any:`interpolation`)
-
-        :type: :any:`scipy.interpolate.interp1d`
+        The interpolator is created on demand, i.e.  when :any:`__call__` is
+        called **and** no interpolator was created previously or the
+        previously created interpolator was unset before (e.g. by changing
+        :any:`interpolation`). A :any:`HistoryInterpolator` works directly on
+        the history and is kept when new values are recorded. Creating a
+        :any:`scipy.interpolate.interp1d` for other interpolation kinds is
+        costly and has to be redone each time the history changes.
+
+        :type: :any:`HistoryInterpolator` or
+            :any:`scipy.interpolate.interp1d`
         """
         try: self._interpolator # try to access internal attribute
         except AttributeError: # doesn't exist
+            if self.interpolation in interpolation.HistoryInterpolator.kinds:
+                self._interpolator = interpolation.HistoryInterpolator(
+                    times = self._times_storage,
+                    values = self._values_storage,
+                    kind = self.interpolation,
+                    cursor = self.cursor,
+                    )
+                return self._interpolator
             self._interpolator = scipy.interpolate.interp1d( 
                 x = self.times, # the times
                 y = self.values, # the values
                 assume_sorted = True, # times are already sorted
                 copy = False, # don't copy
                 kind = self.interpolation, # interpolation kind
+                axis = 0, # interpolate along the time axis
                 bounds_error = False, # don't escalate on outside values
                 fill_value = (self.values[self.times.argmin()],
                               self.values[self.times.argmax()]), # fill 
@@ -458,49 +641,311 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         assert hasattr(value, "__call__"), "interpolator needs to be callable"
         self._interpolator = value
 
+    @property
+    def version(self):
+        """ 
+        Counter that is increased whenever the recorded :any:`times` or
+        :any:`values` change. Comparing it is a cheap way to find out whether
+        anything was written since it was last read.
+
+        :type: :any:`int`
+        """
+        try:                   self._version
+        except AttributeError: self._version = 0
+        return self._version
+
+    @property
+    def time_invariant(self):
+        """ 
+        Whether the value is the same at all times, i.e. whether at most one
+        value is recorded
+
+        :type: :any:`bool`
+        """
+        return len(self._times_storage) <= 1
+
     ###############
     ### Methods ###
     ###############
+    def _new_storage(self, name, data):
+        """ 
+        Create a storage for the history in the :any:`history_store`
+
+        Args:
+            name (str): ``"times"`` or ``"values"``
+            data (numpy.ndarray): the initial content
+
+        Returns:
+            GrowingArray : the storage
+        """
+        if self.history_store is None:
+            return storage.GrowingArray(data)
+        return self.history_store.array(
+            name = "{}.{}".format(self.id, name), data = data)
+
+    def _history_changed(self):
+        """ 
+        Update internal state after :any:`times` or :any:`values` changed.
+        This resets the :any:`interpolator` if it doesn't work on the history
+        directly and empties the cache of calls and the results of
+        :any:`precompute`, if any. The :any:`version` is increased.
+        """
+        self._version = self.version + 1
+        self._precomputed = None # precomputed results are outdated
+        try: self._call_cache.clear() # cached calls are outdated
+        except AttributeError: pass
+        try: interpolator = self._interpolator
+        except AttributeError: return
+        if not isinstance(interpolator, interpolation.HistoryInterpolator):
+            del self._interpolator
+
+    def extend(self, times, values):
+        """ 
+        Record several values at once. Only the new values are checked: the
+        times have to be strictly increasing and later than the current last
+        :any:`time` and the values have to lie within the :any:`bounds`.
+
+        Args:
+            times (1d numpy.ndarray): the new times
+            values (numpy.ndarray): the new values corresponding to the
+                times. The first axis is the time axis.
+        """
+        assert utils.is_numeric(times), "times have to be numeric"
+        assert utils.is_numeric(values), "values have to be numeric"
+        times, values = np.asarray(times), np.asarray(values)
+        assert times.ndim == 1, "times have to be one-dimensional"
+        assert values.ndim >= 1 and values.shape[0] == times.shape[0], \
+            "{}: times and values are of different size".format(self.name)
+        if not times.size: # nothing to do
+            return
+        assert np.all(np.diff(times) > 0), "times must be strictly increasing"
+        times_storage = self._times_storage
+        values_storage = self._values_storage
+        if len(times_storage):
+            assert times[0] > times_storage.last, \
+                "{}: new times have to be later than the last time".format(
+                    self.name)
+            shape = values_storage.data.shape[1:]
+            assert values.shape[1:] == shape, \
+                "{}: new values have to be of shape {}".format(self.name,shape)
+        lower, upper = self.bounds
+        assert np.all(values >= lower), \
+            ("{}: new values are smaller than lower bound {}").format(
+                self.name,lower)
+        assert np.all(values <= upper), \
+            ("{}: new values are greater than upper bound {}").format(
+                self.name,upper)
+        times_storage.extend(times)
+        values_storage.extend(values)
+        if not self.journal is None and not hasattr(self, "_scratch_after"):
+            # write-ahead log, scratch values are logged on commit
+            self.journal.extend(self.id, times = times, values = values)
+        self._history_changed()
+        self.forget_old_values()
+
+    def reserve(self, n):
+        """ 
+        Preallocate the history for a number of new values, so that
+        recording them doesn't reallocate the :any:`times` and
+        :any:`values`. See :any:`trim` to release unused space again.
+
+        Args:
+            n (int): the number of values to make room for
+        """
+        self._times_storage.reserve(n, dtype = np.float64)
+        self._values_storage.reserve(n)
+
+    def trim(self):
+        """ 
+        Release the space of the history that is not used, e.g. after
+        :any:`reserve`
+        """
+        self._times_storage.trim()
+        self._values_storage.trim()
+
+    def begin_scratch(self):
+        """ 
+        Treat the values recorded from now on as scratch values, e.g.
+        intermediate stages of an integration step. They are part of the
+        history and can be interpolated like any other values until
+        :any:`commit_scratch` discards all but the last of them. They are
+        not recorded in the :any:`journal`.
+        """
+        times = self._times_storage
+        self._scratch_after = times.last if len(times) else -np.inf
+
+    def commit_scratch(self):
+        """ 
+        Discard the values recorded since :any:`begin_scratch` except the
+        last one, which is recorded in the :any:`journal`
+        """
+        try:                   after = self._scratch_after
+        except AttributeError: return
+        del self._scratch_after
+        times, values = self._times_storage, self._values_storage
+        start = np.searchsorted(times.data, after, side = "right")
+        if not self.journal is None and len(times) > start:
+            self.journal.record(self.id, times.last, values.last)
+        if len(times) - start <= 1: # nothing to discard
+            return
+        last_time, last_value = times.last, np.array(values.last)
+        times.truncate(start)
+        values.truncate(start)
+        times.append(last_time)
+        values.append(last_value)
+        self._history_changed()
+
+    def restore_history(self, times, values):
+        """ 
+        Replace the recorded :any:`times` and :any:`values` without any
+        checks, e.g. to restore a history that was recorded earlier. The
+        arrays are used directly without copying if possible.
+
+        Args:
+            times (numpy.ndarray): the times
+            values (numpy.ndarray): the values corresponding to the times
+        """
+        self._times_storage.data = times
+        self._values_storage.data = values
+        self._history_changed()
+
+    def add_member_axis(self, size):
+        """ 
+        Turn this :any:`InterfaceValue` into an ensemble by repeating all
+        :any:`values` along a new member axis. The member axis is the first
+        axis of a single :any:`value`, i.e. it directly follows the time axis
+        of :any:`values`. New values then have to be given for all members
+        or as single value used for all members.
+
+        Args:
+            size (int): the number of ensemble members
+        """
+        assert int(size) > 0, "size has to be a positive integer"
+        values = self.values
+        self.values = np.repeat(values[:, np.newaxis], int(size), axis = 1)
+
     def forget_old_values(self):
         """ 
         Drop :any:`values` and :any:`times` older than :any:`remembrance`.
+        If an :any:`archive` is set, they are only dropped once a whole
+        :any:`Archive.batch` of them can be moved into it.
 
         Returns:
             bool : :any:`True` is data was dropped, :any:`False` otherwise
         """
         res = False
         if not self.remembrance is None: # remembrance was set
-            assert self.times.size == self.values.size,\
+            times, values = self._times_storage, self._values_storage
+            assert len(times) == len(values),\
                 "times and values are of different size!"
-            up_to_date = self.times >= ( self.time - self.remembrance )
-            self._times  = self.times[up_to_date]
-            self._values = self.values[up_to_date]
+            # times are sorted, so the outdated ones are at the beginning
+            outdated = np.searchsorted(times.data, 
+                times.last - self.remembrance, side = "left")
+            archive = self.archive
+            if not archive is None:
+                if outdated < archive.batch: # wait for a full batch
+                    outdated = 0
+                else: # spill into the archive
+                    archive.append(times.data[:outdated], 
+                        values.data[:outdated])
+            times.drop(outdated)
+            values.drop(outdated)
+            if outdated: self._history_changed()
             res = True
         return res
 
+    def full_history(self):
+        """ 
+        Obtain all values ever recorded, including those moved to the
+        :any:`archive`
+
+        Returns:
+            tuple : the :any:`numpy.ndarray` s of all times and values
+        """
+        times, values = self.times, self.values
+        if self.archive is None:
+            return times.copy(), values.copy()
+        archived_times, archived_values = self.archive.read()
+        if archived_times is None:
+            return times.copy(), values.copy()
+        return ( np.concatenate([archived_times, times]), 
+            np.concatenate([archived_values, values]) )
+
+    def precompute(self, times):
+        """ 
+        Evaluate the value at many times in one go and look the results up
+        when called with exactly one of these times afterwards. The results
+        are dropped when the history changes.
+
+        Args:
+            times (numpy.ndarray or None): the times. Set to :any:`None` to
+                drop the results.
+        """
+        if times is None:
+            self._precomputed = None
+            return
+        assert utils.is_numeric(times), "times have to be numeric"
+        times = np.unique(np.asarray(times, dtype = float))
+        self._precomputed = (times, np.asarray(self._evaluate(times)), [0])
+
     def __call__(self, times = None):
         """ 
         When called, return the value, optionally at a specific time
 
         Args:
             times (numeric, optional): The times to obtain data from
+
+        Returns:
+            numeric or :any:`numpy.ndarray` : the values at the given times.
+            The shape is the shape of ``times`` followed by the shape of a
+            single :any:`value`.
+
+        Note:
+            While a :any:`NumericalScheme` integrates a step, the results for
+            single times are cached until the history changes. Results
+            calculated with :any:`precompute` are looked up.
+        """
+        table = self._precomputed
+        if not table is None and not times is None and not np.ndim(times):
+            precomputed_times, precomputed_values, hint = table
+            index = hint[0] # times are mostly requested in order
+            if index >= precomputed_times.size or \
+                precomputed_times[index] != times:
+                index = precomputed_times.searchsorted(times)
+            if index < precomputed_times.size and \
+                precomputed_times[index] == times: # exactly this time
+                hint[0] = index + 1
+                return precomputed_values[index]
+        try:                   cache = self._call_cache
+        except AttributeError: cache = None
+        if cache is None or np.ndim(times): # no caching
+            return self._evaluate(times)
+        key = times if times is None else float(times)
+        try:             return cache[key]
+        except KeyError: value = cache[key] = self._evaluate(times)
+        return value
+
+    def _evaluate(self, times = None):
+        """ 
+        Obtain the value, optionally at a specific time, without caching
+
+        Args:
+            times (numeric, optional): The times to obtain data from
+
+        Returns:
+            numeric or :any:`numpy.ndarray` : the values at the given times.
         """
-        assert self.times.size, "{}: no values recorded yet".format(self.name)
+        assert len(self._times_storage), \
+            "{}: no values recorded yet".format(self.name)
         if times is None:
             # no time given or only one value there
             return self.values[-1]
         assert utils.is_numeric(times), "times have to be numeric"
         times = np.asarray(times) # convert to numpy array
         if self.times.size == 1: 
-            return np.ones_like(times) * self.values[-1]
+            return interpolation.constant(times, self.values[-1])
 
-        if self.interpolation == "zero":
-            # "zero" interoplation returns the left neighbour on the last value?
-            # not the last value itselt? Strange...
-            # If we request this specific time, we want to have it!
-            return self.interpolator(times+1e-10) # return
-        else:
-            return self.interpolator(times) # return
+        return self.interpolator(times) # return
 
     def __str__(self): # pragma: no cover
         """ 
@@ -509,7 +954,7 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         Returns:
             str : a summary
         """
-        if self.values.size: value = self.value
+        if len(self.values): value = self.value
         else:                value = "?"
         string = (
         " \"{name}\" \n"
@@ -519,7 +964,7 @@ class InterfaceValue(utils.LoggerObject,utils.ReprObject):
         "interpolation: {interp} \n"
         "{nr} total recorded values"
         ).format(id=self.id,unit=self.unit,interp=self.interpolation,
-        name=self.name,value=value,nr=self.values.size,bounds=self.bounds)
+        name=self.name,value=value,nr=len(self.values),bounds=self.bounds)
         return string
         
 ####################################
@@ -541,10 +986,424 @@ class ForcingValue(InterfaceValue):
     def _default_interpolation(self):
         return "linear"
 
+class FileForcingValue(ForcingValue):
+    """ 
+    Forcing value read from a time series file in chunks. Only the time
+    window that is needed is loaded: when the value is requested at a time
+    later than the last loaded time (plus the :any:`readahead`), the next
+    chunks are read from the :any:`source`. If a :any:`remembrance` is set,
+    samples older than the :any:`remembrance` before the latest requested
+    time are dropped again. Requesting an earlier time than loaded then
+    reads the file from the beginning again.
+
+    Args:
+        filename (str, optional): the ``.csv``, ``.npy`` or ``.npz`` file.
+            See :any:`open_file` for the formats.
+        chunksize (int, optional): the number of samples to read at once.
+            Defaults to 1024.
+        readahead (float, optional): time span to load beyond the requested
+            time. Defaults to 0.
+        members (int, optional): the number of ensemble members to repeat
+            the chunks read for. See :any:`add_member_axis`.
+
+    The remaining arguments are those of :any:`InterfaceValue`.
+    """
+    def __init__(self, filename = None, chunksize = None, readahead = None,
+        name = None, id = None, unit = None, time_function = None,
+        interpolation = None, values = None, times = None, bounds = None,
+        remembrance = None, cursor = None, history_store = None,
+        archive = None, members = None):
+        ForcingValue.__init__(self, name = name, id = id, unit = unit,
+            time_function = time_function, interpolation = interpolation,
+            values = values, times = times, bounds = bounds,
+            remembrance = remembrance, cursor = cursor,
+            history_store = history_store, archive = archive)
+        if not filename is None:
+            self.filename = filename
+        if not chunksize is None:
+            self.chunksize = chunksize
+        if not readahead is None:
+            self.readahead = readahead
+        if not members is None:
+            self.members = members
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def filename(self):
+        """ 
+        The time series file
+
+        :type: :any:`str` or :any:`None`
+        """
+        try:                   return self._filename
+        except AttributeError: return None
+
+    @filename.setter
+    def filename(self, newfilename):
+        self._source = sources.open_file(newfilename)
+        self._filename = newfilename
+
+    @property
+    def source(self):
+        """ 
+        The opened :any:`filename`
+
+        :type: :any:`TimeSeriesFile` or :any:`None`
+        """
+        try:                   return self._source
+        except AttributeError: return None
+
+    @property
+    def chunksize(self):
+        """ 
+        The number of samples to read from the :any:`source` at once
+
+        :type: :any:`int`
+        """
+        try:                   self._chunksize
+        except AttributeError: self._chunksize = self._default_chunksize
+        return self._chunksize
+
+    @chunksize.setter
+    def chunksize(self, newchunksize):
+        assert int(newchunksize) > 0, "chunksize has to be a positive integer"
+        self._chunksize = int(newchunksize)
+
+    @property
+    def _default_chunksize(self):
+        return 1024
+
+    @property
+    def readahead(self):
+        """ 
+        The time span to load beyond the requested time
+
+        :type: :any:`float`
+        """
+        try:                   self._readahead
+        except AttributeError: self._readahead = self._default_readahead
+        return self._readahead
+
+    @readahead.setter
+    def readahead(self, newreadahead):
+        readahead = float(newreadahead)
+        assert readahead >= 0, "readahead has to be positive float"
+        self._readahead = readahead
+
+    @property
+    def _default_readahead(self):
+        return 0.
+
+    @property
+    def members(self):
+        """ 
+        The number of ensemble members the chunks read from the
+        :any:`source` are repeated for or :any:`None` if this is no
+        ensemble. Setting it does not change the values already loaded. Use
+        :any:`add_member_axis` to turn this value into an ensemble.
+
+        :type: :any:`int` or :any:`None`
+        """
+        try:                   return self._members
+        except AttributeError: return None
+
+    @members.setter
+    def members(self, newmembers):
+        assert int(newmembers) > 0, "members has to be a positive integer"
+        self._members = int(newmembers)
+
+    @property
+    def journal(self):
+        """ 
+        Always :any:`None`: the values read can be read from the
+        :any:`source` again, so they are not journaled. Setting a journal
+        has no effect.
+
+        :type: :any:`None`
+        """
+        return None
+
+    @journal.setter
+    def journal(self, newjournal):
+        assert newjournal is None or isinstance(newjournal, checkpoint.Journal),\
+            "journal has to be None or Journal"
+
+    @property
+    def time_invariant(self):
+        """ 
+        Whether the value is the same at all times. This is only known
+        once the whole :any:`source` was read.
+
+        :type: :any:`bool`
+        """
+        source = self.source
+        if not source is None and not source.exhausted:
+            return False
+        return ForcingValue.time_invariant.fget(self)
+
+    ###############
+    ### Methods ###
+    ###############
+    def load(self, until = None):
+        """ 
+        Read the next chunks from the :any:`source` until the loaded times
+        cover a given time plus the :any:`readahead`
+
+        Args:
+            until (float, optional): the time to load. Defaults to loading
+                only if nothing is loaded yet.
+        """
+        source = self.source
+        if source is None:
+            return
+        times = self._times_storage
+        if until is None: 
+            if len(times): return
+            until = -np.inf
+        else:
+            until = float(until)
+            self._requested = max(until, getattr(self, "_requested", until))
+            if len(times) and until < times.data[0] and \
+                getattr(self, "_dropped", False): # read from the start again
+                self._requested = until
+                self.restore_history(times = np.array([]), 
+                    values = np.array([]))
+                self._dropped = False
+                source.rewind()
+        members = self.members
+        target = until + self.readahead
+        while not source.exhausted and (not len(times) or times.last < target):
+            new_times, new_values = source.read(self.chunksize)
+            if len(times): # skip what is already there
+                new = new_times > times.last
+                new_times, new_values = new_times[new], new_values[new]
+            if members: # ensemble
+                new_values = np.repeat(np.expand_dims(new_values, 1), 
+                    members, axis = 1)
+            self.extend(new_times, new_values)
+
+    def add_member_axis(self, size):
+        """ 
+        Turn this value into an ensemble by repeating the loaded
+        :any:`values` and all chunks read later along a new member axis
+
+        Args:
+            size (int): the number of ensemble members
+        """
+        assert int(size) > 0, "size has to be a positive integer"
+        if len(self._times_storage):
+            ForcingValue.add_member_axis(self, size)
+        self.members = size
+
+    def forget_old_values(self):
+        """ 
+        Drop :any:`values` and :any:`times` older than :any:`remembrance`
+        before the latest time requested. The last sample before that is
+        kept for interpolation. While a call is evaluated, nothing it needs
+        is dropped. Dropped samples can be read from the :any:`source`
+        again.
+
+        Returns:
+            bool : :any:`True` is data was dropped, :any:`False` otherwise
+        """
+        try:                   requested = self._requested
+        except AttributeError: return False
+        if self.remembrance is None:
+            return False
+        since = requested - self.remembrance
+        try:                   since = min(since, self._needed_since)
+        except AttributeError: pass
+        times, values = self._times_storage, self._values_storage
+        outdated = np.searchsorted(times.data, since, side = "right") - 1
+        if outdated <= 0:
+            return False
+        times.drop(outdated)
+        values.drop(outdated)
+        self._dropped = True
+        self._history_changed()
+        return True
+
+    def _evaluate(self, times = None):
+        if times is None:
+            self.load()
+            return ForcingValue._evaluate(self, times)
+        self._needed_since = np.min(times) # keep the whole window loaded
+        try:
+            self.load(until = self._needed_since) # rewind if necessary
+            self.load(until = np.max(times))
+            result = ForcingValue._evaluate(self, times)
+        finally:
+            del self._needed_since
+        self.forget_old_values()
+        return result
+
+class FunctionForcingValue(ForcingValue):
+    """ 
+    Forcing value given by a function of time, e.g. an analytic diurnal
+    cycle. Calling it evaluates the :any:`function` directly, no
+    :any:`times` and :any:`values` are stored and no :any:`interpolator` is
+    built. Its :any:`value` can't be set.
+
+    Args:
+        function (callable or str, optional): vectorized function taking an
+            array of times and returning the values at these times. The
+            first axes of the result are the axes of the times. May also be
+            given as full import path like ``"numpy.sin"``. Only importable
+            functions can be saved in a checkpoint (see
+            :any:`NumericalModel.save_checkpoint`).
+        members (int, optional): the number of ensemble members to repeat
+            the results for. See :any:`add_member_axis`.
+
+    The remaining arguments are those of :any:`InterfaceValue`.
+    """
+    def __init__(self, function = None, name = None, id = None, unit = None,
+        time_function = None, interpolation = None, values = None,
+        times = None, bounds = None, remembrance = None, cursor = None,
+        history_store = None, archive = None, members = None):
+        ForcingValue.__init__(self, name = name, id = id, unit = unit,
+            time_function = time_function, interpolation = interpolation,
+            values = values, times = times, bounds = bounds,
+            remembrance = remembrance, cursor = cursor,
+            history_store = history_store, archive = archive)
+        if not function is None:
+            self.function = function
+        if not members is None:
+            self.members = members
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def function(self):
+        """ 
+        The function of time
+
+        :type: callable
+        """
+        try:                   self._function
+        except AttributeError: self._function = self._default_function
+        return self._function
+
+    @function.setter
+    def function(self, newfunction):
+        if isinstance(newfunction, str):
+            newfunction = checkpoint.import_class(newfunction)
+        assert hasattr(newfunction, "__call__"), "function has to be callable"
+        self._function = newfunction
+
+    @property
+    def _default_function(self):
+        return np.zeros_like
+
+    @property
+    def members(self):
+        """ 
+        The number of ensemble members the :any:`function`'s results are
+        repeated for or :any:`None` if this is no ensemble
+
+        :type: :any:`int` or :any:`None`
+        """
+        try:                   return self._members
+        except AttributeError: return None
+
+    @members.setter
+    def members(self, newmembers):
+        assert int(newmembers) > 0, "members has to be a positive integer"
+        self._members = int(newmembers)
+
+    @property
+    def value(self):
+        """ 
+        The current value, i.e. the :any:`function` evaluated at the
+        current time given by :any:`time_function`. Setting it is not
+        possible.
+
+        :type: numeric or :any:`numpy.ndarray`
+        """
+        return self()
+
+    @value.setter
+    def value(self, newvalue):
+        raise AttributeError("{}: value is given by a function and can't "
+            "be set".format(self.name))
+
+    @property
+    def time_invariant(self):
+        """ 
+        Always :any:`False` as the :any:`function` may vary with time
+
+        :type: :any:`bool`
+        """
+        return False
+
+    ###############
+    ### Methods ###
+    ###############
+    def add_member_axis(self, size):
+        """ 
+        Turn this value into an ensemble by repeating the :any:`function`'s
+        results along a new member axis
+
+        Args:
+            size (int): the number of ensemble members
+        """
+        assert int(size) > 0, "size has to be a positive integer"
+        self.members = size
+
+    def _evaluate(self, times = None):
+        """ 
+        Evaluate the :any:`function`
+
+        Args:
+            times (numeric, optional): The times to evaluate the function
+                at. Defaults to the current time given by
+                :any:`time_function`.
+
+        Returns:
+            numeric or :any:`numpy.ndarray` : the values at the given times.
+        """
+        if times is None: times = self.time_function()
+        assert utils.is_numeric(times), "times have to be numeric"
+        times = np.asarray(times)
+        result = np.asarray(self.function(times))
+        members = self.members
+        if members is None:
+            return result
+        return np.repeat(np.expand_dims(result, times.ndim), members,
+            axis = times.ndim)
+
 class Parameter(InterfaceValue):
     """ 
     Class for parameters
+
+    Args:
+        frozen (bool, optional): whether the parameter is constant. See
+            :any:`frozen`. Defaults to ``False``.
+
+    The other arguments are those of :any:`InterfaceValue`.
+    """
+    _constant = None
     """
+    The current value of a :any:`frozen` parameter
+    """
+
+    def __init__(self, name = None, id = None, unit = None,
+        time_function = None, interpolation = None, values = None,
+        times = None, bounds = None, remembrance = None, cursor = None,
+        history_store = None, archive = None, frozen = None):
+        InterfaceValue.__init__(self, name = name, id = id, unit = unit,
+            time_function = time_function, interpolation = interpolation,
+            values = values, times = times, bounds = bounds,
+            remembrance = remembrance, cursor = cursor,
+            history_store = history_store, archive = archive)
+        if not frozen is None:
+            self.frozen = frozen
+
+    ##################
+    ### Properties ###
+    ##################
     @property
     def _default_id(self):
         return "unnamed_parameter"
@@ -557,6 +1416,85 @@ class Parameter(InterfaceValue):
     def _default_interpolation(self):
         return "linear"
 
+    @property
+    def frozen(self):
+        """ 
+        Whether the parameter is constant. A frozen parameter has the last
+        recorded value at all times: reading it just returns that value
+        without interpolation, it is :any:`time_invariant` and setting its
+        :any:`value` raises an :any:`AttributeError` until it is unfrozen
+        again.
+
+        :type: :any:`bool`
+        """
+        try:                   return self._frozen
+        except AttributeError: return False
+
+    @frozen.setter
+    def frozen(self, newfrozen):
+        self._frozen = bool(newfrozen)
+        self._update_constant()
+
+    @property
+    def value(self):
+        """ 
+        The current value. See :any:`InterfaceValue.value`. Setting the
+        value of a :any:`frozen` parameter raises an :any:`AttributeError`.
+
+        :type: numeric or :any:`numpy.ndarray`
+        """
+        constant = self._constant
+        if constant is None:
+            return self()
+        return constant
+
+    @value.setter
+    def value(self, newvalue):
+        if self.frozen:
+            raise AttributeError("{}: parameter is frozen".format(self.name))
+        InterfaceValue.value.fset(self, newvalue)
+
+    @property
+    def time_invariant(self):
+        """ 
+        Whether the value is the same at all times, i.e. whether the
+        parameter is :any:`frozen` or at most one value is recorded
+
+        :type: :any:`bool`
+        """
+        return self.frozen or InterfaceValue.time_invariant.fget(self)
+
+    ###############
+    ### Methods ###
+    ###############
+    def _update_constant(self):
+        """ 
+        Update the value returned by a :any:`frozen` parameter
+        """
+        if self.frozen and len(self._values_storage):
+            constant = np.array(self._values_storage.last)
+            constant.setflags(write = False)
+            self._constant = constant[()] if constant.ndim == 0 else constant
+        else:
+            self._constant = None
+
+    def _history_changed(self):
+        InterfaceValue._history_changed(self)
+        self._update_constant()
+
+    def extend(self, times, values):
+        if self.frozen:
+            raise AttributeError("{}: parameter is frozen".format(self.name))
+        InterfaceValue.extend(self, times = times, values = values)
+
+    def __call__(self, times = None):
+        constant = self._constant
+        if constant is None:
+            return InterfaceValue.__call__(self, times)
+        if times is None or not np.ndim(times):
+            return constant
+        return interpolation.constant(np.asarray(times), constant)
+
 class StateVariable(InterfaceValue):
     """ 
     Class for state variables
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# system modules
+import operator
+
+# internal modules
+from . import utils
+from . import storage
+
+# external modules
+import numpy as np
+
+
+class HistoryInterpolator(utils.LoggerObject,utils.ReprObject):
+    """
+    Interpolator that works directly on a growing history. As the
+    :any:`GrowingArray` s are read anew on every call, the interpolator never
+    has to be rebuilt when the history changes. Values outside the time range
+    are filled with the first or last value, respectively. The values may be
+    arrays themselves, they are interpolated along the time axis.
+
+    Args:
+        times (GrowingArray, optional): the times
+        values (GrowingArray, optional): the values corresponding to the times
+        kind (str, optional): the interpolation kind. One of :any:`kinds`.
+            Defaults to ``"zero"``.
+        cursor (bool, optional): whether to remember the position of the last
+            single-time lookup and walk forward from there on the next one.
+            This makes time-ordered lookups constant in time. Defaults to
+            ``False``.
+    """
+    kinds = ("zero", "nearest", "linear")
+    """
+    The supported interpolation kinds. They behave like the corresponding
+    kinds of :any:`scipy.interpolate.interp1d`, except that ``"zero"``
+    interpolation returns the value itself when exactly its time is requested.
+    """
+
+    cursor_steps = 8
+    """
+    The maximum number of steps the :any:`cursor` walks forward before a
+    binary search is done instead
+    """
+
+    def __init__(self, times = None, values = None, kind = None, 
+        cursor = None):
+        if not times is None:
+            self.times = times
+        if not values is None:
+            self.values = values
+        if not kind is None:
+            self.kind = kind
+        if not cursor is None:
+            self.cursor = cursor
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def times(self):
+        """
+        The times
+
+        :type: :any:`GrowingArray`
+        """
+        try:                   self._times
+        except AttributeError: self._times = storage.GrowingArray()
+        return self._times
+
+    @times.setter
+    def times(self, newtimes):
+        assert isinstance(newtimes, storage.GrowingArray), \
+            "times have to be GrowingArray"
+        self._times = newtimes
+
+    @property
+    def values(self):
+        """
+        The values
+
+        :type: :any:`GrowingArray`
+        """
+        try:                   self._values
+        except AttributeError: self._values = storage.GrowingArray()
+        return self._values
+
+    @values.setter
+    def values(self, newvalues):
+        assert isinstance(newvalues, storage.GrowingArray), \
+            "values have to be GrowingArray"
+        self._values = newvalues
+
+    @property
+    def kind(self):
+        """
+        The interpolation kind
+
+        :type: :any:`str`
+        """
+        try:                   self._kind
+        except AttributeError: self._kind = self._default_kind
+        return self._kind
+
+    @kind.setter
+    def kind(self, newkind):
+        assert newkind in self.kinds, \
+            "kind has to be one of {}".format(", ".join(self.kinds))
+        self._kind = newkind
+
+    @property
+    def _default_kind(self):
+        """
+        The default interpolation kind if none was given
+
+        :type: :any:`str`
+        """
+        return "zero"
+
+    @property
+    def cursor(self):
+        """
+        Whether to remember the position of the last single-time lookup and
+        walk forward from there on the next one
+
+        :type: :any:`bool`
+        """
+        try:                   self._cursor
+        except AttributeError: self._cursor = self._default_cursor
+        return self._cursor
+
+    @cursor.setter
+    def cursor(self, newcursor):
+        self._cursor = bool(newcursor)
+        self._position = 0
+
+    @property
+    def _default_cursor(self):
+        """
+        Default behaviour for :any:`cursor`
+
+        :type: :any:`bool`
+        """
+        return False
+
+    ###############
+    ### Methods ###
+    ###############
+    def _searchsorted(self, times, x, side):
+        """
+        Find the indices where to insert x into times to keep them sorted, like
+        :any:`numpy.searchsorted`. For single times and an enabled
+        :any:`cursor`, the search starts at the last found index.
+
+        Args:
+            times (numpy.ndarray): the sorted times
+            x (numeric): the times to search for
+            side (str): ``"left"`` or ``"right"``. See
+                :any:`numpy.searchsorted`.
+
+        Returns:
+            int or numpy.ndarray: the indices
+        """
+        if not self.cursor or np.ndim(x):
+            return np.searchsorted(times, x, side = side)
+        # the elements before the insertion index 
+        before = operator.le if side == "right" else operator.lt
+        n = times.shape[0]
+        k = min(getattr(self, "_position", 0), n)
+        if k and not before(times[k-1], x): # went backwards
+            k = np.searchsorted(times, x, side = side)
+        else: # walk forward
+            steps = 0
+            while k < n and before(times[k], x):
+                k += 1
+                steps += 1
+                if steps > self.cursor_steps: # too far
+                    k = np.searchsorted(times, x, side = side)
+                    break
+        self._position = k
+        return k
+
+    def __call__(self, x):
+        """
+        Interpolate the values to given times
+
+        Args:
+            x (numeric): the times to interpolate to
+
+        Returns:
+            numpy.ndarray : the interpolated values. The shape is the shape of
+            ``x`` followed by the shape of a single value.
+        """
+        times, values = self.times.data, self.values.data
+        n = times.shape[0]
+        assert n, "nothing to interpolate"
+        assert values.shape[0] == n, "times and values are of different size"
+        if n == 1:
+            return constant(x, values[0])
+        kind = self.kind
+        if kind == "zero":
+            # last time that is not later than x
+            i = self._searchsorted(times, x, side = "right") - 1
+            i = np.clip(i, 0, n-1)
+            return values[i]
+        elif kind == "nearest":
+            i = np.clip(self._searchsorted(times, x, side = "left"), 1, n-1)
+            # prefer the left neighbour on ties like interp1d does
+            i = i - ( x - times[i-1] <= times[i] - x )
+            return values[i]
+        else: # linear
+            i = np.clip(self._searchsorted(times, x, side = "right"), 1, n-1)
+            left, right = times[i-1], times[i]
+            weight = np.clip((x - left) / (right - left), 0, 1)
+            # broadcast weights over the value dimensions
+            weight = np.reshape(weight, 
+                np.shape(weight) + (1,) * (values.ndim - 1))
+            return values[i-1] * (1 - weight) + values[i] * weight
+
+
+def constant(x, value):
+    """
+    Return a constant value at given times
+
+    Args:
+        x (numeric): the times
+        value (numeric): the value
+
+    Returns:
+        numpy.ndarray : the value at all times. The shape is the shape of
+        ``x`` followed by the shape of ``value``.
+    """
+    ones = np.ones_like(x)
+    return np.reshape(ones, np.shape(ones) + (1,) * np.ndim(value)) * value
@@ -3,11 +3,16 @@
 import logging
 import datetime
 import textwrap
+import pickle
+import itertools
+import concurrent.futures
 
 # internal modules
 from .genericmodel import GenericModel
 from . import interfaces
 from . import numericalschemes
+from . import checkpoint
+from . import storage
 from . import utils
 
 # external modules
@@ -257,6 +262,134 @@ class NumericalModel(GenericModel):
         assert np.array(newtime).size == 1, "model_time has to be one value"
         self._model_time = float(newtime)
 
+    @property
+    def ensemble_size(self):
+        """
+        The number of ensemble members that are integrated at once. 
+
+        :getter:
+            Return the number of ensemble members or :any:`None` if the model
+            is not an ensemble.
+        :setter:
+            Turn the model into an ensemble of a given number of members. All
+            :any:`variables`, :any:`parameters` and :any:`forcing` values get
+            a leading member axis (see :any:`InterfaceValue.add_member_axis`),
+            so the numerical schemes update all members at once. Members can
+            then be perturbed by setting arrays of member values, e.g. 
+            ``model.parameters["a"].value = np.array([0.1,0.2,0.3])``. This
+            should be done after the initial values are set.
+
+        .. note::
+            As the member axis is the leading axis of each value, equations
+            combining values with only a member axis (e.g. a scalar
+            parameter) with field values have to broadcast them accordingly.
+
+        :type: :any:`int` or :any:`None`
+        """
+        try:                   self._ensemble_size # already defined?
+        except AttributeError: self._ensemble_size = None # default
+        return self._ensemble_size # return
+
+    @ensemble_size.setter
+    def ensemble_size(self, newsize):
+        if newsize == self.ensemble_size: # nothing to do
+            return
+        assert self.ensemble_size is None, \
+            "model already is an ensemble of {} members".format(
+            self.ensemble_size)
+        size = int(newsize)
+        assert size > 0, "ensemble_size has to be a positive integer"
+        for values in (self.variables, self.parameters, self.forcing):
+            for value in values.elements:
+                value.add_member_axis(size)
+        self._ensemble_size = size
+
+    @property
+    def journal(self):
+        """
+        The write-ahead journal to record all new values of the
+        :any:`variables`, :any:`parameters` and :any:`forcing` in. Together
+        with the last checkpoint (see :any:`save_checkpoint`), a crashed run
+        can be resumed with :any:`load_checkpoint`.
+
+        :getter:
+            Return the journal or :any:`None` if there is none.
+        :setter:
+            Attach the journal to all current values. Values added afterwards
+            are not journaled.
+
+        :type: :any:`Journal` or :any:`None`
+        """
+        try:                   self._journal # already defined?
+        except AttributeError: self._journal = None # default
+        return self._journal # return
+
+    @journal.setter
+    def journal(self, newjournal):
+        assert newjournal is None or isinstance(newjournal, checkpoint.Journal),\
+            "journal has to be None or Journal"
+        for values in (self.variables, self.parameters, self.forcing):
+            for value in values.elements:
+                value.journal = newjournal
+        self._journal = newjournal
+
+    @property
+    def output_times(self):
+        """
+        The times to record the :any:`variables` at in the :any:`output`.
+        Setting this or :any:`output_interval` enables output decimation:
+        during :any:`integrate`, the histories of the :any:`variables` are
+        limited to the short window the schemes need (see
+        :any:`NumericalScheme.needed_timesteps`) and only the requested
+        records are kept in the :any:`output`. The variables are
+        interpolated to the output times.
+
+        :type: :any:`numpy.ndarray` or :any:`None`
+        """
+        try:                   return self._output_times
+        except AttributeError: return None
+
+    @output_times.setter
+    def output_times(self, newtimes):
+        if newtimes is None:
+            self._output_times = None
+            return
+        assert utils.is_numeric(newtimes), "output_times have to be numeric"
+        self._output_times = np.unique(np.asarray(newtimes, dtype = float))
+
+    @property
+    def output_interval(self):
+        """
+        Record the :any:`variables` in the :any:`output` after every k-th
+        step of :any:`integrate`. See :any:`output_times`.
+
+        :type: :any:`int` or :any:`None`
+        """
+        try:                   return self._output_interval
+        except AttributeError: return None
+
+    @output_interval.setter
+    def output_interval(self, newinterval):
+        if newinterval is None:
+            self._output_interval = None
+            return
+        assert int(newinterval) > 0, \
+            "output_interval has to be a positive integer"
+        self._output_interval = int(newinterval)
+
+    @property
+    def output(self):
+        """
+        The records of the :any:`variables` taken at the :any:`output_times`
+        or every :any:`output_interval` steps
+
+        :type: :any:`dict` of ``{'id': (times, values)}``
+        """
+        try:                   records = self._output
+        except AttributeError: records = {}
+        return { id: (times.data, values.data) 
+            for id, (times, values) in records.items() }
+
     ###############
     ### Methods ###
     ###############
@@ -269,21 +402,342 @@ class NumericalModel(GenericModel):
         """
         return self.model_time
 
-    def integrate(self, final_time):
+    def integrate(self, final_time, timestep = None):
         """ 
         Integrate the model until final_time
 
         Args:
             final_time (float): time to integrate until
+            timestep (float, optional): integrate with this fixed timestep.
+                See :any:`SetOfNumericalSchemes.integrate`. As all times the
+                equations need their input at are then known beforehand
+                (see :any:`SetOfNumericalSchemes.sample_times`), the
+                :any:`forcing` values the equations depend on are evaluated
+                at all of them at once (see :any:`InterfaceValue.precompute`)
+                and only looked up during the integration. A
+                :any:`FileForcingValue` is left out, as it only loads the
+                window of its file that is currently needed.
+
+        If :any:`output_times` or an :any:`output_interval` are set, the
+        histories of the :any:`variables` are decimated and the requested
+        records are collected in the :any:`output`.
         """
         self.logger.info("start integration")
-        self.numericalschemes.integrate( 
-            start_time = self.model_time,
-            final_time = final_time,
-            )
+        forcing = []
+        if not timestep is None:
+            schemes = self.numericalschemes
+            times = schemes.sample_times( start_time = self.model_time,
+                final_time = final_time, timestep = timestep )
+            forcing = [ value for value in self.forcing.elements
+                if not isinstance(value, interfaces.FileForcingValue) 
+                and any( scheme.equation.depends_on(value) 
+                    for scheme in schemes.elements ) ]
+            for value in forcing:
+                value.precompute(times)
+        decimate = not ( self.output_times is None 
+            and self.output_interval is None )
+        if decimate:
+            remembrances = { variable: variable.remembrance 
+                for variable in self.variables.elements }
+            self._limit_histories( timestep if not timestep is None else
+                self.numericalschemes[self.numericalschemes.plan[-1][0]]\
+                .max_timestep )
+            if self.output_interval and not self.output:
+                self._record_output( self.model_time ) # the initial state
+            self._record_output_times( until = self.model_time,
+                after = np.nextafter(self.model_time, -np.inf) )
+        callbacks = []
+        if decimate:
+            callbacks.append(self._output_step)
+        if not self.journal is None:
+            callbacks.append(self._journal_step)
+        def callback(time, timestep):
+            for function in callbacks:
+                function(time, timestep)
+        try:
+            self.numericalschemes.integrate( 
+                start_time = self.model_time,
+                final_time = final_time,
+                timestep = timestep,
+                callback = callback if callbacks else None,
+                )
+        finally:
+            for value in forcing:
+                value.precompute(None)
+            if decimate:
+                for variable, remembrance in remembrances.items():
+                    variable.remembrance = remembrance
         self.model_time = final_time
+        if not self.journal is None: # mark the integration as completed
+            self.journal.record_model_time(self.model_time)
         self.logger.info("end of integration")
 
+    def _limit_histories(self, timestep):
+        """ 
+        Limit the histories of the :any:`variables` to what the schemes need
+        for steps of a given size by setting their
+        :any:`InterfaceValue.remembrance`
+
+        Args:
+            timestep (float): the timestep
+        """
+        windows = {}
+        for scheme in self.numericalschemes.elements:
+            needed = np.asarray(scheme.needed_timesteps(timestep))
+            back = max(-float(np.min(needed)), 0) if needed.size else 0
+            for id in scheme.equation.input.keys():
+                windows[id] = max(windows.get(id, 0), back)
+        for variable in self.variables.elements:
+            # keep the last step for interpolation, with some tolerance
+            variable.remembrance = 2 * max(timestep, 
+                windows.get(variable.id, 0))
+
+    def _record_output(self, time):
+        """ 
+        Record the :any:`variables` in the :any:`output` at a given time
+
+        Args:
+            time (float): the time
+        """
+        try:                   records = self._output
+        except AttributeError: records = self._output = {}
+        for variable in self.variables.elements:
+            try: times, values = records[variable.id]
+            except KeyError: 
+                times, values = records[variable.id] = \
+                    ( storage.GrowingArray(), storage.GrowingArray() )
+            if len(times) and times.last >= time: # already recorded
+                continue
+            times.append(time)
+            values.append(variable(time))
+
+    def _record_output_times(self, after, until):
+        """ 
+        Record the :any:`variables` in the :any:`output` at the
+        :any:`output_times` within a time span
+
+        Args:
+            after (float): the start of the time span, excluded
+            until (float): the end of the time span, included
+        """
+        output_times = self.output_times
+        if output_times is None:
+            return
+        due = output_times[np.searchsorted(output_times, after, 
+            side = "right"):np.searchsorted(output_times, until, 
+            side = "right")]
+        for output_time in due.tolist():
+            self._record_output(output_time)
+
+    def _output_step(self, time, timestep):
+        """ 
+        Record the :any:`output` due after a step of :any:`integrate` and
+        adapt the history windows to the timestep
+
+        Args:
+            time (float): the time at the end of the step
+            timestep (float): the timestep
+        """
+        self._record_output_times( after = time - timestep, until = time )
+        interval = self.output_interval
+        if not interval is None:
+            self._output_steps = getattr(self, "_output_steps", 0) + 1
+            if not self._output_steps % interval:
+                self._record_output(time)
+        self._limit_histories(timestep)
+
+    def _journal_step(self, time, timestep):
+        """ 
+        Mark a step of :any:`integrate` as completed in the :any:`journal`,
+        so that a crash during a long :any:`integrate` call only loses the
+        steps since the last batch of the :any:`journal` was written
+
+        Args:
+            time (float): the time at the end of the step
+            timestep (float): the timestep
+        """
+        self.journal.mark_model_time(time)
+
+    def sweep(self, parameters, final_time, variables = None, times = None,
+        max_workers = None, chunksize = 1):
+        """ 
+        Integrate copies of this model with different parameter values in
+        parallel processes. The model is sent to each worker process only
+        once. 
+
+        Args:
+            parameters (dict or list of dict): the parameter values to use.
+                Either a :any:`list` of ``{'id': value}`` dicts, one for each
+                run, or a ``{'id': [value1, value2, ...]}`` dict which is
+                expanded to all combinations of the given values.
+            final_time (float): time to integrate each run until
+            variables (list of str, optional): the ids of the variables to
+                collect. Defaults to all :any:`variables`.
+            times (numpy.ndarray, optional): the times to interpolate the
+                variables to. Defaults to the recorded times, which then have
+                to be the same for all runs.
+            max_workers (int, optional): the maximum number of worker
+                processes. See :any:`concurrent.futures.ProcessPoolExecutor`.
+            chunksize (int, optional): the number of runs sent to a worker
+                process at once
+
+        Returns:
+            dict : ``{'id': array}`` dict with the variables' values of all
+            runs. The first axis of each array is the run in the order of the
+            given parameters, the second axis is the time.
+        """
+        if isinstance(parameters, dict): # grid of values
+            ids = sorted(parameters)
+            configurations = [ dict(zip(ids, values)) for values in 
+                itertools.product(*[parameters[i] for i in ids]) ]
+        else:
+            configurations = list(parameters)
+        if variables is None: variables = sorted(self.variables.keys())
+        variables = list(variables)
+        tasks = [ (config, final_time, variables, times) 
+            for config in configurations ]
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers = max_workers, 
+            initializer = _sweep_initializer,
+            initargs = (pickle.dumps(self),),
+            ) as executor:
+            results = list(executor.map(_sweep_run, tasks, 
+                chunksize = chunksize))
+        return { var: np.array([ res[var] for res in results ]) 
+            for var in variables }
+
+    def save_checkpoint(self, path):
+        """ 
+        Save the model into a single uncompressed ``.npz`` file. The
+        histories of all :any:`variables`, :any:`parameters` and
+        :any:`forcing` values are stored as binary arrays. Everything else
+        is described in a JSON manifest: the model settings, the
+        :any:`model_time`, the settings of all values and the
+        :any:`numericalschemes` with their equations. The settings are
+        collected from the properties named like the ``__init__`` arguments
+        (see :any:`ReprObject`), so custom classes have to follow that
+        convention and be importable to be restored. Runtime state of the
+        schemes like step counters is not saved. The
+        :any:`InterfaceValue.archive` and :any:`InterfaceValue.history_store`
+        of the values are referred to by their files, which are not copied.
+        If there is a :any:`journal`, it is emptied as the checkpoint now
+        contains everything recorded so far.
+
+        Args:
+            path (str): the file. Note that :any:`numpy.savez` appends
+                ``.npz`` if the path doesn't end with it.
+
+        Raises:
+            ValueError : if a setting can't be stored (see
+                :any:`checkpoint.settings`), e.g. if the
+                :any:`FunctionForcingValue.function` of a
+                :any:`FunctionForcingValue` can't be imported
+        """
+        arrays = {}
+        values = {}
+        kinds = ("variables", "parameters", "forcing")
+        for kind in kinds:
+            values[kind] = []
+            for value in getattr(self, kind).elements:
+                settings = checkpoint.settings(value, 
+                    exclude = ["times","values","time_function"])
+                if isinstance(value, interfaces.FunctionForcingValue) and \
+                    not "function" in settings:
+                    raise ValueError(("{}: function {} can't be imported "
+                        "and thus not be saved").format(value.name,
+                            repr(value.function)))
+                values[kind].append( { 
+                    "class": checkpoint.class_path(value),
+                    "settings": settings,
+                    } )
+                arrays["{}/{}/times".format(kind, value.id)] = value.times
+                arrays["{}/{}/values".format(kind, value.id)] = value.values
+        kind_of = { value.id: kind for kind in kinds
+            for value in getattr(self, kind).elements }
+        schemes = []
+        for scheme in self.numericalschemes.elements:
+            equation = scheme.equation
+            schemes.append( {
+                "class": checkpoint.class_path(scheme),
+                "settings": checkpoint.settings(scheme, exclude=["equation"]),
+                "equation": {
+                    "class": checkpoint.class_path(equation),
+                    "settings": checkpoint.settings(equation, 
+                        exclude = ["variable", "input"]),
+                    "variable": equation.variable.id,
+                    "input": [ [kind_of[i], i] for i in equation.input ],
+                    },
+                } )
+        manifest = {
+            "class": checkpoint.class_path(self),
+            "settings": checkpoint.settings(self, 
+                exclude = kinds + ("numericalschemes",)),
+            "model_time": self.model_time,
+            "ensemble_size": self.ensemble_size,
+            "values": values,
+            "numericalschemes": schemes,
+            "fallback_plan": self.numericalschemes.fallback_plan,
+            }
+        checkpoint.save(path, manifest = manifest, arrays = arrays)
+        if not self.journal is None: # journal now starts at this checkpoint
+            self.journal.reset()
+
+    @classmethod
+    def load_checkpoint(cls, path, mmap = False, journal = None):
+        """ 
+        Restore a model saved with :any:`save_checkpoint`. The histories are
+        restored as they are without checking them again. If a journal is
+        given, it is replayed (see :any:`Journal.replay`) and attached as
+        the model's :any:`journal`.
+
+        Args:
+            path (str): the file
+            mmap (bool, optional): map the histories from the file with
+                copy-on-write instead of reading them into memory. This is
+                useful to inspect large checkpoints. Note that recording new
+                values moves the history into memory.
+            journal (Journal, optional): the journal that was attached to
+                the model when the checkpoint was saved
+
+        Returns:
+            NumericalModel : the restored model
+        """
+        manifest, arrays = checkpoint.load(path, mmap = mmap)
+        sets = { 
+            "variables": interfaces.SetOfStateVariables,
+            "parameters": interfaces.SetOfParameters,
+            "forcing": interfaces.SetOfForcingValues,
+            }
+        values = {}
+        for kind, entries in manifest["values"].items():
+            values[kind] = {}
+            for entry in entries:
+                value = checkpoint.create(entry)
+                value.restore_history(
+                    times = arrays["{}/{}/times".format(kind, value.id)],
+                    values = arrays["{}/{}/values".format(kind, value.id)],
+                    )
+                values[kind][value.id] = value
+        schemes = []
+        for entry in manifest["numericalschemes"]:
+            eq = entry["equation"]
+            equation = checkpoint.create(eq,
+                variable = values["variables"][eq["variable"]],
+                input = interfaces.SetOfInterfaceValues( [ values[kind][i] 
+                    for kind, i in eq["input"] ] ) )
+            schemes.append( checkpoint.create(entry, equation = equation) )
+        model = checkpoint.create(manifest,
+            numericalschemes = numericalschemes.SetOfNumericalSchemes(
+                schemes, fallback_plan = manifest["fallback_plan"]),
+            **{ kind: sets[kind](list(values[kind].values())) 
+                for kind in sets } )
+        model.model_time = manifest["model_time"]
+        model._ensemble_size = manifest["ensemble_size"]
+        if not journal is None:
+            journal.replay(model)
+            model.journal = journal
+        return model
+
     def run_interactively(self): # pragma: no cover
         """ 
         Open a GTK window to interactively run the model:
@@ -358,3 +812,45 @@ class NumericalModel(GenericModel):
             )
 
         return string
+
+
+##########################
+### Sweep worker state ###
+##########################
+_sweep_model = None # the pickled model of a sweep worker process
+
+def _sweep_initializer(pickled_model):
+    """ 
+    Initialize a sweep worker process
+
+    Args:
+        pickled_model (bytes): the pickled model to run
+    """
+    global _sweep_model
+    _sweep_model = pickled_model
+
+def _sweep_run(task):
+    """ 
+    Integrate a fresh copy of the sweep worker's model with given parameters
+
+    Args:
+        task (tuple): ``(parameters, final_time, variables, times)``. See
+            :any:`NumericalModel.sweep`.
+
+    Returns:
+        dict : ``{'id': values}`` dict of the variables' values
+    """
+    parameters, final_time, variables, times = task
+    model = pickle.loads(_sweep_model) # fresh copy
+    model.journal = None # runs must not write into the model's journal
+    for ident, value in parameters.items():
+        parameter = model.parameters[ident]
+        frozen = parameter.frozen
+        parameter.frozen = False # frozen parameters can't be set
+        parameter.value = value
+        parameter.frozen = frozen
+    model.integrate( final_time = final_time )
+    if times is None:
+        return { var: model.variables[var].values.copy() for var in variables }
+    else:
+        return { var: model.variables[var](times) for var in variables }
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # system modules
+import logging
 import textwrap
 import collections
 
@@ -26,6 +27,12 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
             the equation?  
         ignore_nonlinear (bool): ignore the nonlinear part of the equation?
     """
+    adaptive = False
+    """
+    Whether this scheme adapts its timestep while integrating. If so,
+    :any:`integrate` asks for the :any:`max_timestep` after each step.
+    """
+
     def __init__(self, description = None, long_description = None,
         equation = None, fallback_max_timestep = None, 
         ignore_linear = None, ignore_independent = None, 
@@ -248,7 +255,29 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
 
         Returns:
             float : an estimate of the current maximum timestep
+
+        Note:
+            If the equation has
+            :any:`DerivativeEquation.time_independent_parts`, the result is
+            reused as long as its :any:`DerivativeEquation.input_signature`
+            and the :any:`fallback_max_timestep` don't change. If the
+            nonlinear addend was nonzero when the result was calculated, it
+            is also recalculated whenever the variable changes. A nonlinear
+            addend that was zero is assumed to stay zero.
         """
+        equation = self.equation
+        signature = None
+        if equation.time_independent_parts:
+            signature = equation.input_signature()
+        if not signature is None: # time-invariant input
+            signature = ( id(equation), signature, self.fallback_max_timestep )
+            try:
+                cached_signature, version, ts = self._max_timestep_cache
+                if cached_signature == signature and ( version is None 
+                    or version == equation.variable.version ):
+                    return ts
+            except AttributeError:
+                pass
         try:
             try: # try an estimate
                 ts = self.max_timestep_estimate(
@@ -260,6 +289,12 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
         except: # neither estimate nor fallback were sensible
             ts = 1 # default
             raise
+        if not signature is None:
+            version = None # the estimate does not depend on the state
+            if np.any( self.nonlinear_addend( time = time, 
+                variablevalue = variablevalue ) != 0 ):
+                version = equation.variable.version
+            self._max_timestep_cache = (signature, version, ts)
         return ts
 
 
@@ -285,10 +320,10 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
         def smaller_than_time_constant(time = None, variablevalue = None):
             eq = self.equation
             nonlin = eq.nonlinear_addend(time=time,variablevalue=variablevalue)
-            assert nonlin == 0, "not a linear equation"
-            lin = eq.linear_factor(time = time)
-            assert lin < 0, "not a decay equation"
-            tau = abs(1 / lin) # time constant
+            assert np.all(nonlin == 0), "not a linear equation"
+            lin = eq.cached("linear_factor", time = time)
+            assert np.all(lin < 0), "not a decay equation"
+            tau = np.min(abs(1 / lin)) # smallest time constant
             return 0.01 * tau # timestep must be smaller than time constant
         # fallback function
         def nothing(*args,**kwargs):
@@ -299,6 +334,7 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
             EulerExplicit: smaller_than_time_constant,
             EulerImplicit: smaller_than_time_constant,
             RungeKutta4:   smaller_than_time_constant, # TODO correct?
+            AdamsBashforth: smaller_than_time_constant,
             }
 
         fun = schemes.get(self.__class__, nothing ) # get the function
@@ -355,7 +391,7 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
         if self.ignore_linear:
             return 0
         else:
-            return self.equation.linear_factor( time = time )
+            return self._cached( "linear_factor", time = time )
 
     def independent_addend(self, time = None):
         """ 
@@ -373,7 +409,7 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
         if self.ignore_independent:
             return 0
         else:
-            return self.equation.independent_addend( time = time )
+            return self._cached( "independent_addend", time = time )
 
     def nonlinear_addend(self, time = None, variablevalue = None):
         """ 
@@ -393,8 +429,88 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
         if self.ignore_nonlinear:
             return 0
         else:
-            return self.equation.nonlinear_addend( 
-                time = time, variablevalue = variablevalue) 
+            return self._cached( "nonlinear_addend", 
+                time = time, variablevalue = variablevalue)
+
+    def _cached(self, part, time = None, variablevalue = None):
+        """ 
+        Calculate an equation part or look up its result in the cache of the
+        current integration step. Outside of :any:`integrate_step`, the
+        equation part is always calculated. Parts that do not depend on the
+        variable are calculated with :any:`DerivativeEquation.cached` to reuse
+        them across steps if possible.
+
+        Args:
+            part (str): the name of the equation part
+            time (single numeric, optional): the time to pass
+            variablevalue (numpy.ndarray, optional): the variable value to
+                pass to the nonlinear addend
+
+        Returns:
+            numpy.ndarray : the equation part's result
+        """
+        equation = self.equation
+        if part == "nonlinear_addend":
+            def function(): 
+                return equation.nonlinear_addend( time = time, 
+                    variablevalue = variablevalue )
+        else: # parts that don't depend on the variable
+            def function(): 
+                return equation.cached( part, time = time )
+        try:                   cache = self._step_cache
+        except AttributeError: cache = None
+        if cache is None or np.ndim(time): # not cacheable
+            return function()
+        key = [part, time if time is None else float(time)]
+        if not variablevalue is None:
+            state = np.asarray(variablevalue)
+            key.extend([state.shape, state.dtype.str, state.tobytes()])
+        key = tuple(key)
+        try:             return cache[key]
+        except KeyError: result = cache[key] = function()
+        return result
+
+    def _begin_step(self):
+        """ 
+        Enable the caches of equation parts and of the equation's
+        :any:`InterfaceValue` s for an integration step
+        """
+        self._step_cache = {}
+        values = [self.equation.variable] + list(self.equation.input.values())
+        for value in values:
+            value._call_cache = {}
+        self._step_cache_values = values
+
+    def _end_step(self):
+        """ 
+        Drop the caches enabled by :any:`_begin_step`
+        """
+        self._step_cache = None
+        for value in self._step_cache_values:
+            value._call_cache = None
+        self._step_cache_values = []
+
+    def derivative(self, time = None, variablevalue = None):
+        """ 
+        Calculate the equation's derivative, respecting :any:`ignore_linear`,
+        :any:`ignore_independent` and :any:`ignore_nonlinear`.
+
+        Args:
+            time (single numeric, optional): the time to calculate the 
+                derivative. Defaults to the variable's current (last) time.
+            variablevalue (numpy.ndarray, optional): the variable vaulue to use. 
+                Defaults to the value of self.variable at the given time.
+
+        Returns:
+            numeric : the derivative
+        """
+        if variablevalue is None: 
+            variablevalue = self.equation.variable( time )
+        linear = self.linear_factor( time = time )
+        indep  = self.independent_addend( time = time )
+        nonlin = self.nonlinear_addend( 
+            time = time, variablevalue = variablevalue )
+        return linear * variablevalue + indep + nonlin
 
     def integrate(self, time = None, until = None):
         """ Integrate until a certain time, respecting the :any:`max_timestep`.
@@ -406,38 +522,65 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
                 Defaults to one :any:`max_timestep` further.
         """
         assert utils.is_numeric(until), "until needs to be numeric"
+        logger = self.logger
+        debug = logger.isEnabledFor(logging.DEBUG) # only format if needed
         if time is None: time = self.equation.variable.time
         current_max_timestep = self.max_timestep
-        self.logger.debug("current maximum timestep is {}".format(
+        if debug: logger.debug("current maximum timestep is {}".format(
             current_max_timestep))
         if until is None: until = time + current_max_timestep
-        self.logger.debug("integrating until time {}".format(until))
+        if debug: logger.debug("integrating until time {}".format(until))
         time_now = time
         while time_now < until:
-            self.logger.debug(("current time {} is smaller than until time {}"
-                ).format(time_now,until))
+            if debug: logger.debug(("current time {} is smaller than " 
+                "until time {}").format(time_now,until))
             time_left = until - time_now
             if time_left > current_max_timestep: # full max_timestep fits
                 timestep = current_max_timestep
             else:
                 timestep = time_left
-            self.logger.debug(("integrate one step from time {} with " 
+            if debug: logger.debug(("integrate one step from time {} with " 
                 "timestep {}").format(time_now,timestep))
             # integrate one step
-            self.integrate_step( time = time_now, timestep = timestep )
-            time_now += timestep
-        self.logger.debug(("reached until time {}").format(time_now))
+            time_now += self.integrate_step( time = time_now, 
+                timestep = timestep )
+            if self.adaptive: # timestep might have changed
+                current_max_timestep = self.max_timestep
+        if debug: logger.debug(("reached until time {}").format(time_now))
             
 
     def integrate_step(self, time = None, timestep = None):
         """ 
-        Integrate "timestep" forward and set results in-place
+        Integrate "timestep" forward and set results in-place. During the
+        step, the equation parts and the equation's input are evaluated only
+        once per time and variable state.
 
         Args:
             time (single numeric, optional): The time to calculate the step
                 FROM. Defaults to the current variable time.
             timestep (single numeric, optional): The timestep to calculate the
                 step. Defaults to :any:`max_timestep`.
+
+        Returns:
+            single numeric : the timestep that was actually taken
+        """
+        self._begin_step()
+        try:     return self._integrate_step( time = time, timestep = timestep )
+        finally: self._end_step()
+
+    def _integrate_step(self, time = None, timestep = None):
+        """ 
+        Integrate "timestep" forward and set results in-place. Subclasses
+        may override this to change how a step is integrated.
+
+        Args:
+            time (single numeric, optional): The time to calculate the step
+                FROM. Defaults to the current variable time.
+            timestep (single numeric, optional): The timestep to calculate the
+                step. Defaults to :any:`max_timestep`.
+
+        Returns:
+            single numeric : the timestep that was actually taken
         """
         var = self.equation.variable
         if timestep is None: timestep = self.max_timestep
@@ -453,6 +596,7 @@ class NumericalScheme(utils.ReprObject,utils.LoggerObject):
         new = var(time) + tend
         var.value = new # save value
         var.next_time = None # unset next_time
+        return timestep
 
     def step(self, time, timestep, tendency=True):
         """ 
@@ -527,8 +671,62 @@ class EulerExplicit(NumericalScheme):
 
 class EulerImplicit(NumericalScheme):
     """ 
-    Euler-implicit numerical scheme
+    Euler-implicit numerical scheme. The nonlinear part of the equation is
+    treated implicitly with Newton iterations, starting from the solution of
+    the linear part. The Jacobian of the nonlinear part is taken from
+    :any:`DerivativeEquation.nonlinear_jacobian` or estimated with finite
+    differences if the equation does not provide it (see
+    :any:`finite_differences`).
+
+    Args:
+        description (str): short equation description
+        long_description (str): long equation description
+        equation (DerivativeEquation): the equation
+        fallback_max_timestep (single numeric): the fallback maximum timestep
+        ignore_linear (bool): ignore the linear part of the equation?
+        ignore_independent (bool): ignore the variable-independent part of
+            the equation?  
+        ignore_nonlinear (bool): ignore the nonlinear part of the equation?
+        newton_rtol (float): the relative tolerance of the Newton iterations
+        newton_atol (float): the absolute tolerance of the Newton iterations
+        newton_max_iterations (int): the maximum number of Newton iterations
+            per step
+        finite_differences (str): how to estimate the Jacobian with finite
+            differences, ``"full"``, ``"diagonal"`` or ``"auto"``. Defaults
+            to ``"auto"``.
+    """
+    max_full_jacobian_size = 100
+    """ 
+    The largest variable size for which ``"auto"``
+    :any:`finite_differences` estimate the full Jacobian matrix
     """
+
+    def __init__(self, description = None, long_description = None,
+        equation = None, fallback_max_timestep = None, 
+        ignore_linear = None, ignore_independent = None, 
+        ignore_nonlinear = None, newton_rtol = None, newton_atol = None,
+        newton_max_iterations = None, finite_differences = None):
+        NumericalScheme.__init__(self, 
+            description = description, 
+            long_description = long_description,
+            equation = equation, 
+            fallback_max_timestep = fallback_max_timestep, 
+            ignore_linear = ignore_linear, 
+            ignore_independent = ignore_independent, 
+            ignore_nonlinear = ignore_nonlinear,
+            )
+        if not newton_rtol is None: 
+            self.newton_rtol = newton_rtol
+        if not newton_atol is None: 
+            self.newton_atol = newton_atol
+        if not newton_max_iterations is None: 
+            self.newton_max_iterations = newton_max_iterations
+        if not finite_differences is None: 
+            self.finite_differences = finite_differences
+
+    ##################
+    ### Properties ###
+    ##################
     @property
     def _default_description(self):
         return "Euler-implicit scheme"
@@ -537,6 +735,275 @@ class EulerImplicit(NumericalScheme):
     def _default_long_description(self):
         return "This is a Euler-implicit scheme to solve a derivative equation."
 
+    @property
+    def newton_rtol(self):
+        """ 
+        The relative tolerance of the Newton iterations
+
+        :type: :any:`float`
+        """
+        try:                   self._newton_rtol
+        except AttributeError: self._newton_rtol = self._default_newton_rtol
+        return self._newton_rtol
+
+    @newton_rtol.setter
+    def newton_rtol(self, newnewton_rtol):
+        assert utils.is_numeric(newnewton_rtol), "newton_rtol has to be numeric"
+        assert newnewton_rtol >= 0, "newton_rtol has to be positive"
+        self._newton_rtol = float(newnewton_rtol)
+
+    @property
+    def _default_newton_rtol(self):
+        """ 
+        The default relative tolerance of the Newton iterations
+
+        :type: :any:`float`
+        """
+        return 1e-8
+
+    @property
+    def newton_atol(self):
+        """ 
+        The absolute tolerance of the Newton iterations
+
+        :type: :any:`float`
+        """
+        try:                   self._newton_atol
+        except AttributeError: self._newton_atol = self._default_newton_atol
+        return self._newton_atol
+
+    @newton_atol.setter
+    def newton_atol(self, newnewton_atol):
+        assert utils.is_numeric(newnewton_atol), "newton_atol has to be numeric"
+        assert newnewton_atol >= 0, "newton_atol has to be positive"
+        self._newton_atol = float(newnewton_atol)
+
+    @property
+    def _default_newton_atol(self):
+        """ 
+        The default absolute tolerance of the Newton iterations
+
+        :type: :any:`float`
+        """
+        return 1e-10
+
+    @property
+    def newton_max_iterations(self):
+        """ 
+        The maximum number of Newton iterations per step
+
+        :type: :any:`int`
+        """
+        try:                   self._newton_max_iterations
+        except AttributeError: 
+            self._newton_max_iterations = self._default_newton_max_iterations
+        return self._newton_max_iterations
+
+    @newton_max_iterations.setter
+    def newton_max_iterations(self, newnewton_max_iterations):
+        assert newnewton_max_iterations > 0, \
+            "newton_max_iterations has to be positive"
+        self._newton_max_iterations = int(newnewton_max_iterations)
+
+    @property
+    def _default_newton_max_iterations(self):
+        """ 
+        The default maximum number of Newton iterations per step
+
+        :type: :any:`int`
+        """
+        return 50
+
+    @property
+    def finite_differences(self):
+        """ 
+        How to estimate the Jacobian of the nonlinear addend with finite
+        differences if the equation does not implement
+        :any:`DerivativeEquation.nonlinear_jacobian`. One of
+
+        ``"full"``
+            perturb each element of the variable on its own to get the full
+            Jacobian matrix. This costs one evaluation of the nonlinear
+            addend per element.
+        ``"diagonal"``
+            perturb all elements at once to get only the elementwise
+            derivatives. This costs a single evaluation, but is only correct
+            if each element of the nonlinear addend only depends on the
+            same element of the variable.
+        ``"auto"``
+            ``"full"`` for variables of up to :any:`max_full_jacobian_size`
+            elements and ``"diagonal"`` for larger ones, e.g. fields or
+            ensembles, where the full matrix would be too costly. The Newton
+            iterations still converge to the solution of the implicit step
+            if the ignored off-diagonal derivatives are small, only slower.
+
+        :type: :any:`str`
+        """
+        try:                   self._finite_differences
+        except AttributeError: 
+            self._finite_differences = self._default_finite_differences
+        return self._finite_differences
+
+    @finite_differences.setter
+    def finite_differences(self, newfinite_differences):
+        assert newfinite_differences in ("full", "diagonal", "auto"), \
+            "finite_differences has to be 'full', 'diagonal' or 'auto'"
+        self._finite_differences = newfinite_differences
+
+    @property
+    def _default_finite_differences(self):
+        """ 
+        The default way to estimate the Jacobian with finite differences
+
+        :type: :any:`str`
+        """
+        return "auto"
+
+    @property
+    def newton_iterations(self):
+        """ 
+        The total number of Newton iterations done so far
+
+        :type: :any:`int`
+        """
+        try:                   self._newton_iterations
+        except AttributeError: self._newton_iterations = 0
+        return self._newton_iterations
+
+    @newton_iterations.setter
+    def newton_iterations(self, newnewton_iterations):
+        self._newton_iterations = int(newnewton_iterations)
+
+    @property
+    def last_newton_iterations(self):
+        """ 
+        The number of Newton iterations done in the last step
+
+        :type: :any:`int`
+        """
+        try:                   self._last_newton_iterations
+        except AttributeError: self._last_newton_iterations = 0
+        return self._last_newton_iterations
+
+    @last_newton_iterations.setter
+    def last_newton_iterations(self, newlast_newton_iterations):
+        self._last_newton_iterations = int(newlast_newton_iterations)
+
+    ###############
+    ### Methods ###
+    ###############
+    def _nonlinear_addend_flat(self, time, value, shape, cache = True):
+        """ 
+        Calculate the flattened nonlinear addend for a flattened variable value
+
+        Args:
+            time (single numeric): the time
+            value (numpy.ndarray): the flattened variable value
+            shape (tuple): the shape of the variable value
+            cache (bool, optional): use the cache of the current integration
+                step? Perturbed values for finite differences are not worth
+                keeping. Defaults to ``True``.
+
+        Returns:
+            numpy.ndarray : the flattened nonlinear addend
+        """
+        if cache:
+            nonlin = self.nonlinear_addend( time = time, 
+                variablevalue = value.reshape(shape) )
+        else:
+            nonlin = self.equation.nonlinear_addend( time = time, 
+                variablevalue = value.reshape(shape) )
+        return np.broadcast_to( nonlin, shape ).ravel()
+
+    def _nonlinear_jacobian_flat(self, time, value, shape):
+        """ 
+        Calculate the Jacobian of the nonlinear addend with respect to a
+        flattened variable value. If the equation does not implement
+        :any:`DerivativeEquation.nonlinear_jacobian`, the Jacobian is estimated
+        with forward finite differences as set by :any:`finite_differences`.
+
+        Args:
+            time (single numeric): the time
+            value (numpy.ndarray): the flattened variable value
+            shape (tuple): the shape of the variable value
+
+        Returns:
+            numpy.ndarray : the one-dimensional elementwise derivatives or the
+            full two-dimensional Jacobian matrix
+        """
+        try:
+            jac = self.equation.nonlinear_jacobian( time = time, 
+                variablevalue = value.reshape(shape) )
+        except NotImplementedError:
+            base = self._nonlinear_addend_flat( time, value, shape )
+            shift = np.sqrt( np.finfo(float).eps ) \
+                * np.maximum( 1, abs(value) )
+            mode = self.finite_differences
+            if mode == "auto":
+                mode = "full" if value.size <= self.max_full_jacobian_size \
+                    else "diagonal"
+            if mode == "diagonal": # all at once
+                shifted = value + shift
+                return ( self._nonlinear_addend_flat( time, shifted, shape,
+                    cache = False ) - base ) / ( shifted - value )
+            jac = np.empty( (value.size, value.size) )
+            for i in range(value.size):
+                shifted = value.copy()
+                shifted[i] += shift[i]
+                jac[:,i] = ( self._nonlinear_addend_flat( time, shifted, shape,
+                    cache = False ) - base ) / ( shifted[i] - value[i] )
+            return jac
+        jac = np.asarray( jac )
+        if np.ndim(jac) <= len(shape): # elementwise derivatives
+            return np.broadcast_to( jac, shape ).ravel()
+        else: # full Jacobian matrix
+            return jac.reshape( value.size, value.size )
+
+    def _newton(self, time, timestep, current, linear, indep, guess):
+        """ 
+        Solve the implicit step with Newton iterations
+
+        Args:
+            time (single numeric): The time to calculate the step FROM
+            timestep (single numeric): The timestep to calculate the step
+            current (numpy.ndarray): the variable value at ``time``
+            linear (numpy.ndarray): the linear factor
+            indep (numpy.ndarray): the variable-independent addend
+            guess (numpy.ndarray): the initial guess
+
+        Returns:
+            numpy.ndarray : the new variable value
+
+        Raises:
+            RuntimeError : if the iterations do not converge within
+                :any:`newton_max_iterations`
+        """
+        shape = np.shape(guess)
+        new = np.array( guess, dtype = float ).ravel()
+        current = np.broadcast_to( current, shape ).ravel()
+        linear = np.broadcast_to( linear, shape ).ravel()
+        indep = np.broadcast_to( indep, shape ).ravel()
+        self.last_newton_iterations = 0
+        while True:
+            residual = new - current - timestep * ( linear * new + indep 
+                + self._nonlinear_addend_flat( time, new, shape ) )
+            tolerance = self.newton_atol + self.newton_rtol * abs(new)
+            if np.all( abs(residual) <= tolerance ): # converged
+                return new.reshape(shape)
+            if self.last_newton_iterations >= self.newton_max_iterations:
+                raise RuntimeError( ("{}: Newton iterations did not converge "
+                    "within {} iterations").format(self.description, 
+                    self.newton_max_iterations) )
+            jac = self._nonlinear_jacobian_flat( time, new, shape )
+            if jac.ndim == 1: # elementwise
+                new = new - residual / ( 1 - timestep * ( linear + jac ) )
+            else: # full system
+                jac = np.eye( new.size ) \
+                    - timestep * ( np.diag( linear ) + jac )
+                new = new - np.linalg.solve( jac, residual )
+            self.last_newton_iterations += 1
+            self.newton_iterations += 1
+
     def step(self, time = None, timestep = None, tendency = True):
         """ 
         Integrate one "timestep" from "time" forward with the Euler-implicit
@@ -552,25 +1019,24 @@ class EulerImplicit(NumericalScheme):
             numpy.ndarray : The resulting variable value or tendency
 
         Raises:
-            AssertionError : when the equation's nonlinear part is not zero and
-                :any:`ignore_nonlinear` is not set to ``True``
+            RuntimeError : when the Newton iterations for the nonlinear part 
+                do not converge
         """
         if timestep is None: timestep = self.max_timestep
         v = self.equation.variable
         # get equation parts
         linear = self.linear_factor( time = time )
         indep  = self.independent_addend( time = time )
-        nonlin = self.nonlinear_addend( time = time )
-
-        assert np.all(nonlin == 0), ("nonlinear part of equation is not "
-        "zero! Cannot integrate equation with implicit scheme. Set "
-        "ignore_nonlinear to ignore nonlinear part.")
+        cur = v( time )
 
-        # implicit scheme
-        new = ( indep * timestep + v( time ) ) / ( 1 - linear * timestep )
+        # implicit scheme for the linear part
+        new = ( indep * timestep + cur ) / ( 1 - linear * timestep )
+        if not self.ignore_nonlinear: # solve the nonlinear part
+            new = self._newton( time = time, timestep = timestep, 
+                current = cur, linear = linear, indep = indep, guess = new )
 
         if tendency: # tendency desired
-            res = new - v( time ) # only tendency
+            res = new - cur # only tendency
         else: # new value desired
             res = new
         
@@ -677,6 +1143,505 @@ class RungeKutta4(NumericalScheme):
         return np.array([0,0.5,1]) * timestep # current time, half and full 
 
 
+class AdamsBashforth(NumericalScheme):
+    """ 
+    Explicit Adams-Bashforth linear multistep scheme of order 2, 3 or 4.
+    The derivatives of the last steps are kept, so each step only needs one
+    new evaluation of the equation. Optionally, the prediction is corrected
+    with the Adams-Moulton formula of the same order, which costs a second
+    evaluation. Until enough derivatives are known, e.g. at the start or
+    after the timestep changed, Runge-Kutta-4 steps are taken. 
+
+    The kept derivatives are runtime state: they are not part of a
+    checkpoint and are dropped whenever the step doesn't continue the last
+    one with the same timestep.
+
+    As the :any:`SetOfNumericalSchemes.plan` is cached, it can't follow
+    needed timesteps that change over time. The needed timesteps therefore
+    always include the stages of the Runge-Kutta-4 startup steps, even
+    though the Adams-Bashforth steps themselves only need the current time
+    (and the next one with the corrector).
+
+    Args:
+        description (str): short equation description
+        long_description (str): long equation description
+        equation (DerivativeEquation): the equation
+        fallback_max_timestep (single numeric): the fallback maximum timestep
+        ignore_linear (bool): ignore the linear part of the equation?
+        ignore_independent (bool): ignore the variable-independent part of
+            the equation?  
+        ignore_nonlinear (bool): ignore the nonlinear part of the equation?
+        order (int): the order of the scheme, 2, 3 or 4. Defaults to 2.
+        corrector (bool): correct each step with the Adams-Moulton formula?
+            Defaults to ``False``.
+    """
+    bashforth_coefficients = {
+        2: np.array([3, -1]) / 2,
+        3: np.array([23, -16, 5]) / 12,
+        4: np.array([55, -59, 37, -9]) / 24,
+        }
+    """ 
+    The Adams-Bashforth coefficients of the derivatives from the current
+    time backwards for each order
+    """
+    moulton_coefficients = {
+        2: np.array([1, 1]) / 2,
+        3: np.array([5, 8, -1]) / 12,
+        4: np.array([9, 19, -5, 1]) / 24,
+        }
+    """ 
+    The Adams-Moulton coefficients of the derivatives from the next time
+    backwards for each order
+    """
+
+    def __init__(self, description = None, long_description = None,
+        equation = None, fallback_max_timestep = None, 
+        ignore_linear = None, ignore_independent = None, 
+        ignore_nonlinear = None, order = None, corrector = None):
+        NumericalScheme.__init__(self, 
+            description = description, 
+            long_description = long_description,
+            equation = equation, 
+            fallback_max_timestep = fallback_max_timestep, 
+            ignore_linear = ignore_linear, 
+            ignore_independent = ignore_independent, 
+            ignore_nonlinear = ignore_nonlinear,
+            )
+        if not order is None: 
+            self.order = order
+        if not corrector is None: 
+            self.corrector = corrector
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def _default_description(self):
+        return "Adams-Bashforth scheme"
+
+    @property
+    def _default_long_description(self):
+        return ("This is an Adams-Bashforth linear multistep scheme to solve " 
+            "a derivative equation.")
+
+    @property
+    def order(self):
+        """ 
+        The order of the scheme, i.e. the number of derivatives used per
+        step
+
+        :type: :any:`int`
+        """
+        try:                   self._order
+        except AttributeError: self._order = self._default_order
+        return self._order
+
+    @order.setter
+    def order(self, neworder):
+        assert int(neworder) in self.bashforth_coefficients, \
+            "order has to be one of {}".format(
+                sorted(self.bashforth_coefficients))
+        self._order = int(neworder)
+        self.reset()
+
+    @property
+    def _default_order(self):
+        """ 
+        The default order
+
+        :type: :any:`int`
+        """
+        return 2
+
+    @property
+    def corrector(self):
+        """ 
+        Whether each step is corrected with the Adams-Moulton formula
+
+        :type: :any:`bool`
+        """
+        try:                   self._corrector
+        except AttributeError: self._corrector = self._default_corrector
+        return self._corrector
+
+    @corrector.setter
+    def corrector(self, newcorrector):
+        self._corrector = bool(newcorrector)
+
+    @property
+    def _default_corrector(self):
+        """ 
+        The default corrector setting
+
+        :type: :any:`bool`
+        """
+        return False
+
+    @property
+    def startup_steps(self):
+        """ 
+        The number of Runge-Kutta-4 steps taken because not enough
+        derivatives were known
+
+        :type: :any:`int`
+        """
+        try:                   self._startup_steps
+        except AttributeError: self._startup_steps = 0
+        return self._startup_steps
+
+    @startup_steps.setter
+    def startup_steps(self, newstartup_steps):
+        self._startup_steps = int(newstartup_steps)
+
+    @property
+    def _derivatives(self):
+        """ 
+        The derivatives of the last steps, latest last
+
+        :type: :any:`collections.deque` of ``(time, derivative)`` pairs
+        """
+        try:                   self._derivative_history
+        except AttributeError: 
+            self._derivative_history = collections.deque(maxlen = self.order)
+        return self._derivative_history
+
+    ###############
+    ### Methods ###
+    ###############
+    def reset(self):
+        """ 
+        Forget the derivatives of the last steps
+        """
+        try: del self._derivative_history
+        except AttributeError: pass
+
+    def _continues(self, time, timestep):
+        """ 
+        Check if a step continues the last steps with the same timestep
+
+        Args:
+            time (single numeric): The time to calculate the step FROM
+            timestep (single numeric): The timestep to calculate the step
+
+        Returns:
+            bool : whether the kept derivatives can be used
+        """
+        derivatives = self._derivatives
+        if not derivatives:
+            return True
+        times = np.array([ t for t, d in derivatives ])
+        expected = time - timestep * np.arange(len(times), 0, -1)
+        return np.allclose(times, expected, rtol = 0, 
+            atol = 1e-9 * abs(timestep))
+
+    def step(self, time = None, timestep = None, tendency = True):
+        if timestep is None: timestep = self.max_timestep
+        v = self.equation.variable
+        if time is None: time = v.time
+        cur = v( time )
+        if not self._continues(time = time, timestep = timestep):
+            self.reset()
+        derivatives = self._derivatives
+        derivative = self.derivative( time = time, variablevalue = cur )
+        derivatives.append( (time, derivative) )
+        if len(derivatives) < self.order: # start up with Runge-Kutta-4
+            self.startup_steps += 1
+            half_time = time + timestep / 2
+            k1 = timestep * derivative
+            k2 = timestep * self.derivative( time = half_time, 
+                variablevalue = cur + k1 / 2 )
+            k3 = timestep * self.derivative( time = half_time, 
+                variablevalue = cur + k2 / 2 )
+            k4 = timestep * self.derivative( time = time + timestep, 
+                variablevalue = cur + k3 )
+            tend = ( k1 + 2 * k2 + 2 * k3 + k4 ) / 6
+        else:
+            past = [ d for t, d in reversed(derivatives) ] # latest first
+            tend = timestep * sum( b * d for b, d in 
+                zip(self.bashforth_coefficients[self.order], past) )
+            if self.corrector: # Adams-Moulton
+                predicted = self.derivative( time = time + timestep, 
+                    variablevalue = cur + tend )
+                tend = timestep * sum( b * d for b, d in 
+                    zip(self.moulton_coefficients[self.order], 
+                        [predicted] + past) )
+
+        if tendency: # tendency desired
+            res = tend # only tendency
+        else: # new value desired
+            res = cur + tend # add tendency
+        return res
+
+    def _needed_timesteps_for_integration_step(self, timestep):
+        # the Runge-Kutta-4 startup steps need the half and full timestep
+        return np.array([0,0.5,1]) * timestep
+
+
+class DormandPrince45(NumericalScheme):
+    """ 
+    Adaptive Dormand-Prince-5(4) numerical scheme. Each step is calculated
+    with fifth order. The difference to the embedded fourth order solution
+    estimates the error, which is used to reject too large steps and to adapt
+    the timestep.
+
+    Args:
+        description (str): short equation description
+        long_description (str): long equation description
+        equation (DerivativeEquation): the equation
+        fallback_max_timestep (single numeric): the initial timestep
+        ignore_linear (bool): ignore the linear part of the equation?
+        ignore_independent (bool): ignore the variable-independent part of
+            the equation?  
+        ignore_nonlinear (bool): ignore the nonlinear part of the equation?
+        rtol (float): the relative error tolerance
+        atol (float): the absolute error tolerance
+    """
+    adaptive = True
+
+    nodes = np.array([0, 1/5, 3/10, 4/5, 8/9, 1, 1])
+    """ The Butcher tableau's nodes """
+    coefficients = [
+        [],
+        [1/5],
+        [3/40, 9/40],
+        [44/45, -56/15, 32/9],
+        [19372/6561, -25360/2187, 64448/6561, -212/729],
+        [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+        ]
+    """ The Butcher tableau's coefficients """
+    weights = np.array(
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0])
+    """ The Butcher tableau's weights for the fifth order solution """
+    error_weights = weights - np.array(
+        [5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40])
+    """ 
+    The difference between the fifth and fourth order solution's weights 
+    """
+    safety = 0.9
+    """ Safety factor for the timestep adaptation """
+    min_factor = 0.2
+    """ Smallest factor to change the timestep by at once """
+    max_factor = 5.0
+    """ Greatest factor to change the timestep by at once """
+
+    def __init__(self, description = None, long_description = None,
+        equation = None, fallback_max_timestep = None, 
+        ignore_linear = None, ignore_independent = None, 
+        ignore_nonlinear = None, rtol = None, atol = None):
+        NumericalScheme.__init__(self, 
+            description = description, 
+            long_description = long_description,
+            equation = equation, 
+            fallback_max_timestep = fallback_max_timestep, 
+            ignore_linear = ignore_linear, 
+            ignore_independent = ignore_independent, 
+            ignore_nonlinear = ignore_nonlinear,
+            )
+        if not rtol is None: 
+            self.rtol = rtol
+        if not atol is None: 
+            self.atol = atol
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def _default_description(self):
+        return "Dormand-Prince-5(4) scheme"
+
+    @property
+    def _default_long_description(self):
+        return ("This is an adaptive Dormand-Prince-5(4) scheme to solve a " 
+            "derivative equation.")
+
+    @property
+    def rtol(self):
+        """ 
+        The relative error tolerance
+
+        :type: :any:`float`
+        """
+        try:                   self._rtol
+        except AttributeError: self._rtol = self._default_rtol
+        return self._rtol
+
+    @rtol.setter
+    def rtol(self, newrtol):
+        assert utils.is_numeric(newrtol), "rtol has to be numeric"
+        assert newrtol >= 0, "rtol has to be positive"
+        self._rtol = float(newrtol)
+
+    @property
+    def _default_rtol(self):
+        """ 
+        The default relative error tolerance
+
+        :type: :any:`float`
+        """
+        return 1e-3
+
+    @property
+    def atol(self):
+        """ 
+        The absolute error tolerance
+
+        :type: :any:`float`
+        """
+        try:                   self._atol
+        except AttributeError: self._atol = self._default_atol
+        return self._atol
+
+    @atol.setter
+    def atol(self, newatol):
+        assert utils.is_numeric(newatol), "atol has to be numeric"
+        assert newatol >= 0, "atol has to be positive"
+        self._atol = float(newatol)
+
+    @property
+    def _default_atol(self):
+        """ 
+        The default absolute error tolerance
+
+        :type: :any:`float`
+        """
+        return 1e-6
+
+    @property
+    def accepted_steps(self):
+        """ 
+        The number of accepted steps
+
+        :type: :any:`int`
+        """
+        try:                   self._accepted_steps
+        except AttributeError: self._accepted_steps = 0
+        return self._accepted_steps
+
+    @accepted_steps.setter
+    def accepted_steps(self, newaccepted_steps):
+        self._accepted_steps = int(newaccepted_steps)
+
+    @property
+    def rejected_steps(self):
+        """ 
+        The number of rejected steps
+
+        :type: :any:`int`
+        """
+        try:                   self._rejected_steps
+        except AttributeError: self._rejected_steps = 0
+        return self._rejected_steps
+
+    @rejected_steps.setter
+    def rejected_steps(self, newrejected_steps):
+        self._rejected_steps = int(newrejected_steps)
+
+    @property
+    def max_timestep(self):
+        """ 
+        The timestep proposed by the error control after the last step. Before
+        the first step, this is :any:`NumericalScheme.max_timestep`.
+
+        :type: :any:`float`
+        """
+        try:                   return self._proposed_timestep
+        except AttributeError: return NumericalScheme.max_timestep.fget(self)
+
+    ###############
+    ### Methods ###
+    ###############
+    def _embedded_step(self, time, timestep):
+        """ 
+        Calculate one step and estimate its error
+
+        Args:
+            time (single numeric): The time to calculate the step FROM
+            timestep (single numeric): The timestep to calculate the step
+
+        Returns:
+            tuple : the new variable value and the error relative to the
+            tolerances
+        """
+        cur = self.equation.variable( time )
+        k = []
+        for node, coefficients in zip(self.nodes, self.coefficients):
+            value = cur + timestep * sum( a * ki 
+                for a, ki in zip(coefficients, k) if a )
+            k.append( self.derivative( time = time + node * timestep, 
+                variablevalue = value ) )
+        new = cur + timestep * sum( b * ki 
+            for b, ki in zip(self.weights, k) if b )
+        error = timestep * sum( e * ki 
+            for e, ki in zip(self.error_weights, k) if e )
+        scale = self.atol + self.rtol * np.maximum(abs(cur), abs(new))
+        return new, np.sqrt(np.mean((error / scale) ** 2))
+
+    def _timestep_factor(self, error):
+        """ 
+        The factor to change the timestep by based on the error
+
+        Args:
+            error (float): the error relative to the tolerances
+
+        Returns:
+            float : the timestep factor
+        """
+        if error == 0: return self.max_factor
+        factor = self.safety * error ** (-1/5)
+        return min(self.max_factor, max(self.min_factor, factor))
+
+    def _integrate_step(self, time = None, timestep = None):
+        """ 
+        Integrate at most "timestep" forward and set results in-place. Steps
+        with an error larger than the tolerances are rejected and repeated
+        with a smaller timestep.
+
+        Args:
+            time (single numeric, optional): The time to calculate the step
+                FROM. Defaults to the current variable time.
+            timestep (single numeric, optional): The maximum timestep to
+                calculate the step. Defaults to :any:`max_timestep`.
+
+        Returns:
+            single numeric : the timestep that was actually taken
+        """
+        var = self.equation.variable
+        proposed = self.max_timestep
+        if timestep is None: timestep = proposed
+        if time is None: time = var.time
+        rejected = False
+        while True:
+            new, error = self._embedded_step( time = time, timestep = timestep )
+            if error <= 1: # accept
+                break
+            self.rejected_steps += 1
+            rejected = True
+            timestep = timestep * self._timestep_factor(error)
+            assert time + timestep > time, \
+                "{}: timestep became too small".format(self.description)
+        self.accepted_steps += 1
+        var.next_time = time + timestep # this is the next time
+        var.value = new # save value
+        var.next_time = None # unset next_time
+        if rejected or timestep >= proposed:
+            self._proposed_timestep = timestep * self._timestep_factor(error)
+        return timestep
+
+    def step(self, time = None, timestep = None, tendency = True):
+        if timestep is None: timestep = self.max_timestep
+        v = self.equation.variable
+        if time is None: time = v.time
+        new, error = self._embedded_step( time = time, timestep = timestep )
+        if tendency: # tendency desired
+            return new - v( time ) # only tendency
+        else: # new value desired
+            return new
+
+    def _needed_timesteps_for_integration_step(self, timestep):
+        return np.unique(self.nodes) * timestep
+
+
 ###############################
 ### Sets of NumericalScheme ###
 ###############################
@@ -729,16 +1694,34 @@ class SetOfNumericalSchemes(utils.SetOfObjects):
         """ 
         The unified plan for this set of numerical schemes. First try to
         determine the plan automatically, if that fails, use the
-        :any:`fallback_plan`.
+        :any:`fallback_plan`. The plan is cached until the schemes or their
+        equations' inputs change.
         
         :type: :any:`list`
         """
-        try: # try automatic planning
-            plan = self._automatic_plan
-        except: # automatic planning didn't work
-            plan = self.fallback_plan # use fallback
+        signature = self._plan_signature
+        try: cached_signature, plan = self._plan_cache
+        except AttributeError: cached_signature = None
+        if cached_signature != signature: # schemes changed, plan again
+            try: # try automatic planning
+                plan = self._automatic_plan
+            except: # automatic planning didn't work
+                plan = self.fallback_plan # use fallback
+            self._plan_cache = (signature, plan)
         return plan
 
+    @property
+    def _plan_signature(self):
+        """ 
+        Everything the :any:`plan` depends on: the schemes, their equations and
+        the equations' input.
+
+        :type: :any:`tuple`
+        """
+        return tuple( (key, id(scheme), id(scheme.equation),
+            tuple(scheme.equation.input.keys()))
+            for key, scheme in sorted(self.store.items()) )
+
     @property
     def fallback_plan(self):
         """ 
@@ -763,6 +1746,7 @@ class SetOfNumericalSchemes(utils.SetOfObjects):
         except:
             raise ValueError("wrong scheme plan format")
         self._fallback_plan = newfallback_plan
+        if hasattr(self, "_plan_cache"): del self._plan_cache # plan again
 
     @property
     def _default_fallback_plan(self):
@@ -777,20 +1761,47 @@ class SetOfNumericalSchemes(utils.SetOfObjects):
     def _automatic_plan(self):  
         """ 
         Try to determine the scheme plan based on the equations and the
-        numerical schemes.
+        numerical schemes. If a scheme needs future values of another
+        equation's variable (according to its
+        :any:`NumericalScheme.needed_timesteps`), this other variable is
+        integrated first and until each of the needed (normed) timesteps.
+        Equations without such dependencies are solved in alphabetical order.
 
         :type: :any:`list`
 
-        .. todo::
-            Implementing this is definitely possible. All needed information is
-            accessible:
-
-                - the equation's dependencies
-                - the numerical scheme's needed timesteps
+        Raises:
+            ValueError : if the dependencies are cyclic
         """
-        # TODO: This definitely has to be implemented for convenience
-        raise NotImplementedError("Automatic planning is definitely possible, " 
-            "but not yet implemented")
+        # the normed timesteps each variable has to be integrated until
+        timesteps = { key: {1.0} for key in self.keys() }
+        # the variables each variable has to wait for
+        dependencies = { key: set() for key in self.keys() }
+        for key, scheme in self.items():
+            normed = np.asarray(scheme.needed_timesteps(1)).flatten()
+            future = { float(ts) for ts in normed if 0 < ts <= 1 }
+            if not future: # only past values needed
+                continue
+            for dep in scheme.equation.input.keys():
+                if dep == key or not dep in timesteps: 
+                    continue # no other equation's variable
+                timesteps[dep].update(future)
+                dependencies[key].add(dep)
+
+        # topological sort
+        order = []
+        while dependencies:
+            ready = sorted(k for k,deps in dependencies.items() if not deps)
+            if not ready:
+                raise ValueError("cyclic dependencies between variables "
+                    "{}".format(", ".join(sorted(dependencies))))
+            for key in ready:
+                order.append(key)
+                del dependencies[key]
+            for deps in dependencies.values():
+                deps.difference_update(ready)
+
+        plan = [ [key, sorted(timesteps[key])] for key in order ]
+        return plan
 
     ###############
     ### Methods ###
@@ -807,21 +1818,151 @@ class SetOfNumericalSchemes(utils.SetOfObjects):
         """
         return obj.equation.variable.id
 
-    def integrate(self, start_time, final_time):
+    def _compile(self, plan):
+        """ 
+        Turn a plan into a flat program of integration operations
+
+        Args:
+            plan (list): the plan. See :any:`fallback_plan` for the format.
+
+        Returns:
+            list : :any:`list` of ``(scheme, start, end)`` tuples. Each of them
+            means to integrate ``scheme`` from the normed timestep ``start``
+            until the normed timestep ``end``.
+        """
+        program = []
+        for varname, timesteps in plan:
+            scheme = self[varname] # get scheme
+            start = 0.0
+            for end in np.asarray(timesteps, dtype = float).flatten():
+                end = float(end)
+                if end > start: # there is something to integrate
+                    program.append( (scheme, start, end) )
+                start = end
+        return program
+
+    def fixed_steps(self, start_time, final_time, timestep):
+        """ 
+        Determine the steps of a run with a fixed timestep
+
+        Args:
+            start_time (float): the starting time
+            final_time (float): time to integrate until
+            timestep (float): the timestep. The last step is shortened to
+                end at ``final_time``.
+
+        Returns:
+            tuple : the :any:`numpy.ndarray` s of the times the steps start at
+            and of the timesteps
+        """
+        assert timestep > 0, "timestep has to be positive"
+        number = max(int(np.ceil((final_time - start_time) / timestep)), 0)
+        starts = start_time + np.arange(number) * timestep
+        timesteps = np.minimum(timestep, final_time - starts)
+        keep = timesteps > 0 # rounding might add an empty last step
+        return starts[keep], timesteps[keep]
+
+    def sample_times(self, start_time, final_time, timestep):
+        """ 
+        Determine all times the equations' input is needed at during a run
+        with a fixed timestep according to the schemes'
+        :any:`NumericalScheme.needed_timesteps`. The times are calculated
+        the same way :any:`integrate` does, so they match the times the
+        input is requested at exactly.
+
+        Args:
+            start_time (float): the starting time
+            final_time (float): time to integrate until
+            timestep (float): the timestep
+
+        Returns:
+            numpy.ndarray : the sorted unique times
+        """
+        starts, timesteps = self.fixed_steps(start_time, final_time, timestep)
+        times = [ np.array([]) ]
+        for scheme, start, end in self._compile(self.plan):
+            step_starts = starts + start * timesteps
+            step_sizes = (end - start) * timesteps
+            for size in np.unique(step_sizes): # usually only one or two
+                which = step_sizes == size
+                offsets = np.asarray(scheme.needed_timesteps(size), 
+                    dtype = float).flatten()
+                times.append( ( step_starts[which][:, np.newaxis] 
+                    + offsets[np.newaxis, :] ).flatten() )
+        return np.unique(np.concatenate(times))
+
+    def integrate(self, start_time, final_time, timestep = None, 
+        callback = None):
         """ Integrate the model until final_time
 
         Args:
             start_time (float): the starting time
             final_time (float): time to integrate until
+            timestep (float, optional): integrate with this fixed timestep
+                (see :any:`fixed_steps`) instead of the
+                :any:`NumericalScheme.max_timestep` of the most dependent
+                scheme. Each entry of the :any:`plan` is then integrated in
+                a single step, except for :any:`NumericalScheme.adaptive`
+                schemes, which control their timesteps themselves. As the
+                number of steps is known then, the histories of the
+                variables are preallocated to the size needed (see
+                :any:`InterfaceValue.reserve`) and trimmed afterwards.
+                Variables with a :any:`InterfaceValue.remembrance` are not
+                preallocated.
+            callback (callable, optional): function to call with the time
+                and the timestep after each full step of all schemes
+
+        Variables integrated in several stages per step according to the
+        :any:`plan` only keep their value at the end of each step. The
+        intermediate stages are scratch values that the other schemes can
+        use during the step (see :any:`InterfaceValue.begin_scratch`).
         """
-        self.logger.info("start integration")
+        logger = self.logger
+        logger.info("start integration")
+        debug = logger.isEnabledFor(logging.DEBUG) # only format if needed
+        plan = self.plan
+        # most dependent scheme determines the timestep
+        last_scheme = self[plan[-1][0]]
+        program = self._compile(plan)
+        # variables integrated in stages only keep the end of each step
+        stages = collections.Counter( scheme.equation.variable 
+            for scheme, start, end in program )
+        staged = [ v for v, n in stages.items() if n > 1 ]
+        if not timestep is None:
+            starts, timesteps = self.fixed_steps(start_time, final_time, 
+                timestep)
+            # preallocate the histories
+            variables = [ scheme.equation.variable for scheme in self.elements
+                if not scheme.adaptive 
+                and scheme.equation.variable.remembrance is None ]
+            for variable in variables:
+                variable.reserve( starts.size + stages[variable] - 1 )
+            try:
+                for current_time, big_timestep in zip(starts.tolist(), 
+                    timesteps.tolist()):
+                    for variable in staged: variable.begin_scratch()
+                    for scheme, start, end in program:
+                        time = current_time + start * big_timestep
+                        step = (end - start) * big_timestep
+                        if scheme.adaptive:
+                            scheme.integrate(time = time, until = time + step)
+                        else:
+                            scheme.integrate_step(time = time, timestep = step)
+                    for variable in staged: variable.commit_scratch()
+                    if not callback is None:
+                        callback(current_time + big_timestep, big_timestep)
+            finally:
+                for variable in variables:
+                    variable.trim()
+            logger.info("end of integration")
+            return
         current_time = start_time
         while current_time < final_time:
-            self.logger.debug("current time {} is smaller than " 
+            if debug: logger.debug("current time {} is smaller than " 
                 "final time {}".format(current_time, final_time))
             # timestep of most dependent equation
-            biggest_timestep = self[self.plan[-1][0]].max_timestep
-            self.logger.debug("timestep of last scheme: {}".format(
+            biggest_timestep = last_scheme.max_timestep
+            if debug: logger.debug("timestep of last scheme: {}".format(
                 biggest_timestep))
             run_time_left = final_time - current_time
             if run_time_left > biggest_timestep:
@@ -829,23 +1970,20 @@ class SetOfNumericalSchemes(utils.SetOfObjects):
             else:
                 big_timestep = run_time_left
 
-            for plan_step in self.plan:
-                scheme_time = current_time
-                varname = plan_step[0] # variable name
-                scheme = self[varname] # get scheme
-                timesteps = np.asarray( plan_step[1] ) * big_timestep 
-                # self.logger.debug("timesteps: {}".format(timesteps))
-                for ts in timesteps: # loop over all timesteps
-                    until_time = current_time + ts
-                    self.logger.debug(
-                        ("integrate scheme '{}' for equation '{}' until time {}"
-                        ).format( scheme.description,
-                        scheme.equation.description, until_time))
-                    scheme.integrate(
-                        time = scheme_time,
-                        until = until_time)
-                    scheme_time = current_time + ts
+            for variable in staged: variable.begin_scratch()
+            for scheme, start, end in program:
+                until_time = current_time + end * big_timestep
+                if debug: logger.debug(
+                    ("integrate scheme '{}' for equation '{}' until time {}"
+                    ).format( scheme.description,
+                    scheme.equation.description, until_time))
+                scheme.integrate(
+                    time = current_time + start * big_timestep,
+                    until = until_time)
+            for variable in staged: variable.commit_scratch()
                 
             current_time = current_time + big_timestep
-        self.logger.info("end of integration")
+            if not callback is None:
+                callback(current_time, big_timestep)
+        logger.info("end of integration")
 
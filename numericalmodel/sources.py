@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# system modules
+import os
+import itertools
+
+# internal modules
+from . import utils
+from . import checkpoint
+
+# external modules
+import numpy as np
+
+
+class TimeSeriesFile(utils.LoggerObject,utils.ReprObject):
+    """
+    Base class for files holding a time series that is read sequentially in
+    chunks, so that only a part of the file has to be in memory at once
+
+    Args:
+        filename (str, optional): the file
+    """
+    def __init__(self, filename = None):
+        if not filename is None:
+            self.filename = filename
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def filename(self):
+        """
+        The file
+
+        :type: :any:`str`
+        """
+        try:                   return self._filename
+        except AttributeError: return None
+
+    @filename.setter
+    def filename(self, newfilename):
+        assert isinstance(newfilename, str), "filename has to be str"
+        self._filename = newfilename
+        self.rewind()
+
+    @property
+    def exhausted(self):
+        """
+        Whether the whole file was read
+
+        :type: :any:`bool`
+        """
+        try:                   return self._exhausted
+        except AttributeError: return self.filename is None
+
+    ###############
+    ### Methods ###
+    ###############
+    def rewind(self):
+        """
+        Start reading from the beginning of the file again
+        """
+        self._position = 0
+        self._exhausted = self.filename is None
+
+    def read(self, size):
+        """
+        Read the next chunk of the time series
+
+        Args:
+            size (int): the maximum number of samples to read
+
+        Returns:
+            tuple : the :any:`numpy.ndarray` s of the times and the values.
+            Both are empty if the file is :any:`exhausted`.
+        """
+        assert int(size) > 0, "size has to be a positive integer"
+        if self.exhausted:
+            return np.array([]), np.array([])
+        times, values = self._read(int(size))
+        self._position += times.size
+        if times.size < int(size):
+            self._exhausted = True
+        return times, values
+
+    def _read(self, size): # pragma: no cover
+        """
+        Read the next chunk starting at the current position
+
+        Args:
+            size (int): the maximum number of samples to read
+
+        Returns:
+            tuple : the :any:`numpy.ndarray` s of the times and the values
+        """
+        raise NotImplementedError("subclasses must override this method")
+
+    @staticmethod
+    def _split_columns(rows):
+        """
+        Split rows into the times in the first column and the values in the
+        remaining columns
+
+        Args:
+            rows (numpy.ndarray): the two-dimensional rows
+
+        Returns:
+            tuple : the times and values. If there is only one value column,
+            the values are one-dimensional.
+        """
+        values = rows[:, 1:]
+        if values.shape[1] == 1: values = values[:, 0]
+        return np.array(rows[:, 0]), np.array(values)
+
+
+class CsvFile(TimeSeriesFile):
+    """
+    Text file with the times in the first column and the values in the
+    remaining columns. Lines starting with ``#`` are ignored.
+
+    Args:
+        filename (str, optional): the file
+        delimiter (str, optional): the column delimiter. Defaults to ``","``.
+    """
+    def __init__(self, filename = None, delimiter = None):
+        if not delimiter is None:
+            self.delimiter = delimiter
+        TimeSeriesFile.__init__(self, filename = filename)
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def delimiter(self):
+        """
+        The column delimiter
+
+        :type: :any:`str`
+        """
+        try:                   return self._delimiter
+        except AttributeError: return ","
+
+    @delimiter.setter
+    def delimiter(self, newdelimiter):
+        assert isinstance(newdelimiter, str), "delimiter has to be str"
+        self._delimiter = newdelimiter
+
+    ###############
+    ### Methods ###
+    ###############
+    def rewind(self):
+        try: self._file.close()
+        except AttributeError: pass
+        self._file = None
+        TimeSeriesFile.rewind(self)
+
+    def __getstate__(self):
+        """ 
+        Drop the open file handle when pickling. The file is opened again
+        at the current position when reading on.
+        """
+        state = self.__dict__.copy()
+        state["_file"] = None
+        return state
+
+    def _lines(self):
+        """ 
+        Iterate over the remaining lines holding data in the open file
+
+        Returns:
+            generator : the lines
+        """
+        return ( l for l in self._file if l.strip() and
+            not l.lstrip().startswith("#") )
+
+    def _read(self, size):
+        if self._file is None:
+            self._file = open(self.filename)
+            # skip what was already read, e.g. before pickling
+            for line in itertools.islice(self._lines(), self._position): 
+                pass
+        lines = [ line for line in itertools.islice(self._lines(), size) ]
+        if len(lines) < size: # end of file
+            self._file.close()
+            self._file = None
+        if not lines:
+            return np.array([]), np.array([])
+        rows = np.loadtxt(lines, delimiter = self.delimiter, ndmin = 2)
+        return self._split_columns(rows)
+
+
+class NpyFile(TimeSeriesFile):
+    """
+    ``.npy`` file of a two-dimensional array with the times in the first
+    column and the values in the remaining columns. The file is mapped into
+    memory, so only the chunks read are loaded.
+
+    Args:
+        filename (str, optional): the file
+    """
+    def _read(self, size):
+        rows = np.load(self.filename, mmap_mode = "r")
+        assert rows.ndim == 2, "{} has to hold a two-dimensional array".format(
+            self.filename)
+        return self._split_columns(
+            rows[self._position:self._position + size])
+
+
+class NpzFile(TimeSeriesFile):
+    """
+    ``.npz`` file with the times in a member ``times`` and the values in a
+    member ``values``, e.g. written with :any:`numpy.savez`. Uncompressed
+    members are mapped into memory, so only the chunks read are loaded.
+    Compressed members are read completely.
+
+    Args:
+        filename (str, optional): the file
+    """
+    def rewind(self):
+        self._arrays = None
+        TimeSeriesFile.rewind(self)
+
+    def _read(self, size):
+        if self._arrays is None:
+            self._arrays = checkpoint._map_npz(self.filename)
+        chunk = slice(self._position, self._position + size)
+        return ( np.array(self._arrays["times"][chunk]),
+            np.array(self._arrays["values"][chunk]) )
+
+
+def open_file(filename):
+    """
+    Open a time series file according to its extension
+
+    Args:
+        filename (str): the file ending with ``.csv``, ``.npy`` or ``.npz``
+
+    Returns:
+        TimeSeriesFile : the opened file
+    """
+    classes = { ".csv": CsvFile, ".npy": NpyFile, ".npz": NpzFile }
+    extension = os.path.splitext(filename)[1].lower()
+    assert extension in classes, "unknown time series file type '{}'".format(
+        extension)
+    return classes[extension](filename = filename)
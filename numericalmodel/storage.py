@@ -0,0 +1,664 @@
+#!/usr/bin/env python3
+# system modules
+import os
+import io
+import itertools
+import struct
+import zlib
+import tempfile
+
+# internal modules
+from . import utils
+
+# external modules
+import numpy as np
+
+
+class GrowingArray(utils.LoggerObject,utils.ReprObject):
+    """
+    Array that can efficiently grow along its first axis. When the underlying
+    buffer is full, its capacity is doubled, so appending is done in amortized
+    constant time. Dropping leading elements only moves an offset. The
+    elements may be arrays themselves. The shape of the elements is taken
+    from the first element appended to an empty array.
+
+    Args:
+        data (:any:`numpy.ndarray`, optional): the initial content
+    """
+    def __init__(self, data = None):
+        if data is None: data = self._default_data
+        self.data = data
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def data(self):
+        """
+        The filled part of the buffer
+
+        :getter:
+            Return a view of the filled part of the buffer. Note that this
+            view is only valid until the next modification of the array.
+        :setter:
+            Replace the content. The given array is used as buffer directly
+            without copying.
+        :type: :any:`numpy.ndarray`
+        """
+        return self._buffer[self._start:self._stop]
+
+    @data.setter
+    def data(self, newdata):
+        newdata = np.asanyarray(newdata)
+        assert newdata.ndim >= 1, "data has to be at least one-dimensional"
+        self._buffer = self._adopt(newdata)
+        self._start = 0
+        self._stop = newdata.shape[0]
+
+    @property
+    def _default_data(self):
+        """
+        The default content if none was given
+
+        :type: :any:`numpy.ndarray`
+        """
+        return np.array([]) # empty array
+
+    @property
+    def capacity(self):
+        """
+        The number of elements the underlying buffer can hold without
+        reallocation
+
+        :type: :any:`int`
+        """
+        return self._buffer.shape[0] - self._start
+
+    @property
+    def last(self):
+        """
+        The last element
+
+        :type: :any:`numpy.ndarray` or scalar
+        """
+        assert self._stop > self._start, "array is empty"
+        return self._buffer[self._stop - 1]
+
+    ###############
+    ### Methods ###
+    ###############
+    def _adopt(self, data):
+        """ 
+        Turn new content into a buffer
+
+        Args:
+            data (numpy.ndarray): the new content
+
+        Returns:
+            numpy.ndarray : the buffer holding the content. This is ``data``
+            itself.
+        """
+        return data
+
+    def _reallocate(self, capacity, dtype, shape):
+        """
+        Move the content to a new buffer with a given capacity, dtype and
+        element shape
+
+        Args:
+            capacity (int): the new capacity
+            dtype (numpy.dtype): the new dtype
+            shape (tuple): the new element shape
+        """
+        old = self._buffer
+        new = np.empty((capacity,) + shape, dtype = dtype)
+        size = self._stop - self._start
+        if size: new[:size] = old[self._start:self._stop]
+        self._buffer = new
+        self._start, self._stop = 0, size
+
+    def _make_room(self, n = 1, dtype = None, shape = None):
+        """
+        Make sure that ``n`` more elements of a given dtype and shape fit into
+        the buffer
+
+        Args:
+            n (int, optional): the number of elements to fit in
+            dtype (numpy.dtype, optional): the dtype of the new elements
+            shape (tuple, optional): the shape of the new elements. Only
+                used if the array is empty.
+        """
+        buf = self._buffer
+        newdtype, newshape = buf.dtype, buf.shape[1:]
+        if not dtype is None and dtype != buf.dtype:
+            if not np.can_cast(dtype, buf.dtype, casting = "safe"):
+                newdtype = np.result_type(dtype, buf.dtype)
+        if not shape is None and shape != newshape \
+            and self._stop == self._start: # empty, adopt new element shape
+            newshape = shape
+        if self._stop + n > buf.shape[0] or newdtype != buf.dtype \
+            or newshape != buf.shape[1:]:
+            needed = self._stop - self._start + n
+            self._reallocate(capacity = max(2 * needed, 8), 
+                dtype = newdtype, shape = newshape)
+
+    def append(self, item):
+        """
+        Append an element
+
+        Args:
+            item (array_like): the new element
+        """
+        item = np.asarray(item)
+        self._make_room(n = 1, dtype = item.dtype, shape = item.shape)
+        self._buffer[self._stop] = item
+        self._stop += 1
+
+    def extend(self, items):
+        """ 
+        Append several elements at once
+
+        Args:
+            items (array_like): the new elements along the first axis
+        """
+        items = np.asarray(items)
+        assert items.ndim >= 1, "items have to be at least one-dimensional"
+        n = items.shape[0]
+        if not n: # nothing to do
+            return
+        self._make_room(n = n, dtype = items.dtype, shape = items.shape[1:])
+        self._buffer[self._stop:self._stop + n] = items
+        self._stop += n
+
+    def reserve(self, n, dtype = None):
+        """
+        Make sure that ``n`` more elements fit into the buffer, so that
+        appending them doesn't reallocate it
+
+        Args:
+            n (int): the number of elements to fit in
+            dtype (numpy.dtype, optional): the dtype of the new elements.
+                Defaults to the current dtype.
+        """
+        buf = self._buffer
+        newdtype = buf.dtype
+        if not dtype is None and not np.can_cast(dtype, buf.dtype, 
+            casting = "safe"):
+            newdtype = np.result_type(dtype, buf.dtype)
+        if self._stop + int(n) > buf.shape[0] or newdtype != buf.dtype:
+            self._reallocate(capacity = len(self) + int(n), 
+                dtype = newdtype, shape = buf.shape[1:])
+
+    def trim(self):
+        """
+        Shrink the buffer to the current content
+        """
+        size = len(self)
+        if size and self.capacity > size:
+            buf = self._buffer
+            self._reallocate(capacity = size, dtype = buf.dtype, 
+                shape = buf.shape[1:])
+
+    def replace_last(self, item):
+        """
+        Overwrite the last element
+
+        Args:
+            item (array_like): the new last element
+        """
+        assert self._stop > self._start, "array is empty"
+        item = np.asarray(item)
+        self._make_room(n = 0, dtype = item.dtype)
+        self._buffer[self._stop - 1] = item
+
+    def drop(self, n):
+        """
+        Drop leading elements
+
+        Args:
+            n (int): the number of leading elements to drop
+        """
+        n = min(max(int(n), 0), self._stop - self._start)
+        self._start += n
+
+    def truncate(self, size):
+        """
+        Drop trailing elements
+
+        Args:
+            size (int): the number of leading elements to keep
+        """
+        size = min(max(int(size), 0), self._stop - self._start)
+        self._stop = self._start + size
+
+    def __len__(self):
+        return self._stop - self._start
+
+
+class MemmapArray(GrowingArray):
+    """
+    :any:`GrowingArray` whose buffer is a :any:`numpy.memmap` of a file. The
+    content lives on disk and only the parts in use are held in memory by the
+    operating system's page cache. When the buffer is full, the file is
+    enlarged and mapped again without copying the content. The file is only
+    rewritten if the dtype or element shape changes or if most of it consists
+    of dropped elements.
+
+    Args:
+        data (:any:`numpy.ndarray`, optional): the initial content
+        filename (str, optional): the file to store the content in. An
+            existing file is overwritten. Defaults to a new temporary file.
+    """
+    def __init__(self, data = None, filename = None):
+        if not filename is None:
+            self.filename = filename
+        GrowingArray.__init__(self, data = data)
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def filename(self):
+        """
+        The file the content is stored in
+
+        :type: :any:`str`
+        """
+        try:                   self._filename
+        except AttributeError: self._filename = self._default_filename
+        return self._filename
+
+    @filename.setter
+    def filename(self, newfilename):
+        assert isinstance(newfilename, str), "filename has to be str"
+        self._filename = newfilename
+
+    @property
+    def _default_filename(self):
+        """
+        The default file if none was given, a new temporary file
+
+        :type: :any:`str`
+        """
+        fd, filename = tempfile.mkstemp(prefix = "numericalmodel-", 
+            suffix = ".dat")
+        os.close(fd)
+        return filename
+
+    ###############
+    ### Methods ###
+    ###############
+    def _map(self, capacity, dtype, shape, filename = None):
+        """ 
+        Resize a file to a given capacity and map it
+
+        Args:
+            capacity (int): the number of elements the file should hold
+            dtype (numpy.dtype): the dtype
+            shape (tuple): the element shape
+            filename (str, optional): the file. Defaults to :any:`filename`.
+
+        Returns:
+            numpy.memmap : the mapped file
+        """
+        if filename is None: filename = self.filename
+        capacity = max(int(capacity), 1) # empty files can't be mapped
+        size = capacity * np.dtype(dtype).itemsize * int(np.prod(shape))
+        mode = "r+b" if os.path.exists(filename) else "w+b"
+        with open(filename, mode) as f:
+            f.truncate(max(size, 1))
+        return np.memmap(filename, dtype = dtype, mode = "r+", 
+            shape = (capacity,) + shape)
+
+    def _rewrite(self, content, capacity):
+        """ 
+        Write content to a new file and map it. The new file replaces the old
+        one, so views of the old mapping stay valid.
+
+        Args:
+            content (numpy.ndarray): the content
+            capacity (int): the number of elements the file should hold
+
+        Returns:
+            numpy.memmap : the mapped file
+        """
+        capacity = max(capacity, content.shape[0])
+        directory, name = os.path.split(os.path.abspath(self.filename))
+        fd, tmpname = tempfile.mkstemp(prefix = name, dir = directory)
+        os.close(fd)
+        buf = self._map(capacity, dtype = content.dtype, 
+            shape = content.shape[1:], filename = tmpname)
+        buf[:content.shape[0]] = content
+        buf.flush()
+        del buf
+        os.replace(tmpname, self.filename)
+        return self._map(capacity, dtype = content.dtype, 
+            shape = content.shape[1:])
+
+    def _adopt(self, data):
+        """ 
+        Write new content to the file
+
+        Args:
+            data (numpy.ndarray): the new content
+
+        Returns:
+            numpy.memmap : the mapped file holding the content
+        """
+        return self._rewrite(data, capacity = data.shape[0])
+
+    def _reallocate(self, capacity, dtype, shape):
+        old = self._buffer
+        size = self._stop - self._start
+        if dtype != old.dtype or shape != old.shape[1:] \
+            or not isinstance(old, np.memmap): # rewrite the file
+            content = np.empty((size,) + shape, dtype = dtype)
+            content[:] = old[self._start:self._stop]
+            self._buffer = self._rewrite(content, capacity = capacity)
+            self._start, self._stop = 0, size
+            return
+        if self._start > size: # mostly dropped elements, move content to front
+            old[:size] = old[self._start:self._stop]
+            self._start, self._stop = 0, size
+        old.flush()
+        self._buffer = self._map(self._start + capacity, 
+            dtype = dtype, shape = shape)
+
+    def flush(self):
+        """ 
+        Write changes to disk
+        """
+        if isinstance(self._buffer, np.memmap):
+            self._buffer.flush()
+
+
+class MemmapStorage(utils.LoggerObject,utils.ReprObject):
+    """
+    Factory for :any:`MemmapArray` s in a run directory
+
+    Args:
+        directory (str, optional): the directory to store the files in. It is
+            created if necessary. Defaults to a new temporary directory.
+    """
+    def __init__(self, directory = None):
+        if not directory is None:
+            self.directory = directory
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def directory(self):
+        """
+        The directory to store the files in
+
+        :type: :any:`str`
+        """
+        try:                   self._directory
+        except AttributeError: self._directory = self._default_directory
+        return self._directory
+
+    @directory.setter
+    def directory(self, newdirectory):
+        assert isinstance(newdirectory, str), "directory has to be str"
+        self._directory = newdirectory
+
+    @property
+    def _default_directory(self):
+        """
+        The default directory if none was given, a new temporary directory
+
+        :type: :any:`str`
+        """
+        return tempfile.mkdtemp(prefix = "numericalmodel-")
+
+    ###############
+    ### Methods ###
+    ###############
+    def array(self, name, data = None):
+        """ 
+        Create a new :any:`MemmapArray`
+
+        Args:
+            name (str): the name of the array. The file is named after it.
+                If a file of that name already exists, a number is appended
+                to the name, so arrays never share a file.
+            data (:any:`numpy.ndarray`, optional): the initial content
+
+        Returns:
+            MemmapArray : the new array
+        """
+        os.makedirs(self.directory, exist_ok = True)
+        for number in itertools.count():
+            filename = os.path.join(self.directory, "{}.dat".format(
+                name if not number else "{}-{}".format(name, number)))
+            try: # claim the file name
+                os.close(os.open(filename, os.O_CREAT | os.O_EXCL))
+                break
+            except FileExistsError:
+                continue
+        return MemmapArray(filename = filename, data = data)
+
+
+class FrameFile(utils.LoggerObject,utils.ReprObject):
+    """
+    Base class for append-only binary files of frames. Each frame holds
+    several arrays in the ``.npy`` format, optionally compressed with
+    :mod:`zlib`. Appending frames only writes these frames.
+
+    Args:
+        filename (str, optional): the file to store the frames in. New
+            frames are appended to an existing file. Defaults to a new
+            temporary file.
+        compress (bool, optional): compress the frames? Defaults to
+            ``False``.
+        batch (int, optional): the number of records to collect before
+            writing them. Defaults to 1024.
+    """
+    frame_header = struct.Struct("<?Q")
+    """ 
+    The header of each frame: whether the frame is compressed and the length
+    of the frame content in bytes 
+    """
+
+    def __init__(self, filename = None, compress = None, batch = None):
+        if not filename is None:
+            self.filename = filename
+        if not compress is None:
+            self.compress = compress
+        if not batch is None:
+            self.batch = batch
+
+    ##################
+    ### Properties ###
+    ##################
+    @property
+    def filename(self):
+        """
+        The file the frames are stored in
+
+        :type: :any:`str`
+        """
+        try:                   self._filename
+        except AttributeError: self._filename = self._default_filename
+        return self._filename
+
+    @filename.setter
+    def filename(self, newfilename):
+        assert isinstance(newfilename, str), "filename has to be str"
+        self._filename = newfilename
+
+    @property
+    def _default_filename(self):
+        """
+        The default file if none was given, a new temporary file
+
+        :type: :any:`str`
+        """
+        fd, filename = tempfile.mkstemp(prefix = "numericalmodel-", 
+            suffix = ".archive")
+        os.close(fd)
+        return filename
+
+    @property
+    def compress(self):
+        """
+        Whether new frames are compressed
+
+        :type: :any:`bool`
+        """
+        try:                   self._compress
+        except AttributeError: self._compress = self._default_compress
+        return self._compress
+
+    @compress.setter
+    def compress(self, newcompress):
+        self._compress = bool(newcompress)
+
+    @property
+    def _default_compress(self):
+        """
+        Default behaviour for :any:`compress`
+
+        :type: :any:`bool`
+        """
+        return False
+
+    @property
+    def batch(self):
+        """
+        The number of records to collect before writing them
+
+        :type: :any:`int`
+        """
+        try:                   self._batch
+        except AttributeError: self._batch = self._default_batch
+        return self._batch
+
+    @batch.setter
+    def batch(self, newbatch):
+        assert newbatch >= 1, "batch has to be positive"
+        self._batch = int(newbatch)
+
+    @property
+    def _default_batch(self):
+        """
+        The default :any:`batch` if none was given
+
+        :type: :any:`int`
+        """
+        return 1024
+
+    ###############
+    ### Methods ###
+    ###############
+    def _write_frames(self, frames, sync = False):
+        """ 
+        Append frames to the file
+
+        Args:
+            frames (list): the frames. Each frame is a :any:`list` of
+                :any:`numpy.ndarray` s.
+            sync (bool, optional): make sure the frames reach the disk before
+                returning?
+        """
+        compress = self.compress
+        with open(self.filename, "ab") as f:
+            for arrays in frames:
+                buf = io.BytesIO()
+                for array in arrays:
+                    np.save(buf, np.asarray(array), allow_pickle = False)
+                content = buf.getvalue()
+                if compress: 
+                    content = zlib.compress(content)
+                f.write(self.frame_header.pack(compress, len(content)))
+                f.write(content)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _read_frames(self):
+        """ 
+        Read the frames from the file. An incomplete last frame is ignored.
+
+        Yields:
+            list : the :any:`numpy.ndarray` s of each frame
+        """
+        if not os.path.exists(self.filename):
+            return
+        header = self.frame_header
+        with open(self.filename, "rb") as f:
+            while True:
+                head = f.read(header.size)
+                if len(head) < header.size: # end of file
+                    break
+                compressed, length = header.unpack(head)
+                content = f.read(length)
+                if len(content) < length: # incomplete last frame
+                    break
+                if compressed: 
+                    content = zlib.decompress(content)
+                buf = io.BytesIO(content)
+                arrays = []
+                while buf.tell() < len(content):
+                    arrays.append(np.load(buf, allow_pickle = False))
+                yield arrays
+
+
+class Archive(FrameFile):
+    """
+    Append-only binary file of batches of times and values. Each batch is
+    stored as a frame holding the times and values in the ``.npy`` format,
+    optionally compressed with :mod:`zlib`. Appending a batch only writes
+    that batch.
+
+    Args:
+        filename (str, optional): the file to store the batches in. New
+            batches are appended to an existing file. Defaults to a new
+            temporary file.
+        compress (bool, optional): compress the batches? Defaults to
+            ``False``.
+        batch (int, optional): the number of samples an
+            :any:`InterfaceValue` should collect before spilling them into
+            the archive. Defaults to 1024.
+    """
+    ###############
+    ### Methods ###
+    ###############
+    def append(self, times, values):
+        """ 
+        Append a batch
+
+        Args:
+            times (numpy.ndarray): the times
+            values (numpy.ndarray): the values corresponding to the times
+        """
+        assert len(times) == len(values), \
+            "times and values are of different size"
+        if not len(times): 
+            return
+        self._write_frames([[times, values]])
+
+    def batches(self):
+        """ 
+        Read the stored batches
+
+        Yields:
+            tuple : the times and values of each batch
+        """
+        for times, values in self._read_frames():
+            yield times, values
+
+    def read(self):
+        """ 
+        Read all stored batches at once
+
+        Returns:
+            tuple : the concatenated times and values. ``None`` for both if
+            the archive is empty.
+        """
+        batches = list(self.batches())
+        if not batches: 
+            return None, None
+        times, values = zip(*batches)
+        return np.concatenate(times), np.concatenate(values)
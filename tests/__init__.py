@@ -11,6 +11,8 @@ from . import interfaces
 from . import numericalschemes
 from . import numericalmodel
 from . import equations
+from . import storage
+from . import sources
 
 from . import test_data
 from . import test_flow
@@ -27,7 +29,8 @@ def runtest(module, verbose=False):
 # run all tests
 def runall(verbose=False):
     for module in [
-        utils,interfaces,numericalschemes,numericalmodel,equations
+        utils,interfaces,numericalschemes,numericalmodel,equations,storage,
+        sources,
         ]:
         runtest(module=module,verbose=verbose)
         print()
@@ -3,9 +3,14 @@
 import unittest
 import logging
 import time
+import os
+import tempfile
+import shutil
 
 # import authentication module
 from numericalmodel.interfaces import *
+from numericalmodel import storage
+from numericalmodel import checkpoint
 
 # import test data
 from .test_data import *
@@ -90,6 +95,18 @@ class InterfaceValueInteractiveChangeTest(InterfaceValueTest):
                 self.assertTrue( 
                     np.allclose( val.times, np.array(rg)[:(t+1)] ) )
 
+    @testname("times and values are views of the history")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_history_views(self):
+        val = self.val
+        for i in range(100):
+            val.next_time = i
+            val.value = i
+        self.assertTrue( np.allclose( val.times, np.arange(100) ) )
+        self.assertTrue( np.allclose( val.values, np.arange(100) ) )
+        val.values[-1] = 1000
+        self.assertEqual( val.value, 1000 )
+
     @testname("decreasing time should fail")
     @unittest.skipIf(SKIPALL,"skipping all tests")
     @unittest.expectedFailure
@@ -257,6 +274,431 @@ class InterfaceValueInterpolationTest(InterfaceValueTest):
         self.assertEqual(val(self.rg.min()-1),self.rg.min())
         self.assertEqual(val(self.rg.max()+1),self.rg.max())
 
+    @testname("interpolator survives appending")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_interpolator_survives_append(self):
+        val = self.val
+        for kind in ["zero","nearest","linear"]:
+            val.interpolation = kind
+            interpolator = val.interpolator
+            for t in np.linspace(10,20,11):
+                val.next_time = t
+                val.value = t
+                self.assertTrue( val.interpolator is interpolator )
+                self.assertEqual( val(t), t )
+                self.assertEqual( val(t - 1), t - 1 )
+            val.times = self.rg
+            val.values = self.rg
+
+    @testname("interpolation with cursor")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_cursor_interpolation(self):
+        val = self.val
+        val.cursor = True
+        times = np.append(np.linspace(-1,10,111), np.linspace(10,-1,23))
+        for kind in ["zero","nearest","linear"]:
+            val.interpolation = kind
+            # compare with cursor-less vectorized interpolation
+            expected = val(times)
+            for t,e in zip(times, expected):
+                self.assertEqual( val(t), e )
+
+    @testname("scipy interpolation fallback")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_scipy_interpolation(self):
+        val = self.val
+        val.interpolation = "quadratic"
+        t = self.rg[:-1] + 0.5
+        self.assertTrue( np.allclose( val(t), t ) )
+        val.next_time = 10
+        val.value = 10
+        self.assertTrue( np.allclose( val(9.5), 9.5 ) )
+
+class InterfaceValueFieldTest(InterfaceValueTest):
+    """ Tests for array-valued InterfaceValues
+    """
+    def setUp(self):
+        self.rg = np.linspace(0,9,10)
+        self.field = np.arange(6).reshape(2,3)
+        self.val = InterfaceValue( 
+            values = self.rg[:,np.newaxis,np.newaxis] * self.field, 
+            times  = self.rg,
+            )
+
+    @testname("recording fields")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_field_recording(self):
+        val = InterfaceValue()
+        for t in self.rg:
+            val.next_time = t
+            val.value = t * self.field
+        self.assertEqual( val.values.shape, (self.rg.size,) + self.field.shape )
+        self.assertTrue( np.allclose( val.values, self.val.values ) )
+        self.assertTrue( np.allclose( val(), self.rg[-1] * self.field ) )
+        # a single value is used for the whole field
+        val.value = 1
+        self.assertTrue( np.allclose( val(), np.ones_like(self.field) ) )
+
+    @testname("field shape mismatch fails")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    @unittest.expectedFailure
+    def test_field_shape_mismatch_fail(self):
+        self.val.next_time = self.rg[-1] + 1
+        self.val.value = np.ones(4)
+
+    @testname("field bounds")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    @unittest.expectedFailure
+    def test_field_bounds_fail(self):
+        self.val.bounds = [0, 40]
+
+    @testname("field interpolation")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_field_interpolation(self):
+        val = self.val
+        times = np.array([[-1,0.5],[3.5,20]])
+        expected = {
+            "zero":    np.array([[0,0],[3,9]]),
+            "nearest": np.array([[0,0],[3,9]]),
+            "linear":  np.array([[0,0.5],[3.5,9]]),
+            "quadratic":  np.array([[0,0.5],[3.5,9]]),
+            }
+        for kind, factors in expected.items():
+            val.interpolation = kind
+            res = val(times)
+            self.assertEqual( res.shape, times.shape + self.field.shape )
+            self.assertTrue( np.allclose( res, 
+                factors[:,:,np.newaxis,np.newaxis] * self.field ) )
+            self.assertTrue( np.allclose( val(4.5), 
+                val(np.array([4.5]))[0] ) )
+
+
+class InterfaceValueHistoryStoreTest(InterfaceValueTest):
+    """ Tests for InterfaceValues with history on disk
+    """
+    def setUp(self):
+        self.store = storage.MemmapStorage( tempfile.mkdtemp() )
+
+    def tearDown(self):
+        shutil.rmtree( self.store.directory )
+
+    @testname("recording history on disk")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_history_store(self):
+        val = InterfaceValue( id = "T", history_store = self.store,
+            interpolation = "linear", times = np.array([0]), 
+            values = np.array([[1,2]]) )
+        for i in range(1,100):
+            val.next_time = i
+            val.value = np.array([i,2*i])
+        self.assertIsInstance( val.values, np.memmap )
+        self.assertIsInstance( val.times, np.memmap )
+        self.assertEqual( sorted(os.listdir( self.store.directory )),
+            ["T.times.dat","T.values.dat"] )
+        self.assertTrue( np.allclose( val(50.5), [50.5,101] ) )
+
+    @testname("values with the same id in one store")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_same_id(self):
+        vals = [ StateVariable( history_store = self.store ) 
+            for i in range(2) ]
+        for i in range(10):
+            for sign, val in zip([1,-1], vals):
+                val.next_time = i
+                val.value = sign * i
+        self.assertTrue( np.allclose( vals[0].values, np.arange(10) ) )
+        self.assertTrue( np.allclose( vals[1].values, - np.arange(10) ) )
+        self.assertEqual( len(os.listdir( self.store.directory )), 4 )
+
+    @testname("moving history to disk")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_move_history(self):
+        val = InterfaceValue( id = "T", times = np.array([0,1]), 
+            values = np.array([1,2]), interpolation = "linear" )
+        self.assertTrue( np.allclose( val(0.5), 1.5 ) )
+        val.history_store = self.store
+        self.assertIsInstance( val.values, np.memmap )
+        self.assertTrue( np.allclose( val.values, [1,2] ) )
+        self.assertTrue( np.allclose( val(0.5), 1.5 ) )
+        val.history_store = None
+        self.assertNotIsInstance( val.values, np.memmap )
+        self.assertTrue( np.allclose( val.values, [1,2] ) )
+
+
+class InterfaceValueExtendTest(InterfaceValueTest):
+    """ Tests for recording several values at once
+    """
+    @testname("extending the history")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_extend(self):
+        val = InterfaceValue( times = np.array([0]), 
+            values = np.array([[0,0]]), interpolation = "linear" )
+        self.assertTrue( np.allclose( val(0.5), [0,0] ) )
+        version = val.version
+        val.extend( np.arange(1,11), np.ones((10,2)) * np.arange(1,11)[:,None] )
+        self.assertEqual( val.version, version + 1 )
+        self.assertTrue( np.allclose( val.times, np.arange(11) ) )
+        self.assertTrue( np.allclose( val(0.5), [0.5,0.5] ) )
+        self.assertEqual( val.time, 10 )
+
+    @testname("only the new chunk is checked")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_extend_checks(self):
+        val = InterfaceValue( times = np.array([0,1]), values = np.array([0,1]),
+            bounds = [0,10] )
+        with self.assertRaises(AssertionError): # not later than the last time
+            val.extend( [1,2], [1,2] )
+        with self.assertRaises(AssertionError): # not increasing
+            val.extend( [3,2], [1,2] )
+        with self.assertRaises(AssertionError): # out of bounds
+            val.extend( [2,3], [1,20] )
+        with self.assertRaises(AssertionError): # wrong shape
+            val.extend( [2,3], [[1,1],[2,2]] )
+        self.assertTrue( np.allclose( val.times, [0,1] ) )
+
+    @testname("extending respects the remembrance")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_extend_remembrance(self):
+        val = InterfaceValue( times = np.array([0]), values = np.array([0]),
+            remembrance = 5 )
+        val.extend( np.arange(1,100), np.arange(1,100) )
+        self.assertTrue( np.allclose( val.times, np.arange(94,100) ) )
+
+
+class InterfaceValuePrecomputeTest(InterfaceValueTest):
+    """ Tests for precomputed values
+    """
+    @testname("precomputed values are looked up")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_precompute(self):
+        val = ForcingValue( times = np.array([0,10]), values = np.array([0,20]) )
+        times = np.linspace(0, 10, 101)
+        val.precompute( times )
+        calls = []
+        evaluate = val._evaluate
+        def count(times = None):
+            calls.append(times)
+            return evaluate(times)
+        val._evaluate = count
+        for t in times:
+            self.assertTrue( np.allclose( val(t), 2 * t ) )
+        self.assertEqual( len(calls), 0 )
+        self.assertTrue( np.allclose( val(0.05), 0.1 ) ) # not precomputed
+        self.assertEqual( len(calls), 1 )
+        self.assertTrue( np.allclose( val(10.5), 20 ) ) # after the last time
+        self.assertEqual( len(calls), 2 )
+        # the results are kept as arrays, not per time
+        precomputed_times, precomputed_values, hint = val._precomputed
+        self.assertEqual( precomputed_values.shape, times.shape )
+        val.next_time = 20
+        val.value = 0 # history changed
+        self.assertTrue( np.allclose( val(10), 20 ) )
+        self.assertEqual( len(calls), 3 )
+        self.assertIsNone( val._precomputed )
+
+
+class InterfaceValueScratchTest(InterfaceValueTest):
+    """ Tests for scratch values
+    """
+    @testname("scratch values are discarded on commit")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_scratch(self):
+        val = InterfaceValue( times = np.array([0]), values = np.array([0]),
+            interpolation = "linear" )
+        val.begin_scratch()
+        for t in [0.5, 0.75, 1]:
+            val.next_time = t
+            val.value = 4 * t
+        self.assertTrue( np.allclose( val(0.25), 1 ) )
+        val.commit_scratch()
+        self.assertTrue( np.allclose( val.times, [0,1] ) )
+        self.assertTrue( np.allclose( val.values, [0,4] ) )
+        self.assertTrue( np.allclose( val(0.25), 1 ) )
+        val.commit_scratch() # nothing to commit
+        self.assertEqual( len(val.times), 2 )
+
+
+class FileForcingValueTest(InterfaceValueTest):
+    """ Tests for the FileForcingValue class
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join( self.directory, "forcing.npy" )
+        times = np.arange(1000, dtype = float)
+        np.save( self.filename, np.column_stack([ times, times * 2 ]) )
+
+    def tearDown(self):
+        shutil.rmtree( self.directory )
+
+    @testname("chunks are loaded on demand")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_load(self):
+        val = FileForcingValue( filename = self.filename, chunksize = 100,
+            readahead = 10 )
+        self.assertFalse( val.time_invariant )
+        self.assertTrue( np.allclose( val(5.5), 11 ) )
+        self.assertEqual( len(val.times), 100 )
+        self.assertTrue( np.allclose( val(95), 190 ) )
+        self.assertEqual( len(val.times), 200 )
+        self.assertTrue( np.allclose( val(np.array([400.5, 401])), [801, 802] ) )
+        self.assertEqual( len(val.times), 500 )
+
+    @testname("only a window is kept")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_window(self):
+        val = FileForcingValue( filename = self.filename, chunksize = 50,
+            remembrance = 20 )
+        for t in np.arange(0, 999, 0.5):
+            self.assertTrue( np.allclose( val(t), 2 * t ) )
+            self.assertTrue( len(val.times) <= 50 + 22 )
+        self.assertEqual( val.time, 999 )
+        self.assertTrue( np.allclose( val(3), 6 ) ) # read again
+
+    @testname("vector calls keep their whole window")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_window_vector(self):
+        val = FileForcingValue( filename = self.filename, chunksize = 5,
+            remembrance = 5 )
+        self.assertTrue( np.allclose( val(np.array([1., 2., 40.])), 
+            [2, 4, 80] ) )
+        self.assertTrue( val.times[0] <= 35 and val.times[0] > 2 )
+        self.assertTrue( np.allclose( val(np.array([3.5, 60.])), 
+            [7, 120] ) ) # read again
+
+    @testname("ensemble members")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_members(self):
+        val = FileForcingValue( filename = self.filename, chunksize = 10 )
+        val(5)
+        val.add_member_axis(3)
+        self.assertEqual( val(5).shape, (3,) )
+        self.assertTrue( np.allclose( val(np.array([5, 50])), 
+            [[10]*3, [100]*3] ) )
+        unloaded = FileForcingValue( filename = self.filename )
+        unloaded.add_member_axis(2)
+        self.assertTrue( np.allclose( unloaded(3), [6, 6] ) )
+
+    @testname("checkpoint settings")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_settings(self):
+        from numericalmodel import checkpoint
+        val = FileForcingValue( filename = self.filename, chunksize = 10 )
+        val(50)
+        settings = checkpoint.settings(val,
+            exclude = ["times","values","time_function"])
+        self.assertEqual( settings["filename"], self.filename )
+        restored = FileForcingValue( **settings )
+        restored.restore_history( val.times, val.values )
+        self.assertTrue( np.allclose( restored(100), 200 ) )
+
+
+class FunctionForcingValueTest(InterfaceValueTest):
+    """ Tests for the FunctionForcingValue class
+    """
+    @testname("evaluating the function")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_evaluate(self):
+        val = FunctionForcingValue( function = np.sin, 
+            time_function = lambda: np.pi / 2 )
+        self.assertTrue( np.allclose( val.value, 1 ) )
+        times = np.linspace(0, 10, 20)
+        self.assertTrue( np.allclose( val(times), np.sin(times) ) )
+        self.assertEqual( len(val.times), 0 )
+        self.assertFalse( val.time_invariant )
+        with self.assertRaises(AttributeError):
+            val.value = 2
+        self.assertIs( FunctionForcingValue( function = "numpy.sin" ).function,
+            np.sin )
+
+    @testname("ensemble members")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_members(self):
+        val = FunctionForcingValue( function = constant_forcing )
+        val.add_member_axis(3)
+        self.assertEqual( val(1).shape, (3,) )
+        self.assertEqual( val(np.arange(5)).shape, (5,3) )
+        # the members are part of the settings
+        from numericalmodel import checkpoint
+        settings = checkpoint.settings(val,
+            exclude = ["times","values","time_function"])
+        self.assertEqual( FunctionForcingValue( **settings )(1).shape, (3,) )
+
+
+class FrozenParameterTest(InterfaceValueTest):
+    """ Tests for frozen Parameters
+    """
+    @testname("frozen parameter is constant")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_frozen(self):
+        par = Parameter( times = np.array([0,1]), values = np.array([1,2]),
+            frozen = True )
+        self.assertTrue( par.time_invariant )
+        self.assertEqual( par.value, 2 )
+        self.assertEqual( par(0), 2 )
+        self.assertTrue( np.allclose( par(np.arange(3)), [2,2,2] ) )
+        version = par.version
+        with self.assertRaises(AttributeError):
+            par.value = 3
+        with self.assertRaises(AttributeError):
+            par.extend( [2], [3] )
+        self.assertEqual( par.version, version )
+        par.frozen = False
+        self.assertFalse( par.time_invariant )
+        self.assertEqual( par(0), 1 )
+        par.next_time = 2
+        par.value = 3
+        self.assertEqual( par.value, 3 )
+
+    @testname("frozen field parameter")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_frozen_field(self):
+        par = Parameter( frozen = True )
+        self.assertIsNone( par._constant )
+        par.restore_history( np.array([0]), np.array([[1,2]]) )
+        self.assertTrue( np.allclose( par.value, [1,2] ) )
+        self.assertEqual( par(np.arange(4)).shape, (4,2) )
+        par.add_member_axis(3)
+        self.assertEqual( par.value.shape, (3,2) )
+        self.assertFalse( par.value.flags.writeable )
+
+
+class InterfaceValueArchiveTest(InterfaceValueTest):
+    """ Tests for InterfaceValues that archive old values
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree( self.directory )
+
+    @testname("old values are moved to the archive in batches")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_archive(self):
+        archive = storage.Archive( batch = 10,
+            filename = os.path.join( self.directory, "T" ) )
+        val = InterfaceValue( times = np.array([0]), values = np.array([0]),
+            remembrance = 5, archive = archive )
+        for i in range(1,100):
+            val.next_time = i
+            val.value = i
+            self.assertTrue( len(val.times) <= 6 + 10 )
+        self.assertTrue( np.all( val.times >= 99 - 5 - 10 ) )
+        times, values = val.full_history()
+        self.assertTrue( np.allclose( times, np.arange(100) ) )
+        self.assertTrue( np.allclose( values, np.arange(100) ) )
+
+    @testname("a journal can't be used as archive")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_journal_is_no_archive(self):
+        journal = checkpoint.Journal(
+            filename = os.path.join( self.directory, "journal" ) )
+        self.assertFalse( isinstance( journal, storage.Archive ) )
+        self.assertFalse( hasattr( journal, "batches" ) )
+        with self.assertRaises(AssertionError):
+            InterfaceValue( times = np.array([0]), values = np.array([0]),
+                archive = journal )
+
+
 def run():
     # run the tests
     logger.info("=== INTERFACES TESTS ===")
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 # system modules
 import unittest
+import os
+import tempfile
+import shutil
 
 # import authentication module
 from numericalmodel.numericalmodel import *
 from numericalmodel.numericalschemes import *
 from numericalmodel.interfaces import *
+from numericalmodel.checkpoint import *
 
 # import test data
 from .test_data import *
@@ -69,6 +73,396 @@ class NumericalModelLinearDecayEquationRunTest(BasicTest):
 
 
 
+    @testname("ensemble integration")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_ensemble(self):
+        model = self.model
+        a = np.array([0.05,0.1,0.2,0.4])
+        model.ensemble_size = a.size
+        model.parameters["a"].value = a
+        self.assertEqual( model.variables["T"].value.shape, a.shape )
+        model.integrate( final_time = model.model_time + 10 )
+        ensemble_solution = model.variables["T"].value
+        # compare to single runs
+        for i, ai in enumerate(a):
+            self.setUp()
+            single = self.model
+            single.parameters["a"].value = ai
+            single.integrate( final_time = single.model_time + 10 )
+            self.assertTrue( 
+                np.allclose( single.variables["T"].value, 
+                    ensemble_solution[i], rtol = 1e-2 ) )
+
+
+    @testname("parameter sweep")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_sweep(self):
+        model = self.model
+        a = [0.05,0.1,0.2]
+        times = np.linspace(0,10,5)
+        res = model.sweep( parameters = {"a":a}, final_time = 10, 
+            times = times, max_workers = 2, chunksize = 2 )
+        self.assertEqual( set(res), {"T"} )
+        self.assertEqual( res["T"].shape, (len(a), times.size) )
+        # the base model is untouched
+        self.assertEqual( model.model_time, 0 )
+        # compare to single runs
+        for i, ai in enumerate(a):
+            self.setUp()
+            single = self.model
+            single.parameters["a"].value = ai
+            single.integrate( final_time = 10 )
+            self.assertTrue( np.allclose( single.variables["T"](times), 
+                res["T"][i] ) )
+        # list of parameters
+        res2 = model.sweep( parameters = [{"a":ai} for ai in a], 
+            final_time = 10, times = times )
+        self.assertTrue( np.allclose( res2["T"], res["T"] ) )
+        # frozen parameters
+        model.parameters["a"].frozen = True
+        res3 = model.sweep( parameters = {"a":a}, final_time = 10, 
+            times = times )
+        self.assertTrue( np.allclose( res3["T"], res["T"] ) )
+        self.assertEqual( model.parameters["a"].value, 0.1 )
+
+    @testname("checkpoint and restart")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_checkpoint(self):
+        model = self.model
+        model.integrate( final_time = 10 )
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join( directory, "checkpoint.npz" )
+            model.save_checkpoint( path )
+            for mmap in [False, True]:
+                restored = NumericalModel.load_checkpoint( path, mmap = mmap )
+                self.assertEqual( restored.model_time, 10 )
+                T, restored_T = model.variables["T"], restored.variables["T"]
+                self.assertTrue( np.allclose( T.times, restored_T.times ) )
+                self.assertTrue( np.allclose( T.values, restored_T.values ) )
+                self.assertEqual( restored_T.unit, "K" )
+                self.assertEqual( type(restored_T.values) is np.memmap, mmap )
+                scheme = restored.numericalschemes["T"]
+                self.assertIsInstance( scheme, EulerImplicit )
+                self.assertIsInstance( scheme.equation, LinearDecayEquation )
+                self.assertIs( scheme.equation.input["a"], 
+                    restored.parameters["a"] )
+                # continuing the restored model is the same as continuing
+                restored.integrate( final_time = 20 )
+            model.integrate( final_time = 20 )
+            self.assertTrue( np.allclose( model.variables["T"].values, 
+                restored.variables["T"].values ) )
+        finally:
+            shutil.rmtree( directory )
+
+    @testname("checkpoint of values with archive and history store")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_checkpoint_storage(self):
+        from numericalmodel import storage
+        model = self.model
+        directory = tempfile.mkdtemp()
+        try:
+            T = model.variables["T"]
+            T.archive = storage.Archive( batch = 5,
+                filename = os.path.join( directory, "T.archive" ) )
+            T.remembrance = 3
+            T.history_store = storage.MemmapStorage( 
+                os.path.join( directory, "store" ) )
+            model.integrate( final_time = 10, timestep = 0.5 )
+            path = os.path.join( directory, "checkpoint.npz" )
+            model.save_checkpoint( path )
+            restored = NumericalModel.load_checkpoint( path )
+            restored_T = restored.variables["T"]
+            self.assertEqual( restored_T.archive.filename, T.archive.filename )
+            self.assertEqual( restored_T.history_store.directory, 
+                T.history_store.directory )
+            self.assertIsInstance( restored_T.values, np.memmap )
+            for expected, actual in zip( T.full_history(), 
+                restored_T.full_history() ):
+                self.assertTrue( np.allclose( expected, actual ) )
+            # other settings that can't be stored are refused
+            class Thing:
+                def __init__(self, thing = None):
+                    self.thing = thing
+            with self.assertRaises(ValueError):
+                settings( Thing( thing = object() ) )
+        finally:
+            shutil.rmtree( directory )
+
+    @testname("fixed timestep with precomputed forcing")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_fixed_timestep(self):
+        model = self.model
+        forcing = FunctionForcingValue( id = "F", function = constant_forcing )
+        calls = []
+        def count(times = None):
+            calls.append(times)
+            return FunctionForcingValue._evaluate(forcing, times)
+        forcing._evaluate = count
+        model.forcing = SetOfForcingValues( [ forcing ] )
+        model.numericalschemes["T"].equation.input = SetOfInterfaceValues(
+            [ model.parameters["a"], forcing ] )
+        model.integrate( final_time = 10, timestep = 0.5 )
+        self.assertEqual( len(calls), 1 )
+        self.assertIsNone( forcing._precomputed )
+        T = model.variables["T"]
+        self.assertTrue( np.allclose( T.times, np.arange(0, 10.5, 0.5) ) )
+        self.setUp()
+        self.model.numericalschemes["T"].integrate_step( time = 0, 
+            timestep = 0.5 )
+        self.assertTrue( np.allclose( T.values[1], 
+            self.model.variables["T"].values[1] ) )
+
+    @testname("fixed timestep preallocates the history")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_fixed_timestep_preallocation(self):
+        model = self.model
+        T = model.variables["T"]
+        reallocations = []
+        storage = T._values_storage
+        reallocate = storage._reallocate
+        def count(*args, **kwargs):
+            reallocations.append(args)
+            return reallocate(*args, **kwargs)
+        storage._reallocate = count
+        model.integrate( final_time = 100, timestep = 0.25 )
+        self.assertEqual( len(reallocations), 1 ) # only the reservation
+        self.assertEqual( len(T.times), 401 )
+        self.assertEqual( storage.capacity, 401 )
+
+    @testname("output at requested times")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_output_times(self):
+        self.model.integrate( final_time = 100, timestep = 0.1 )
+        reference = self.model.variables["T"]
+        self.setUp()
+        model = self.model
+        model.output_times = np.arange(0, 101, 10)
+        model.integrate( final_time = 50, timestep = 0.1 )
+        model.integrate( final_time = 100, timestep = 0.1 )
+        T = model.variables["T"]
+        self.assertTrue( len(T.times) <= 4 )
+        self.assertIsNone( T.remembrance )
+        times, values = model.output["T"]
+        self.assertTrue( np.allclose( times, np.arange(0, 101, 10) ) )
+        self.assertTrue( np.allclose( values, reference(times) ) )
+
+    @testname("output every k-th step")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_output_interval(self):
+        model = self.model
+        model.numericalschemes = SetOfNumericalSchemes( [ LeapFrog( 
+            equation = model.numericalschemes["T"].equation ) ] )
+        model.output_interval = 5
+        model.integrate( final_time = 10, timestep = 0.5 )
+        times, values = model.output["T"]
+        self.assertTrue( np.allclose( times, [0, 2.5, 5, 7.5, 10] ) )
+        self.assertTrue( len(model.variables["T"].times) <= 5 )
+        # steps are counted across calls
+        self.setUp()
+        model = self.model
+        model.output_interval = 5
+        model.integrate( final_time = 7, timestep = 1 )
+        model.integrate( final_time = 14, timestep = 1 )
+        times, values = model.output["T"]
+        self.assertTrue( np.allclose( times, [0, 5, 10] ) )
+
+    @testname("analytic forcing")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_function_forcing(self):
+        model = self.model
+        forcing = FunctionForcingValue( id = "F", function = constant_forcing )
+        model.forcing = SetOfForcingValues( [ forcing ] )
+        model.numericalschemes["T"].equation.input = SetOfInterfaceValues(
+            [ model.parameters["a"], forcing ] )
+        model.integrate( final_time = 10 )
+        self.setUp()
+        self.model.integrate( final_time = 10 )
+        self.assertTrue( np.allclose( model.variables["T"].values,
+            self.model.variables["T"].values ) )
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join( directory, "checkpoint.npz" )
+            model.save_checkpoint( path )
+            restored = NumericalModel.load_checkpoint( path )
+            self.assertIs( restored.forcing["F"].function, constant_forcing )
+            restored.integrate( final_time = 20 )
+            self.model.integrate( final_time = 20 )
+            self.assertTrue( np.allclose( restored.variables["T"].values,
+                self.model.variables["T"].values ) )
+            # numpy ufuncs are saved by their path
+            forcing.function = "numpy.sin"
+            model.save_checkpoint( path )
+            restored = NumericalModel.load_checkpoint( path )
+            self.assertIs( restored.forcing["F"].function, np.sin )
+            # functions that can't be imported can't be saved
+            forcing.function = lambda times: np.full_like(times, 28.)
+            with self.assertRaises(ValueError):
+                model.save_checkpoint( path )
+        finally:
+            shutil.rmtree( directory )
+
+    @testname("forcing from a file")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_file_forcing(self):
+        model = self.model
+        times = np.arange(201, dtype = float)
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join( directory, "forcing.npy" )
+            np.save( path, np.column_stack([ times, 28 + 0.1 * times ]) )
+            forcing = FileForcingValue( id = "F", filename = path,
+                chunksize = 10, remembrance = 5 )
+            model.forcing = SetOfForcingValues( [ forcing ] )
+            model.numericalschemes["T"].equation.input = SetOfInterfaceValues(
+                [ model.parameters["a"], forcing ] )
+            loaded = []
+            extend = forcing.extend
+            def recording(*args, **kwargs):
+                extend(*args, **kwargs)
+                loaded.append(len(forcing.times))
+            forcing.extend = recording
+            model.journal = Journal( 
+                filename = os.path.join( directory, "journal" ) )
+            model.integrate( final_time = 50, timestep = 1 )
+            self.assertTrue( max(loaded) < 20 ) # only a window was loaded
+            # what can be read from the file again is not journaled
+            self.assertEqual( { str(frame[1]) for frame in 
+                model.journal._read_frames() if len(frame) > 2 }, {"T"} )
+        finally:
+            shutil.rmtree( directory )
+        self.setUp()
+        self.model.forcing["F"].restore_history( times, 28 + 0.1 * times )
+        self.model.integrate( final_time = 50, timestep = 1 )
+        self.assertTrue( np.allclose( model.variables["T"].values,
+            self.model.variables["T"].values ) )
+
+    @testname("ensemble with forcing from a file from a checkpoint")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_file_forcing_ensemble(self):
+        model = self.model
+        times = np.arange(201, dtype = float)
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join( directory, "forcing.npy" )
+            np.save( filename, np.column_stack([ times, 28 + 0.1 * times ]) )
+            forcing = FileForcingValue( id = "F", filename = filename,
+                chunksize = 10 )
+            model.forcing = SetOfForcingValues( [ forcing ] )
+            model.numericalschemes["T"].equation.input = SetOfInterfaceValues(
+                [ model.parameters["a"], forcing ] )
+            model.ensemble_size = 3
+            model.integrate( final_time = 5, timestep = 1 )
+            path = os.path.join( directory, "checkpoint.npz" )
+            model.save_checkpoint( path )
+            restored = NumericalModel.load_checkpoint( path )
+            self.assertEqual( restored.forcing["F"].members, 3 )
+            restored.integrate( final_time = 50, timestep = 1 )
+            model.integrate( final_time = 50, timestep = 1 )
+            self.assertTrue( np.allclose( restored.variables["T"].values,
+                model.variables["T"].values ) )
+        finally:
+            shutil.rmtree( directory )
+
+    @testname("resuming from checkpoint and journal")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_journal(self):
+        model = self.model
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join( directory, "checkpoint.npz" )
+            filename = os.path.join( directory, "journal" )
+            model.journal = Journal( filename = filename, batch = 3 )
+            model.integrate( final_time = 10 )
+            model.save_checkpoint( path )
+            self.assertEqual( os.path.getsize( filename ), 0 )
+            model.integrate( final_time = 20 )
+            model.parameters["a"].value = 0.2
+            model.integrate( final_time = 30 )
+            expected = model.variables["T"].values.copy()
+            # an incomplete integration is not replayed
+            model.numericalschemes.integrate( start_time = 30, 
+                final_time = 31 )
+            model.journal.flush()
+            restored = NumericalModel.load_checkpoint( path, 
+                journal = Journal( filename = filename ) )
+            self.assertEqual( restored.model_time, 30 )
+            self.assertTrue( np.allclose( restored.variables["T"].values, 
+                expected ) )
+            self.assertTrue( np.allclose( restored.parameters["a"].values, 
+                [0.1,0.2] ) )
+            self.assertIs( restored.variables["T"].journal, restored.journal )
+        finally:
+            shutil.rmtree( directory )
+
+    @testname("resuming after a crash during an integration")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_journal_crash(self):
+        model = self.model
+        scheme = model.numericalschemes["T"]
+        integrate_step = scheme.integrate_step
+        def crashing(time = None, timestep = None):
+            if time >= 6: raise RuntimeError("crash")
+            return integrate_step( time = time, timestep = timestep )
+        scheme.integrate_step = crashing
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join( directory, "checkpoint.npz" )
+            filename = os.path.join( directory, "journal" )
+            model.journal = Journal( filename = filename, batch = 3 )
+            model.save_checkpoint( path )
+            with self.assertRaises(RuntimeError):
+                model.integrate( final_time = 10, timestep = 1 )
+            restored = NumericalModel.load_checkpoint( path, 
+                journal = Journal( filename = filename ) )
+            # the steps until the last written batch are recovered
+            self.assertEqual( restored.model_time, 5 )
+            self.assertTrue( np.allclose( restored.variables["T"].times,
+                np.arange(6) ) )
+            self.assertTrue( np.allclose( restored.variables["T"].values,
+                model.variables["T"].values[:6] ) )
+        finally:
+            shutil.rmtree( directory )
+
+    @testname("journal of a plan with intermediate stages")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_journal_stages(self):
+        a = StateVariable( id = "a", values = np.array([0.1]),
+            times = np.array([0.]) )
+        T = StateVariable( id = "T", values = np.array([293.15]),
+            times = np.array([0.]) )
+        F = ForcingValue( id = "F", values = np.array([28.]),
+            times = np.array([0.]) )
+        model = NumericalModel( initial_time = 0,
+            variables = SetOfStateVariables( [ a, T ] ),
+            forcing = SetOfForcingValues( [ F ] ),
+            numericalschemes = SetOfNumericalSchemes( [
+                EulerExplicit( equation = LinearDecayEquation( variable = a,
+                    input = SetOfInterfaceValues( [ a, F ] ) ) ),
+                RungeKutta4( equation = LinearDecayEquation( variable = T,
+                    input = SetOfInterfaceValues( [ a, F, T ] ) ) ),
+                ] ) )
+        self.assertEqual( model.numericalschemes.plan, 
+            [["a",[0.5,1]],["T",[1]]] )
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join( directory, "checkpoint.npz" )
+            filename = os.path.join( directory, "journal" )
+            model.journal = Journal( filename = filename )
+            model.save_checkpoint( path )
+            model.integrate( final_time = 5, timestep = 1 )
+            model.journal.flush()
+            restored = NumericalModel.load_checkpoint( path, 
+                journal = Journal( filename = filename ) )
+            for id in ("a", "T"):
+                self.assertTrue( np.allclose( restored.variables[id].times,
+                    np.arange(6) ) )
+                self.assertTrue( np.allclose( restored.variables[id].values,
+                    model.variables[id].values ) )
+        finally:
+            shutil.rmtree( directory )
+
+
 def run():
     # run the tests
     logger.info("=== NUMERICAL MODEL TESTS ===")
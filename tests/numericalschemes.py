@@ -2,6 +2,7 @@
 # system modules
 import unittest
 import logging
+import collections
 
 # import authentication module
 from numericalmodel.equations import *
@@ -94,8 +95,226 @@ class NumericalSchemeWithConstantLinearDecayEquationTest(
             self.logger.debug("result: {}".format(res))
             self.assertTrue( np.allclose( res, expected ) )
 
-        
-        
+    @testname("Dormand-Prince-5(4) scheme")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_dormandprince45(self):
+        v = self.equation.variable
+        scheme = DormandPrince45( equation = self.equation,
+            fallback_max_timestep = 0.01, rtol = 1e-6, atol = 1e-9 )
+        scheme.integrate( time = 0, until = 10 )
+        # analytic solution of dT/dt = - a * T + F
+        expected = 5 + 15 * np.exp( - v.times )
+        self.assertTrue( np.allclose( v.values, expected, rtol = 1e-5 ) )
+        self.assertEqual( v.time, 10 )
+        # the timestep grows as the solution flattens
+        self.assertTrue( np.all( np.diff( v.times[:-1] ) >= 0.01 ) )
+        self.assertEqual( scheme.accepted_steps, len(v.times) - 1 )
+
+    @testname("Dormand-Prince-5(4) step rejection")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_dormandprince45_rejection(self):
+        v = self.equation.variable
+        scheme = DormandPrince45( equation = self.equation,
+            fallback_max_timestep = 5, rtol = 1e-6, atol = 1e-9 )
+        timestep = scheme.integrate_step( time = 0 )
+        self.assertTrue( scheme.rejected_steps > 0 )
+        self.assertTrue( timestep < 5 )
+        self.assertTrue( np.allclose( v(), 5 + 15 * np.exp( - timestep ),
+            rtol = 1e-5 ) )
+
+
+
+class AdamsBashforthTest(LinearDecayEquationTest):
+    """ Tests for the Adams-Bashforth schemes
+    """
+    def integrate(self, scheme, timestep = 0.1, until = 5):
+        v = self.equation.variable
+        for i in range(int(round(until / timestep))):
+            scheme.integrate_step( timestep = timestep )
+        # analytic solution of dT/dt = - a * T + F
+        return np.max( abs( v.values - ( 5 + 15 * np.exp( - v.times ) ) ) )
+
+    @testname("Adams-Bashforth accuracy")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_accuracy(self):
+        errors = {}
+        for corrector in [False, True]:
+            for order in [2,3,4]:
+                self.setUp()
+                errors[(order, corrector)] = self.integrate( AdamsBashforth( 
+                    equation = self.equation, order = order, 
+                    corrector = corrector ) )
+        self.logger.debug("errors: {}".format(errors))
+        for corrector in [False, True]:
+            self.assertTrue( errors[(2,corrector)] < 5e-2 )
+            self.assertTrue( errors[(3,corrector)] < errors[(2,corrector)] )
+            self.assertTrue( errors[(4,corrector)] < errors[(3,corrector)] )
+        self.assertTrue( errors[(4,True)] < errors[(4,False)] )
+
+    @testname("Adams-Bashforth evaluates the equation once per step")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_evaluations(self):
+        for corrector, per_step in [(False, 1), (True, 2)]:
+            self.setUp()
+            calls = []
+            nonlinear_addend = self.equation.nonlinear_addend
+            def count(*args, **kwargs):
+                calls.append(kwargs)
+                return nonlinear_addend(*args, **kwargs)
+            self.equation.nonlinear_addend = count
+            scheme = AdamsBashforth( equation = self.equation, order = 3,
+                corrector = corrector )
+            self.integrate( scheme, until = 1 )
+            self.assertEqual( scheme.startup_steps, 2 )
+            self.assertEqual( len(calls), 2 * 4 + 8 * per_step )
+            # changing the timestep starts up again
+            scheme.integrate_step( time = 1, timestep = 0.05 )
+            self.assertEqual( scheme.startup_steps, 3 )
+            # the startup steps' stages are needed
+            self.assertTrue( np.allclose( 
+                scheme.needed_timesteps( timestep = 1 ), [0,0.5,1] ) )
+
+
+class NumericalSchemeStepCacheTest(LinearDecayEquationTest):
+    """ Class for tests of the per-step evaluation cache
+    """
+    def setUp(self):
+        LinearDecayEquationTest.setUp(self)
+        self.calls = collections.Counter()
+        equation = self.equation
+        for value in equation.input.values(): # make the input time-dependent
+            value.times, value.values = np.array([0,100]), value.values[[0,0]]
+        def counting(function):
+            def wrapper(*args, **kwargs):
+                self.calls[function.__name__] += 1
+                return function(*args, **kwargs)
+            wrapper.__name__ = function.__name__
+            return wrapper
+        for part in ["linear_factor","independent_addend","nonlinear_addend"]:
+            setattr(equation, part, counting(getattr(equation, part)))
+        equation.input["F"]._evaluate = counting(equation.input["F"]._evaluate)
+
+    @testname("equation parts are evaluated once per step and time")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_step_cache(self):
+        scheme = DormandPrince45( equation = self.equation, 
+            fallback_max_timestep = 0.1 )
+        scheme.integrate_step( time = 0 )
+        # the last two nodes are at the same time
+        self.assertEqual( self.calls["linear_factor"], 6 )
+        self.assertEqual( self.calls["independent_addend"], 6 )
+        self.assertEqual( self.calls["_evaluate"], 6 )
+        # all stages have different variable states
+        self.assertEqual( self.calls["nonlinear_addend"], 7 )
+        # cache is dropped after the step
+        self.assertIsNone( scheme._step_cache )
+        self.assertIsNone( self.equation.variable._call_cache )
+        scheme.step( time = 0 )
+        self.assertEqual( self.calls["linear_factor"], 13 )
+
+    @testname("cached calls are dropped when the history changes")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_call_cache_invalidation(self):
+        F = self.equation.input["F"]
+        F._call_cache = {}
+        self.assertEqual( F(0), 5 )
+        self.assertEqual( F(0), 5 )
+        self.assertEqual( self.calls["_evaluate"], 1 )
+        F.values = np.array([3,3])
+        self.assertEqual( F(0), 3 )
+        self.assertEqual( self.calls["_evaluate"], 2 )
+
+
+class DerivativeEquationCacheTest(LinearDecayEquationTest):
+    """ Class for tests of the caching of time-invariant equation parts
+    """
+    @testname("time-invariant parts are reused across steps")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_cached_parts(self):
+        calls = collections.Counter()
+        equation = self.equation
+        linear_factor = equation.linear_factor
+        def counting(time = None):
+            calls["linear_factor"] += 1
+            return linear_factor( time = time )
+        equation.linear_factor = counting
+        equation.input.add_element( equation.variable )
+        scheme = RungeKutta4( equation = equation, fallback_max_timestep = 1 )
+        scheme.integrate( time = 0, until = 10 )
+        self.assertEqual( calls["linear_factor"], 1 )
+        # writing to the input invalidates the cache
+        a = equation.input["a"]
+        version = a.version
+        a.values = np.array([2])
+        self.assertTrue( a.version > version )
+        self.assertTrue( np.allclose( scheme.linear_factor(), -2 ) )
+        self.assertEqual( calls["linear_factor"], 2 )
+        # time-dependent input is not cached
+        a.times, a.values = np.array([0,100]), np.array([1,2])
+        self.assertFalse( a.time_invariant )
+        scheme.linear_factor( time = 0 )
+        scheme.linear_factor( time = 0 )
+        self.assertEqual( calls["linear_factor"], 4 )
+
+    @testname("parts depending on the time directly are not reused")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_time_dependent_parts(self):
+        class CosineEquation(PrognosticEquation):
+            def linear_factor(self, time = None):
+                return 0
+            def independent_addend(self, time = None):
+                if time is None: time = self.variable.time
+                return np.cos(time)
+            def nonlinear_addend(self, *args, **kwargs):
+                return 0
+        x = StateVariable( id = "x", values = np.array([0.]),
+            times = np.array([0.]) )
+        equation = CosineEquation( variable = x,
+            input = SetOfInterfaceValues( [ x ] ) )
+        scheme = RungeKutta4( equation = equation,
+            fallback_max_timestep = 0.1 )
+        scheme.integrate( time = 0, until = 1 )
+        self.assertTrue( np.allclose( x.value, np.sin(1), atol = 1e-6 ) )
+
+    @testname("maximum timestep is reused")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_cached_max_timestep(self):
+        scheme = EulerExplicit( equation = self.equation )
+        estimate = scheme.max_timestep_estimate
+        calls = []
+        def counting(**kwargs):
+            calls.append(kwargs)
+            return estimate(**kwargs)
+        scheme.max_timestep_estimate = counting
+        self.assertEqual( scheme.max_timestep, scheme.max_timestep )
+        self.assertEqual( len(calls), 1 )
+        self.equation.input["a"].values = np.array([2])
+        self.assertTrue( np.allclose( scheme.max_timestep, 0.005 ) )
+        self.assertEqual( len(calls), 2 )
+        # the estimate of a linear equation survives the steps
+        SetOfNumericalSchemes( [ scheme ] ).integrate( 0, 0.5 )
+        self.assertTrue( len(self.equation.variable.times) > 100 )
+        self.assertEqual( len(calls), 2 )
+
+    @testname("maximum timestep depending on the state is not reused")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_cached_max_timestep_nonlinear(self):
+        T = StateVariable( id = "T", values = np.array([20.]),
+            times = np.array([0.]) )
+        k = Parameter( id = "k", values = np.array([0.5]), 
+            times = np.array([0.]) )
+        equation = QuadraticDecayEquation( variable = T,
+            input = SetOfInterfaceValues( [ k ] ) )
+        equation.time_independent_parts = True
+        scheme = EulerExplicit( equation = equation, 
+            fallback_max_timestep = 0.01 )
+        calls = []
+        scheme.max_timestep_estimate = lambda **kwargs: calls.append(1) \
+            or 0.01 / equation.variable()
+        SetOfNumericalSchemes( [ scheme ] ).integrate( 0, 0.1 )
+        self.assertEqual( len(calls), len(T.times) - 1 )
+
+
 class NumericalSchemeWithVariableLinearDecayEquationTest(BasicTest):
     """ Class for numerical scheme tests with time-dependent linear decay 
         equation
@@ -127,6 +346,254 @@ class NumericalSchemeWithVariableLinearDecayEquationTest(BasicTest):
 
 
 
+class EulerImplicitWithQuadraticDecayEquationTest(BasicTest):
+    """ Class for Newton-based Euler-implicit scheme tests with a nonlinear
+        equation
+    """
+    def setUp(self):
+        k = Parameter(id="k",name="quadratic factor",
+            values = np.array([0.5]),
+            times = np.array([0])
+            )
+        T = StateVariable(id="T",name="variable", 
+            values = np.array([20]),
+            times = np.array([0]),
+            )
+        self.equation = QuadraticDecayEquation( 
+            variable = T,
+            input = SetOfInterfaceValues( elements = [k] )
+            )
+        self.timesteps = np.linspace(0.1,10,5)
+
+    def expected(self, cur, ts):
+        # positive root of k * ts * new ** 2 + new - cur = 0
+        k = self.equation.input("k")
+        return ( np.sqrt( 1 + 4 * k * ts * cur ) - 1 ) / ( 2 * k * ts )
+
+    @testname("Newton iterations with finite differences")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_finite_differences(self):
+        scheme = EulerImplicit( equation = self.equation )
+        cur = self.equation.variable()
+        for ts in self.timesteps:
+            res = scheme.step( timestep = ts, tendency = False )
+            self.assertTrue( np.allclose( res, self.expected( cur, ts ) ) )
+            self.assertTrue( scheme.last_newton_iterations > 0 )
+
+    @testname("Newton iterations with diagonal finite differences")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_diagonal_finite_differences(self):
+        equation = self.equation
+        T = equation.variable
+        T.values = np.array([[20,10],[5,1]])[np.newaxis]
+        calls = []
+        nonlinear_addend = equation.nonlinear_addend
+        def count(*args, **kwargs):
+            calls.append(kwargs)
+            return nonlinear_addend(*args, **kwargs)
+        equation.nonlinear_addend = count
+        scheme = EulerImplicit( equation = equation, 
+            finite_differences = "diagonal" )
+        scheme._begin_step()
+        try:
+            res = scheme.step( timestep = 1, tendency = False )
+            # only the Newton states and the other parts are cached
+            self.assertEqual( len(scheme._step_cache), 
+                scheme.last_newton_iterations + 1 + 2 )
+        finally:
+            scheme._end_step()
+        self.assertTrue( np.allclose( res, self.expected( T(), 1 ) ) )
+        # one evaluation for the residual and one for the Jacobian
+        self.assertEqual( len(calls), 2 * scheme.last_newton_iterations + 1 )
+
+    @testname("large variables use diagonal finite differences")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_auto_finite_differences(self):
+        equation = self.equation
+        T = equation.variable
+        T.values = np.linspace(1, 20, 400).reshape(1, 20, 20)
+        calls = []
+        nonlinear_addend = equation.nonlinear_addend
+        def count(*args, **kwargs):
+            calls.append(kwargs)
+            return nonlinear_addend(*args, **kwargs)
+        equation.nonlinear_addend = count
+        scheme = EulerImplicit( equation = equation )
+        self.assertEqual( scheme.finite_differences, "auto" )
+        res = scheme.step( timestep = 1, tendency = False )
+        self.assertTrue( np.allclose( res, self.expected( T(), 1 ) ) )
+        # residual, base and perturbed state per iteration without step cache
+        self.assertEqual( len(calls), 3 * scheme.last_newton_iterations + 1 )
+
+    @testname("Newton iterations with Jacobian from equation")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_equation_jacobian(self):
+        equation = self.equation
+        equation.nonlinear_jacobian = lambda time = None, variablevalue = None:\
+            - 2 * equation.input["k"](time) * variablevalue
+        T = equation.variable
+        T.values = np.array([[20,10],[5,1]])[np.newaxis]
+        scheme = EulerImplicit( equation = equation, 
+            fallback_max_timestep = 10 )
+        res = scheme.step( timestep = 1, tendency = False )
+        self.assertTrue( np.allclose( res, self.expected( T(), 1 ) ) )
+        # large stable timesteps
+        scheme.integrate( time = 0, until = 1000 )
+        self.assertTrue( np.all( T() > 0 ) )
+        self.assertTrue( scheme.newton_iterations >= len( T.times ) - 1 )
+
+    @testname("Newton iterations not converging")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_no_convergence(self):
+        scheme = EulerImplicit( equation = self.equation, 
+            newton_max_iterations = 1 )
+        with self.assertRaises( RuntimeError ):
+            scheme.step( timestep = 10 )
+
+
+class NumericalSchemeWithFieldLinearDecayEquationTest(
+    LinearDecayEquationTest):
+    """ Class for numerical scheme tests with a field variable
+    """
+    def setUp(self):
+        LinearDecayEquationTest.setUp(self)
+        self.scalar_equation = self.equation
+        self.field = np.linspace(10,30,6).reshape(2,3)
+        T = StateVariable(id="T",name="field variable", 
+            values = self.field[np.newaxis],
+            times = np.array([0]),
+            )
+        self.equation = LinearDecayEquation( 
+            variable = T, input = self.scalar_equation.input )
+
+    @testname("schemes on fields")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_schemes_on_fields(self):
+        for cls in [EulerExplicit,EulerImplicit,LeapFrog,RungeKutta4]:
+            scheme = cls( equation = self.equation )
+            scalar_scheme = cls( equation = self.scalar_equation )
+            for ts in self.timesteps:
+                res = scheme.step( timestep = ts, tendency = False )
+                self.assertEqual( res.shape, self.field.shape )
+                for i, value in np.ndenumerate(self.field):
+                    self.scalar_equation.variable.values = np.array([value])
+                    expected = scalar_scheme.step( timestep = ts, 
+                        tendency = False )
+                    self.assertTrue( np.allclose( res[i], expected ) )
+
+    @testname("integrating fields")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_integrate_fields(self):
+        scheme = RungeKutta4( equation = self.equation )
+        scheme.integrate( time = 0, until = 10 )
+        T = self.equation.variable
+        self.assertEqual( T.values.shape[1:], self.field.shape )
+        self.assertTrue( np.allclose( T(T.times), T.values ) )
+
+
+class SetOfNumericalSchemesPlanTest(BasicTest):
+    """ Tests for the plan of a SetOfNumericalSchemes
+    """
+    def setUp(self):
+        a = StateVariable(id="a",name="linear factor",
+            values = np.array([1]),
+            times = np.array([0])
+            )
+        F = ForcingValue(id="F",name="independent addend",
+            values = np.array([5]),
+            times = np.array([0])
+            )
+        T = StateVariable(id="T",name="variable", 
+            values = np.array([20]),
+            times = np.array([0]),
+            )
+        self.a_equation = LinearDecayEquation( 
+            variable = a, input = SetOfInterfaceValues( elements = [a,F] ) )
+        self.T_equation = LinearDecayEquation( 
+            variable = T, input = SetOfInterfaceValues( elements = [a,F,T] ) )
+        self.values = [a,F,T]
+
+    @testname("automatic plan")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_automatic_plan(self):
+        schemes = SetOfNumericalSchemes( [ 
+            RungeKutta4( equation = self.T_equation ),
+            EulerExplicit( equation = self.a_equation ),
+            ] )
+        self.assertEqual( schemes.plan, [["a",[0.5,1]],["T",[1]]] )
+        # the plan is cached
+        self.assertTrue( schemes.plan is schemes.plan )
+        # ... until the equation input changes
+        self.T_equation.input = SetOfInterfaceValues( self.values[1:] )
+        self.assertEqual( schemes.plan, [["T",[1]],["a",[1]]] )
+
+    @testname("compiled plan")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_compile(self):
+        T_scheme = RungeKutta4( equation = self.T_equation )
+        a_scheme = EulerExplicit( equation = self.a_equation )
+        schemes = SetOfNumericalSchemes( [ T_scheme, a_scheme ] )
+        self.assertEqual( schemes._compile(schemes.plan), 
+            [ (a_scheme, 0, 0.5), (a_scheme, 0.5, 1), (T_scheme, 0, 1) ] )
+
+    @testname("fixed steps and sample times")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_sample_times(self):
+        schemes = SetOfNumericalSchemes( [ 
+            RungeKutta4( equation = self.T_equation ),
+            EulerExplicit( equation = self.a_equation ),
+            ] )
+        starts, timesteps = schemes.fixed_steps( 0, 2.5, 1 )
+        self.assertTrue( np.allclose( starts, [0,1,2] ) )
+        self.assertTrue( np.allclose( timesteps, [1,1,0.5] ) )
+        times = schemes.sample_times( 0, 2.5, 1 )
+        self.assertTrue( np.allclose( times, 
+            [0,0.5,1,1.5,2,2.25,2.5] ) )
+        requested = set()
+        F = self.values[1]
+        evaluate = F._evaluate
+        def record(times = None):
+            requested.add( float(times) )
+            return evaluate(times)
+        F._evaluate = record
+        schemes.integrate( 0, 2.5, timestep = 1 )
+        self.assertTrue( requested <= set(times.tolist()) )
+        self.assertTrue( np.allclose( self.T_equation.variable.times, 
+            [0,1,2,2.5] ) )
+
+    @testname("intermediate stages are discarded")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_scratch_stages(self):
+        a = self.a_equation.variable
+        schemes = SetOfNumericalSchemes( [ 
+            RungeKutta4( equation = self.T_equation ),
+            EulerExplicit( equation = self.a_equation ),
+            ] )
+        requested = []
+        evaluate = a._evaluate
+        def record(times = None):
+            requested.append( float(times) )
+            return evaluate(times)
+        a._evaluate = record
+        schemes.integrate( 0, 2, timestep = 1 )
+        self.assertTrue( 0.5 in requested ) # stage was used
+        self.assertTrue( np.allclose( a.times, [0,1,2] ) )
+        # the same without a fixed timestep
+        schemes.integrate( 2, 3 )
+        self.assertTrue( np.all( np.isin( a.times, 
+            self.T_equation.variable.times ) ) )
+
+    @testname("cyclic dependencies use the fallback plan")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_cyclic_plan(self):
+        self.a_equation.input = SetOfInterfaceValues( self.values )
+        schemes = SetOfNumericalSchemes( [ 
+            RungeKutta4( equation = self.T_equation ),
+            EulerImplicit( equation = self.a_equation ),
+            ] )
+        self.assertEqual( schemes.plan, schemes.fallback_plan )
+
+
 def run():
     # run the tests
     logger.info("=== NUMERICAL SCHEMES TESTS ===")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# system modules
+import unittest
+import os
+import tempfile
+import shutil
+import pickle
+
+# import authentication module
+from numericalmodel.sources import *
+
+# import test data
+from .test_data import *
+from .test_flow import *
+
+# external modules
+import numpy as np
+
+# skip everything
+SKIPALL = False # by default, don't skip everything
+
+class TimeSeriesFileTest(BasicTest):
+    """ Tests for the TimeSeriesFile classes
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.times = np.arange(25, dtype = float)
+        self.values = np.column_stack([ self.times * 2, self.times * 3 ])
+
+    def tearDown(self):
+        shutil.rmtree( self.directory )
+
+    def write(self, extension):
+        filename = os.path.join( self.directory, "series" + extension )
+        rows = np.column_stack([ self.times, self.values ])
+        if extension == ".csv":
+            with open(filename, "w") as f:
+                f.write("# time,a,b\n")
+                np.savetxt(f, rows, delimiter = ",")
+        elif extension == ".npy":
+            np.save(filename, rows)
+        else:
+            np.savez(filename, times = self.times, values = self.values)
+        return filename
+
+    @testname("reading in chunks")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_read(self):
+        for extension in [".csv", ".npy", ".npz"]:
+            source = open_file( self.write(extension) )
+            chunks = []
+            while not source.exhausted:
+                times, values = source.read(10)
+                self.assertTrue( times.size <= 10 )
+                chunks.append( (times, values) )
+            self.assertEqual( len(chunks), 3 )
+            times = np.concatenate([ t for t, v in chunks ])
+            values = np.concatenate([ v for t, v in chunks ])
+            self.assertTrue( np.allclose( times, self.times ) )
+            self.assertTrue( np.allclose( values, self.values ) )
+            source.rewind()
+            times, values = source.read(5)
+            self.assertTrue( np.allclose( times, self.times[:5] ) )
+            source.rewind()
+
+    @testname("pickling a partly read file")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_pickle(self):
+        for extension in [".csv", ".npy", ".npz"]:
+            source = open_file( self.write(extension) )
+            source.read(10)
+            copy = pickle.loads( pickle.dumps( source ) )
+            for s in (source, copy):
+                times, values = s.read(10)
+                self.assertTrue( np.allclose( times, self.times[10:20] ) )
+                self.assertTrue( np.allclose( values, self.values[10:20] ) )
+                s.rewind()
+
+    @testname("single value column")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_single_column(self):
+        self.values = self.values[:, 0]
+        source = open_file( self.write(".csv") )
+        times, values = source.read(100)
+        self.assertEqual( values.shape, self.times.shape )
+        self.assertTrue( source.exhausted )
+
+
+def run():
+    # run the tests
+    logger.info("=== SOURCES TESTS ===")
+    unittest.main(exit=False,module=__name__)
+    logger.info("=== END OF SOURCES TESTS ===")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# system modules
+import unittest
+import os
+import tempfile
+import shutil
+
+# import authentication module
+from numericalmodel.storage import *
+
+# import test data
+from .test_data import *
+from .test_flow import *
+
+# external modules
+import numpy as np
+
+# skip everything
+SKIPALL = False # by default, don't skip everything
+
+class GrowingArrayTest(BasicTest):
+    """ Tests for the GrowingArray class
+    """
+    def setUp(self):
+        self.array = self.new() # empty array
+
+    def new(self, data = None):
+        return GrowingArray(data)
+
+    @testname("appending")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_append(self):
+        arr = self.array
+        for i in range(100):
+            arr.append(i)
+            self.assertEqual( len(arr), i + 1 )
+            self.assertEqual( arr.last, i )
+        self.assertTrue( np.allclose( arr.data, np.arange(100) ) )
+        self.assertTrue( arr.capacity >= 100 )
+
+    @testname("appending upcasts the dtype")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_append_upcast(self):
+        arr = self.new( np.array([1,2]) )
+        arr.append(2.5)
+        self.assertTrue( np.allclose( arr.data, np.array([1,2,2.5]) ) )
+        arr.replace_last(3.5)
+        self.assertTrue( np.allclose( arr.data, np.array([1,2,3.5]) ) )
+
+    @testname("extending")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_extend(self):
+        arr = self.array
+        for i in range(10):
+            arr.extend( np.arange(i*10,(i+1)*10) )
+        self.assertTrue( np.allclose( arr.data, np.arange(100) ) )
+        arr.extend( [] )
+        self.assertEqual( len(arr), 100 )
+
+    @testname("reserving and trimming")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_reserve(self):
+        arr = self.new( np.array([0]) )
+        arr.reserve( 50, dtype = np.float64 )
+        self.assertEqual( arr.data.dtype, np.float64 )
+        self.assertEqual( arr.capacity, 51 )
+        buf = arr._buffer
+        for i in range(1,51):
+            arr.append( i / 2 )
+        self.assertIs( arr._buffer, buf ) # no reallocation
+        arr.append( 0 )
+        arr.trim()
+        self.assertEqual( arr.capacity, 52 )
+        self.assertTrue( np.allclose( arr.data[:-1], np.arange(51) / 2 ) )
+
+    @testname("truncating")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_truncate(self):
+        arr = self.new( np.arange(10) )
+        arr.drop(2)
+        arr.truncate(5)
+        self.assertTrue( np.allclose( arr.data, np.arange(2,7) ) )
+        arr.append(7)
+        self.assertEqual( arr.last, 7 )
+
+    @testname("data is a view")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_data_view(self):
+        arr = self.array
+        for i in range(10):
+            arr.append(i)
+        arr.data[-1] = 20
+        self.assertEqual( arr.last, 20 )
+
+    @testname("dropping leading elements")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_drop(self):
+        arr = self.array
+        for i in range(10):
+            arr.append(i)
+        arr.drop(4)
+        self.assertTrue( np.allclose( arr.data, np.arange(4,10) ) )
+        for i in range(10,100):
+            arr.append(i)
+            arr.drop(1)
+        self.assertTrue( np.allclose( arr.data, np.arange(94,100) ) )
+        arr.drop(100)
+        self.assertEqual( len(arr), 0 )
+
+
+class MemmapArrayTest(GrowingArrayTest):
+    """ Tests for the MemmapArray class
+    """
+    def setUp(self):
+        self.storage = MemmapStorage( tempfile.mkdtemp() )
+        GrowingArrayTest.setUp(self)
+
+    def tearDown(self):
+        shutil.rmtree( self.storage.directory )
+
+    def new(self, data = None):
+        return self.storage.array( name = "array", data = data )
+
+    @testname("content is stored in the file")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_file(self):
+        arr = self.new( np.ones((3,2)) )
+        for i in range(20):
+            arr.append( np.array([i,i]) )
+        arr.flush()
+        self.assertIsInstance( arr.data, np.memmap )
+        self.assertEqual( os.path.dirname( arr.filename ), 
+            self.storage.directory )
+        content = np.fromfile( arr.filename, dtype = arr.data.dtype )
+        self.assertTrue( np.allclose( content[:46].reshape(-1,2), arr.data ) )
+
+    @testname("old views stay valid when the file is rewritten")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_rewrite(self):
+        arr = self.new( np.arange(5) )
+        view = arr.data
+        arr.append(5.5) # upcast to float rewrites the file
+        self.assertTrue( np.allclose( view, np.arange(5) ) )
+        self.assertTrue( np.allclose( arr.data[:5], np.arange(5) ) )
+        self.assertEqual( arr.data.dtype, np.float64 )
+
+
+class ArchiveTest(BasicTest):
+    """ Tests for the Archive class
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join( self.directory, "archive" )
+
+    def tearDown(self):
+        shutil.rmtree( self.directory )
+
+    @testname("appending and reading batches")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_batches(self):
+        for compress in [False, True]:
+            archive = Archive( filename = self.filename, compress = compress )
+            self.assertEqual( archive.read(), (None, None) )
+            for i in range(3):
+                times = np.arange(i*10,(i+1)*10)
+                archive.append( times, np.ones((10,2,3)) * times[:,None,None] )
+            times, values = archive.read()
+            self.assertTrue( np.allclose( times, np.arange(30) ) )
+            self.assertEqual( values.shape, (30,2,3) )
+            self.assertTrue( np.allclose( values[:,1,2], times ) )
+            os.remove( self.filename )
+
+    @testname("incomplete last batch is ignored")
+    @unittest.skipIf(SKIPALL,"skipping all tests")
+    def test_incomplete(self):
+        archive = Archive( filename = self.filename )
+        archive.append( np.arange(5), np.arange(5) )
+        archive.append( np.arange(5,10), np.arange(5,10) )
+        size = os.path.getsize( self.filename )
+        with open( self.filename, "r+b" ) as f:
+            f.truncate( size - 10 )
+        times, values = archive.read()
+        self.assertTrue( np.allclose( times, np.arange(5) ) )
+
+
+def run():
+    # run the tests
+    logger.info("=== STORAGE TESTS ===")
+    unittest.main(exit=False,module=__name__)
+    logger.info("=== END OF STORAGE TESTS ===")
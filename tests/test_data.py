@@ -7,10 +7,18 @@ import numpy as np
 
 EMPTY_ARRAY = np.array([])
 
+def constant_forcing(times):
+    """
+    Analytic forcing that is 28 at all times
+    """
+    return np.full_like(times, 28, dtype = float)
+
 class LinearDecayEquation(numericalmodel.equations.PrognosticEquation):
     """
     Class for the linear decay equation
     """
+    time_independent_parts = True # parts only depend on the input
+
     def linear_factor(self, time = None ):
         # take the "a" parameter from the input, interpolate it to the given
         # "time" and return the negative value
@@ -24,3 +32,19 @@ class LinearDecayEquation(numericalmodel.equations.PrognosticEquation):
     def nonlinear_addend(self, *args, **kwargs):
         return 0 # nonlinear addend is always zero (LINEAR decay equation)
 
+
+class QuadraticDecayEquation(numericalmodel.equations.PrognosticEquation):
+    """
+    Class for the quadratic decay equation
+    """
+    def linear_factor(self, time = None ):
+        return 0 # no linear part
+
+    def independent_addend(self, time = None ):
+        return 0 # no independent part
+
+    def nonlinear_addend(self, time = None, variablevalue = None ):
+        # take the "k" parameter from the input, interpolate it to the given
+        # "time" and return the negative product with the squared variable
+        if variablevalue is None: variablevalue = self.variable(time)
+        return - self.input["k"](time) * variablevalue ** 2